@@ -9,8 +9,15 @@ from web3 import Web3
 from bs4 import BeautifulSoup
 from retry import retry
 import threading
-from web3.exceptions import BlockNotFound 
-from pieces.market_cap_calculator import calculate_market_cap, format_market_cap
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pieces.market_cap_calculator import calculate_market_cap, format_market_cap, get_eth_price_in_usd, get_token_symbol_and_decimals, eth_price_oracle
+from pieces.block_stream import BlockStream
+from pieces.block_filter import BlockPrefilter
+from pieces.block_catchup import CatchUpEngine
+from pieces.event_pipeline import EventPipeline
+from pieces.action_decoder import decode_swap_action, BOT_ROUTERS, ROUTER_NAMES
+from pieces.http_client import http_client
 
 # Get the absolute path of the parent directory
 parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -51,6 +58,8 @@ except yaml.YAMLError as exc:
 
 # Access configuration values
 ETEREUM_NODE_URL = config['ETEREUM_NODE_URL']
+ETEREUM_NODE_WS_URL = config.get('ETEREUM_NODE_WS_URL')  # Optional, enables streaming ingestion
+SUBSCRIBE_PENDING_TRANSACTIONS = config.get('SUBSCRIBE_PENDING_TRANSACTIONS', False)
 TELEGRAM_BOT_TOKEN = config['MTB_TELEGRAM_BOT_TOKEN']
 CHAT_ID = config['MTB_CHAT_ID']
 ADDRESS_MAP = {addr.lower(): name for addr, name in config['ADDRESSES_TO_MONITOR'].items()}
@@ -62,6 +71,12 @@ SEND_TELEGRAM_MESSAGES = config['SEND_TELEGRAM_MESSAGES']
 ALLOW_SWAP_MESSAGES_ONLY = config['ALLOW_SWAP_MESSAGES_ONLY']
 ALLOW_AGGREGATED_MESSAGES_ALSO = config['ALLOW_AGGREGATED_MESSAGES_ALSO']
 ALLOW_MTDB_INTERACTION = config['ALLOW_MTDB_INTERACTION']
+ENABLE_BLOCK_PREFILTER = config.get('ENABLE_BLOCK_PREFILTER', True)
+CATCH_UP_WORKERS = config.get('CATCH_UP_WORKERS', 4)
+MAX_CATCH_UP_BLOCKS = config.get('MAX_CATCH_UP_BLOCKS', 300)  # Older blocks are skipped after a long downtime
+ENRICH_WORKERS = config.get('ENRICH_WORKERS', 4)
+PIPELINE_QUEUE_SIZE = config.get('PIPELINE_QUEUE_SIZE', 1000)
+PENDING_TRANSACTION_WORKERS = config.get('PENDING_TRANSACTION_WORKERS', 16)
 
 # Bypassing proxies in local environment
 proxies = {
@@ -83,6 +98,19 @@ if not web3.is_connected():
 
 logging.info(f"Connected to Ethereum Node. Monitoring transactions for addresses: {ADDRESS_MAP}")
 
+# Transactions already handled (e.g. via the mempool stream), so a block replay does not alert twice
+MAX_HANDLED_TX_HASHES = 10000
+handled_tx_hashes = set()
+handled_tx_order = deque()
+handled_tx_lock = threading.Lock()
+
+# Mempool transactions waited for at once, the ones beyond are left to the block loop
+pending_executor = ThreadPoolExecutor(max_workers=PENDING_TRANSACTION_WORKERS, thread_name_prefix='pending-tx')
+pending_slots = threading.BoundedSemaphore(PENDING_TRANSACTION_WORKERS)
+
+# Logs bloom prefilter for the monitored addresses
+block_prefilter = BlockPrefilter(web3, ADDRESSES_TO_MONITOR)
+
 def send_telegram_message(message):
     """
     Sends a message to the configured Telegram chat.
@@ -99,7 +127,7 @@ def send_telegram_message(message):
         'parse_mode': 'MarkdownV2',
         'disable_web_page_preview': True
     }
-    response = requests.post(url, data=data)
+    response = http_client.post(url, data=data)
     logging.info(f"Telegram response: {response.json()}")
     return response.json()
 
@@ -173,8 +201,37 @@ def insert_zero_width_space(text):
     
     return text
 
+def get_transaction_action(tx, received_at):
+    """
+    Returns the cleaned transaction action. It is decoded locally from the transaction receipt;
+    Etherscan is only scraped for transactions the decoder does not understand.
+    """
+    tx_hash = tx['hash'].hex()
+    try:
+        receipt = web3.eth.get_transaction_receipt(tx_hash)
+        if receipt['status'] == 0:
+            logging.info(f"Transaction {tx_hash} reverted. No action to decode.")
+            return "No ACTION info available"
+
+        eth_price_in_usd = None
+        to_address = tx['to'].lower() if tx['to'] else None
+        if ROUTER_NAMES.get(to_address) in BOT_ROUTERS:
+            eth_price_in_usd = get_eth_price_in_usd()
+
+        action = decode_swap_action(tx, receipt, get_token_symbol_and_decimals, eth_price_in_usd)
+        if action:
+            logging.info(f"Decoded transaction action from receipt: {action}")
+            # Same post-processing as the Etherscan path
+            return escape_markdown(insert_zero_width_space(action))
+    except Exception as e:
+        logging.error(f"Error decoding transaction action from receipt: {e}")
+
+    # Give Etherscan time to index the transaction, counted from when the scanner saw it
+    wait_until(received_at + 5)
+    return get_etherscan_transaction_action(tx_hash)
+
 @retry(tries=5, delay=2, backoff=2, jitter=(1, 3))
-def get_transaction_action(tx_hash):
+def get_etherscan_transaction_action(tx_hash):
     """
     Fetches the transaction action from Etherscan and returns a cleaned version of it.
     """
@@ -183,7 +240,7 @@ def get_transaction_action(tx_hash):
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
     }
     
-    response = requests.get(etherscan_url, headers=headers)
+    response = http_client.get(etherscan_url, headers=headers)
     if response.status_code == 200:
         logging.info("Successfully fetched the Etherscan page.")
         soup = BeautifulSoup(response.text, 'html.parser')
@@ -241,8 +298,16 @@ def get_block_number():
 
 def handle_event(tx):
     """
-    Handles an event and sends a Telegram message if the transaction involves a monitored address.
+    Scanner stage: queues a transaction for enrichment without waiting on any downstream I/O.
     """
+    event_pipeline.submit({'tx': tx, 'received_at': time.time()})
+
+def enrich_event(event):
+    """
+    Enrichment stage: builds the Telegram messages for a transaction that involves a monitored address.
+    """
+    tx = event['tx']
+    messages = []
     from_address = tx['from'].lower()
     to_address = tx['to'].lower() if tx['to'] else None
     value = web3.from_wei(tx['value'], 'ether')
@@ -255,15 +320,25 @@ def handle_event(tx):
     to_name_link = f"[{to_name}](https://etherscan.io/address/{to_address})"
     tx_hash_link = f"[{tx_hash}](https://etherscan.io/tx/{tx_hash})"
 
-    if from_address in ADDRESSES_TO_MONITOR:
-        time.sleep(5)
-        action_text = get_transaction_action(tx_hash)
+    if from_address in ADDRESS_MAP:
+        action_text = get_transaction_action(tx, event['received_at'])
         
         # Extract token link, text, and address
         token_link, token_text, token_address, action_text = extract_token_link(action_text)
         
         if ALLOW_SWAP_MESSAGES_ONLY and not (action_text.startswith("Swap") or (ALLOW_AGGREGATED_MESSAGES_ALSO and action_text.startswith("Aggregated"))):
-            return  # Skip non-swap and non-aggregated transactions if only swaps are allowed
+            return messages  # Skip non-swap and non-aggregated transactions if only swaps are allowed
+
+        transaction_details = {
+            'from_name': from_name,
+            'tx_hash': tx_hash,
+            'action_text': action_text,
+            'token_link': token_link,
+            'token_text': token_text
+        }
+        # Hand off to the trading bot first, it should not wait for the market cap
+        if ALLOW_MTDB_INTERACTION:
+            threading.Thread(target=notify_trading_bot, args=(transaction_details,)).start()
 
         # Calculate the Market Cap and include it in the message
         if token_address:
@@ -279,16 +354,6 @@ def handle_event(tx):
         else:
             market_cap_text = "N/A" 
 
-        transaction_details = {
-            'from_name': from_name,
-            'tx_hash': tx_hash,
-            'action_text': action_text,
-            'token_link': token_link,
-            'token_text': token_text
-        }
-        if ALLOW_MTDB_INTERACTION:
-            threading.Thread(target=notify_trading_bot, args=(transaction_details,)).start()
-
         token_action = ''
         if 'ETH For' in action_text or re.search(r'ETH \〈[^\)]+\〉 for', action_text):
             token_action += '⭐ *Token BUY* ⭐\n\n'
@@ -302,56 +367,198 @@ def handle_event(tx):
             f'*Action:*\n{action_text}\n\n'
             f'*Market Cap:*\n{market_cap_text}'
         )
-        send_telegram_message(message)
+        messages.append(message)
 
-    if to_address in ADDRESSES_TO_MONITOR:
-        time.sleep(5)
+    if to_address in ADDRESS_MAP:
         if ALLOW_SWAP_MESSAGES_ONLY:
-            return  # Skip incoming messages if only swaps are allowed
+            return messages  # Skip incoming messages if only swaps are allowed
         message = (
             f'⭐ *{to_name_link}: INCOMING* 💵\n\n'
             f'*From:*\n{from_address}\n\n'
             f'*To:*\n{to_address}\n\n'
             f'*Transaction Hash:*\n{tx_hash_link}'
         )
+        messages.append(message)
+
+    return messages
+
+def send_messages(messages):
+    """
+    Sender stage: delivers the enriched messages to Telegram in order.
+    """
+    for message in messages:
         send_telegram_message(message)
 
+def wait_until(timestamp):
+    """
+    Sleeps until the given time.time() timestamp, if it is still in the future.
+    """
+    delay = timestamp - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+event_pipeline = EventPipeline(enrich_event, send_messages, enrich_workers=ENRICH_WORKERS, queue_size=PIPELINE_QUEUE_SIZE)
+
 def notify_trading_bot(transaction_details):
     """
     Sends the transaction details to the trading bot via HTTP POST request.
     """
     try:
-        response = requests.post(TRADING_BOT_URL, json=transaction_details, proxies=proxies)
+        response = http_client.post(TRADING_BOT_URL, json=transaction_details, proxies=proxies)
         response.raise_for_status()  # Raise an HTTPError for bad responses (4xx and 5xx)
         logging.info(f"Trading bot response: {response.status_code} - {response.text}")
     except requests.exceptions.RequestException as e:
         logging.error(f"Error sending transaction details to trading bot: {e}")
 
+def involves_monitored_address(tx):
+    """
+    Checks whether the transaction is sent from or to one of the monitored addresses.
+    """
+    from_address = tx['from'].lower()
+    to_address = tx['to'].lower() if tx['to'] else None
+    return from_address in ADDRESS_MAP or to_address in ADDRESS_MAP
+
+def claim_transaction(tx_hash):
+    """
+    Marks a transaction as handled. Returns False if it has already been handled.
+    """
+    with handled_tx_lock:
+        if tx_hash in handled_tx_hashes:
+            return False
+        handled_tx_hashes.add(tx_hash)
+        handled_tx_order.append(tx_hash)
+        if len(handled_tx_order) > MAX_HANDLED_TX_HASHES:
+            handled_tx_hashes.discard(handled_tx_order.popleft())
+        return True
+
+def release_transaction(tx_hash):
+    """
+    Forgets a claimed transaction that could not be handled, so the next block pass delivers it.
+    """
+    with handled_tx_lock:
+        if tx_hash in handled_tx_hashes:
+            handled_tx_hashes.discard(tx_hash)
+            handled_tx_order.remove(tx_hash)
+
+def handle_claimed(tx_hash, tx):
+    try:
+        handle_event(tx)
+    except Exception:
+        release_transaction(tx_hash)
+        raise
+
+def fetch_block_transactions(block_num):
+    """
+    Fetches the transactions of a block that may involve a monitored address.
+    """
+    # Plain ETH transfers emit no logs, so the bloom cannot rule them out when incoming messages are enabled
+    if ENABLE_BLOCK_PREFILTER and ALLOW_SWAP_MESSAGES_ONLY:
+        block = web3.eth.get_block(block_num)  # Header and tx hashes only
+        addresses = block_prefilter.match_bloom(block['logsBloom'])
+        if not addresses:
+            return []
+        transactions = [web3.eth.get_transaction(tx_hash) for tx_hash in block_prefilter.candidate_transactions(block['hash'], addresses)]
+    else:
+        transactions = web3.eth.get_block(block_num, full_transactions=True).transactions
+    return transactions
+
+def handle_block(block_num, transactions):
+    """
+    Handles every transaction of the block that involves a monitored address.
+    """
+    for tx in transactions:
+        tx_hash = Web3.to_hex(tx['hash'])
+        if involves_monitored_address(tx) and claim_transaction(tx_hash):
+            handle_claimed(tx_hash, tx)
+
+def handle_pending_transaction(tx):
+    """
+    Waits for a mempool transaction of a monitored address to be mined and handles it
+    as soon as its receipt is available, without waiting for the block loop.
+    """
+    tx_hash = Web3.to_hex(tx['hash'])
+    try:
+        logging.info(f"Pending transaction {tx_hash} of a monitored address seen in the mempool. Waiting for it to be mined...")
+        try:
+            web3.eth.wait_for_transaction_receipt(tx_hash, timeout=300, poll_latency=1)
+        except Exception as e:
+            logging.warning(f"Pending transaction {tx_hash} was not mined: {e}")
+            return
+        if claim_transaction(tx_hash):
+            try:
+                tx = web3.eth.get_transaction(tx_hash)
+            except Exception:
+                release_transaction(tx_hash)
+                raise
+            handle_claimed(tx_hash, tx)
+    finally:
+        pending_slots.release()
+
+def watch_pending_transactions(stream):
+    """
+    Consumes pending transactions from the stream and picks out those of monitored addresses.
+    """
+    while True:
+        tx = stream.pending.get()
+        # Some nodes only send hashes; those cannot be filtered without an RPC call per transaction
+        if isinstance(tx, (bytes, str)) or 'from' not in tx:
+            continue
+        try:
+            if involves_monitored_address(tx):
+                if pending_slots.acquire(blocking=False):
+                    pending_executor.submit(handle_pending_transaction, tx)
+                else:
+                    # The block loop still handles it once mined, only a little later
+                    logging.info(f"All {PENDING_TRANSACTION_WORKERS} pending transaction slots are busy. Leaving {Web3.to_hex(tx['hash'])} to the block loop.")
+        except Exception as e:
+            logging.error(f"Error handling pending transaction: {e}")
+
 def log_loop(poll_interval):
     """
-    Main loop that polls for new blocks and handles transactions in those blocks.
+    Main loop that follows new blocks and handles transactions in those blocks.
+    New heads come from the WebSocket stream when ETEREUM_NODE_WS_URL is set; whenever the
+    socket is down the loop falls back to polling every poll_interval seconds. Missed
+    blocks are caught up in parallel from the last checkpoint, so nothing is skipped.
     """
-    latest_block = get_block_number()
+    catch_up = CatchUpEngine(fetch_block_transactions, handle_block, os.path.join(log_directory, 'checkpoint.json'), workers=CATCH_UP_WORKERS)
+
+    current_block = get_block_number()
+    latest_block = catch_up.load_checkpoint()
+    if latest_block is None:
+        latest_block = current_block
+    elif MAX_CATCH_UP_BLOCKS and current_block - latest_block > MAX_CATCH_UP_BLOCKS:
+        logging.warning(f"Checkpoint block {latest_block} is more than {MAX_CATCH_UP_BLOCKS} blocks behind. Skipping to block {current_block - MAX_CATCH_UP_BLOCKS}.")
+        latest_block = current_block - MAX_CATCH_UP_BLOCKS
     logging.info(f"Starting to monitor from block {latest_block}")
+
+    stream = None
+    if ETEREUM_NODE_WS_URL:
+        stream = BlockStream(ETEREUM_NODE_WS_URL, subscribe_pending=SUBSCRIBE_PENDING_TRANSACTIONS).start()
+        if SUBSCRIBE_PENDING_TRANSACTIONS:
+            threading.Thread(target=watch_pending_transactions, args=(stream,), daemon=True).start()
     
     while True:
         try:
-            logging.info("Checking for new events...")
-            current_block = get_block_number()
+            streaming = stream is not None and stream.connected.is_set()
+            if streaming:
+                # Bounded wait, so a silently stalled socket still degrades to polling
+                current_block = stream.next_head(timeout=poll_interval)
+                if current_block is None:
+                    logging.info("No new head received over WebSocket. Polling instead...")
+                    current_block = get_block_number()
+            else:
+                logging.info("Checking for new events...")
+                current_block = get_block_number()
             
             if current_block > latest_block:
-                for block_num in range(latest_block + 1, current_block + 1):
-                    try:
-                        block = web3.eth.get_block(block_num, full_transactions=True)
-                        for tx in block.transactions:
-                            handle_event(tx)
-                    except BlockNotFound as e:  # Handle the BlockNotFound exception
-                        logging.warning(f"Block {block_num} not found: {e}. Retrying after delay...")
-                        time.sleep(1)  # Delay before retrying
-                        continue  # Skip this block and continue with the next one
-                latest_block = current_block
+                try:
+                    latest_block = catch_up.run(latest_block + 1, current_block)
+                finally:
+                    # Resume after the last block that was actually handled
+                    latest_block = catch_up.load_checkpoint() or latest_block
 
-            time.sleep(poll_interval)
+            if not streaming:
+                time.sleep(poll_interval)
 
         except Exception as e:
             logging.error(f"Unexpected error in log loop: {e}")
@@ -364,7 +571,8 @@ def test_transaction(tx_hash):
     """
     try:
         tx = web3.eth.get_transaction(tx_hash)
-        handle_event(tx)
+        # Run the stages inline, the pipeline threads would not outlive this call
+        send_messages(enrich_event({'tx': tx, 'received_at': time.time()}))
     except Exception as e:
         logging.error(f"Error fetching transaction: {e}")
 
@@ -378,4 +586,7 @@ if __name__ == '__main__':
     if args.test_tx:
         test_transaction(args.test_tx)
     else:
+        event_pipeline.start()
+        http_client.start_metrics_logger()
+        eth_price_oracle.get_price()  # Warm the cache so the first alert does not wait for the feed
         log_loop(10)
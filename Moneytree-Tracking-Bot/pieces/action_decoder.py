@@ -0,0 +1,125 @@
+import logging
+from decimal import Decimal
+from web3 import Web3
+
+# Event topics
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text='Transfer(address,address,uint256)'))
+WITHDRAWAL_TOPIC = Web3.to_hex(Web3.keccak(text='Withdrawal(address,uint256)'))
+UNISWAP_V2_SWAP_TOPIC = Web3.to_hex(Web3.keccak(text='Swap(address,uint256,uint256,uint256,uint256,address)'))
+UNISWAP_V3_SWAP_TOPIC = Web3.to_hex(Web3.keccak(text='Swap(address,address,int256,int256,uint160,uint128,int24)'))
+
+WETH_ADDRESS = '0xc02aaa39b223fe8d0a0e5c4f27ead9083c756cc2'
+
+# Routers that name the venue themselves, lowercased
+ROUTER_NAMES = {
+    '0x7a250d5630b4cf539739df2c5dacb4c659f2488d': 'Uniswap V2',
+    '0xe592427a0aece92de3edee1f18e0157c05861564': 'Uniswap V3',
+    '0x3328f7f4a1d1c57c35df56bbf0c9dcafca309c49': 'Banana Gun',
+    '0xdb5889e35e379ef0498aae126fc2cce1fbd23216': 'Banana Gun',
+    '0x80a64c6d7f12c47b7c66c5b4e20e72bc1fcd5d9e': 'Maestro',
+    '0x1111111254eeb25477b68fb85ed929f73a960582': '1inch',
+    '0x111111125421ca6dc452d289314280a0f8842a65': '1inch',
+    '0xdef1c0ded9bec7f1a1670819833240f027b25eff': '0x Protocol',
+    '0x881d40237659c251811cec9c364ef91dc08d300c': 'Metamask Swap',
+}
+
+# Trading bots whose swaps Etherscan shows as 'Swap X ETH (value) for Y TOKEN'
+BOT_ROUTERS = {'Banana Gun', 'Maestro'}
+
+def format_amount(raw_amount, decimals):
+    """
+    Formats a raw token amount the way Etherscan does, e.g. 1,234,567.89.
+    """
+    amount = Decimal(raw_amount).scaleb(-decimals)
+    text = f"{amount:,f}"
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return text
+
+def topic_to_address(topic):
+    return '0x' + Web3.to_hex(topic)[-40:].lower()
+
+def get_venue(tx, logs):
+    """
+    Names the venue from the router that was called, or from the pool events in the receipt.
+    """
+    to_address = tx['to'].lower() if tx['to'] else None
+    if to_address in ROUTER_NAMES:
+        return ROUTER_NAMES[to_address]
+    topics = {Web3.to_hex(log['topics'][0]) for log in logs if log['topics']}
+    if UNISWAP_V3_SWAP_TOPIC in topics and UNISWAP_V2_SWAP_TOPIC not in topics:
+        return 'Uniswap V3'
+    if UNISWAP_V2_SWAP_TOPIC in topics:
+        return 'Uniswap V2'
+    return None
+
+def decode_swap_action(tx, receipt, get_token_info, eth_price_in_usd=None):
+    """
+    Builds the Etherscan style 'Swap X ETH For Y TOKEN On VENUE' action of a transaction
+    from its receipt logs (ERC-20 Transfers, WETH Withdrawals and Uniswap Swap events).
+
+    get_token_info(token_address) must return (symbol, decimals).
+    Returns the action text with a markdown link on the bought or sold token, or None if the
+    transaction is not a swap that can be decoded with confidence.
+    """
+    wallet = tx['from'].lower()
+    logs = receipt['logs']
+    venue = get_venue(tx, logs)
+    if venue is None:
+        return None
+
+    received = {}
+    sent = {}
+    eth_unwrapped = 0
+    for log in logs:
+        if not log['topics']:
+            continue
+        topic = Web3.to_hex(log['topics'][0])
+        token = log['address'].lower()
+        if topic == TRANSFER_TOPIC and len(log['topics']) == 3:  # ERC-721 transfers have 4 topics
+            amount = int.from_bytes(bytes(log['data']), byteorder='big')
+            if topic_to_address(log['topics'][2]) == wallet:
+                received[token] = received.get(token, 0) + amount
+            if topic_to_address(log['topics'][1]) == wallet:
+                sent[token] = sent.get(token, 0) + amount
+        elif topic == WITHDRAWAL_TOPIC and token == WETH_ADDRESS:
+            eth_unwrapped += int.from_bytes(bytes(log['data']), byteorder='big')
+
+    # WETH received or sent directly counts as ETH
+    eth_in = tx['value'] + sent.pop(WETH_ADDRESS, 0)
+    eth_out = eth_unwrapped + received.pop(WETH_ADDRESS, 0)
+    bot_style = venue in BOT_ROUTERS and eth_price_in_usd is not None
+
+    if eth_in > 0 and len(received) == 1 and not sent:
+        # Buy: ETH for token
+        token_address, raw_amount = next(iter(received.items()))
+        symbol, decimals = get_token_info(token_address)
+        token_link = f"[{symbol}](https://etherscan.io/token/{Web3.to_checksum_address(token_address)})"
+        eth_amount = format_amount(eth_in, 18)
+        if bot_style:
+            usd_value = float(Web3.from_wei(eth_in, 'ether')) * eth_price_in_usd
+            return f"Swap {eth_amount} ETH 〈${usd_value:,.2f}〉 for {format_amount(raw_amount, decimals)} {token_link} on {venue}"
+        return f"Swap {eth_amount} ETH For {format_amount(raw_amount, decimals)} {token_link} On {venue}"
+
+    if eth_out > 0 and len(sent) == 1 and not received:
+        # Sell: token for ETH
+        token_address, raw_amount = next(iter(sent.items()))
+        symbol, decimals = get_token_info(token_address)
+        token_link = f"[{symbol}](https://etherscan.io/token/{Web3.to_checksum_address(token_address)})"
+        eth_amount = format_amount(eth_out, 18)
+        if bot_style:
+            usd_value = float(Web3.from_wei(eth_out, 'ether')) * eth_price_in_usd
+            return f"Swap {format_amount(raw_amount, decimals)} {token_link} for {eth_amount} ETH 〈${usd_value:,.2f}〉 On {venue}"
+        return f"Swap {format_amount(raw_amount, decimals)} {token_link} For {eth_amount} ETH On {venue}"
+
+    if len(sent) == 1 and len(received) == 1 and eth_in == 0 and eth_out == 0:
+        # Token for token
+        (sent_address, sent_amount), = sent.items()
+        (received_address, received_amount), = received.items()
+        sent_symbol, sent_decimals = get_token_info(sent_address)
+        received_symbol, received_decimals = get_token_info(received_address)
+        token_link = f"[{received_symbol}](https://etherscan.io/token/{Web3.to_checksum_address(received_address)})"
+        return f"Swap {format_amount(sent_amount, sent_decimals)} {sent_symbol} For {format_amount(received_amount, received_decimals)} {token_link} On {venue}"
+
+    logging.info(f"Could not decode a swap from the receipt of {Web3.to_hex(tx['hash'])}.")
+    return None
@@ -0,0 +1,94 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from web3.exceptions import BlockNotFound
+
+class CatchUpEngine:
+    """
+    Processes a range of blocks with a bounded pool of fetch workers. Blocks are fetched
+    concurrently but handed to `handle_block` strictly in block order, blocks the node does
+    not have yet are re-queued instead of skipped, and the last processed block is written
+    to a checkpoint file so that a restart resumes exactly where it left off.
+    """
+
+    def __init__(self, fetch_block, handle_block, checkpoint_path, workers=4, retry_delay=1, max_attempts=10):
+        self.fetch_block = fetch_block
+        self.handle_block = handle_block
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='catch-up')
+        self.checkpoint = None
+        self.checkpoint_loaded = False
+
+    def load_checkpoint(self):
+        """
+        Returns the last processed block number, or None if there is no checkpoint yet. The file is
+        only read once, the engine keeps the checkpoint in memory afterwards.
+        """
+        if self.checkpoint_loaded:
+            return self.checkpoint
+        self.checkpoint_loaded = True
+        try:
+            with open(self.checkpoint_path, 'r') as f:
+                self.checkpoint = int(json.load(f)['last_processed_block'])
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, json.JSONDecodeError) as e:
+            logging.error(f"Ignoring unreadable checkpoint file '{self.checkpoint_path}': {e}")
+        return self.checkpoint
+
+    def save_checkpoint(self, block_num):
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint behind
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_processed_block': block_num}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self.checkpoint = block_num
+        self.checkpoint_loaded = True
+
+    def _fetch(self, block_num):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return self.fetch_block(block_num)
+            except BlockNotFound as e:
+                logging.warning(f"Block {block_num} not found (attempt {attempt}/{self.max_attempts}): {e}. Re-queuing...")
+                time.sleep(self.retry_delay)
+        raise BlockNotFound(f"Block {block_num} still not available after {self.max_attempts} attempts")
+
+    def run(self, start_block, end_block):
+        """
+        Fetches and handles blocks start_block..end_block (inclusive) and returns the last
+        block that was handled. If a block cannot be fetched, the exception propagates and
+        the checkpoint stays at the block before it.
+        """
+        if end_block < start_block:
+            return start_block - 1
+
+        if end_block - start_block > 0:
+            logging.info(f"Catching up on blocks {start_block}-{end_block} with {self.workers} workers.")
+
+        # Keep a bounded window of fetches in flight so memory stays flat for long ranges
+        window = self.workers * 2
+        in_flight = {}
+        next_to_submit = start_block
+
+        for block_num in range(start_block, end_block + 1):
+            while next_to_submit <= end_block and next_to_submit < block_num + window:
+                in_flight[next_to_submit] = self.executor.submit(self._fetch, next_to_submit)
+                next_to_submit += 1
+
+            try:
+                result = in_flight.pop(block_num).result()
+            except Exception:
+                for future in in_flight.values():
+                    future.cancel()
+                raise
+
+            self.handle_block(block_num, result)
+            self.save_checkpoint(block_num)
+
+        return end_block
@@ -0,0 +1,59 @@
+import logging
+from web3 import Web3
+
+def bloom_bits(value):
+    """
+    Returns the three bit positions that a value sets in a 2048-bit Ethereum logs bloom.
+    """
+    value_hash = Web3.keccak(value)
+    return [((value_hash[i] << 8) | value_hash[i + 1]) & 2047 for i in (0, 2, 4)]
+
+def address_topic(address):
+    """
+    Returns an address left-padded to 32 bytes, as it appears in an indexed event topic.
+    """
+    return b'\x00' * 12 + bytes.fromhex(address[2:])
+
+class BlockPrefilter:
+    """
+    Cheap pre-check for blocks: tests the block's logs bloom for the monitored addresses
+    as indexed topics (e.g. the from/to of an ERC-20 Transfer), and only if one of them
+    may be present asks the node for the matching logs to get the candidate tx hashes.
+    Blocks that do not touch a monitored address never need a full-transaction fetch.
+    """
+
+    def __init__(self, web3, addresses):
+        self.web3 = web3
+        self.topics = {}
+        self.bloom_masks = {}
+        for address in addresses:
+            topic = address_topic(Web3.to_checksum_address(address))
+            mask = 0
+            for bit in bloom_bits(topic):
+                mask |= 1 << bit
+            self.topics[address.lower()] = Web3.to_hex(topic)
+            self.bloom_masks[address.lower()] = mask
+
+    def match_bloom(self, logs_bloom):
+        """
+        Returns the monitored addresses that may appear as a topic in the block's logs.
+        A bloom can give false positives, but never false negatives.
+        """
+        bloom = int.from_bytes(bytes(logs_bloom), byteorder='big')
+        return [address for address, mask in self.bloom_masks.items() if bloom & mask == mask]
+
+    def candidate_transactions(self, block_hash, addresses):
+        """
+        Returns the hashes of the transactions in the block that emitted a log with one of
+        the given addresses as first or second indexed argument, in block order.
+        """
+        topics = [self.topics[address] for address in addresses]
+        logs = []
+        for topic_filter in ([None, topics], [None, None, topics]):
+            logs.extend(self.web3.eth.get_logs({'blockHash': block_hash, 'topics': topic_filter}))
+
+        tx_hashes = {}
+        for log in sorted(logs, key=lambda log: (log['transactionIndex'], log['logIndex'])):
+            tx_hashes.setdefault(Web3.to_hex(log['transactionHash']), None)
+        logging.info(f"Logs bloom matched {addresses}. Candidate transactions: {list(tx_hashes)}")
+        return list(tx_hashes)
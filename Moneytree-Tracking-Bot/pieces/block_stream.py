@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import queue
+import threading
+from web3 import AsyncWeb3, WebsocketProviderV2
+
+class BlockStream:
+    """
+    Streams new block heads (and optionally full pending transactions) from a WebSocket
+    Ethereum node into thread-safe queues that the synchronous block loop can consume.
+
+    The stream reconnects on its own whenever the socket drops. While it is disconnected
+    `connected` is cleared so the caller can fall back to HTTP polling.
+    """
+
+    def __init__(self, ws_url, subscribe_pending=False, reconnect_delay=5, max_pending=10000):
+        self.ws_url = ws_url
+        self.subscribe_pending = subscribe_pending
+        self.reconnect_delay = reconnect_delay
+        self.heads = queue.Queue()
+        self.pending = queue.Queue(maxsize=max_pending)
+        self.connected = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the subscription loop in a background daemon thread.
+        """
+        self._thread = threading.Thread(target=self._run, name='block-stream', daemon=True)
+        self._thread.start()
+        return self
+
+    def next_head(self, timeout):
+        """
+        Blocks until a new head arrives and returns the highest block number queued so far.
+        Returns None if nothing arrived within the timeout.
+        """
+        try:
+            block_number = self.heads.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+        # Collapse any heads that piled up while the caller was busy
+        while True:
+            try:
+                block_number = max(block_number, self.heads.get_nowait())
+            except queue.Empty:
+                return block_number
+
+    def _run(self):
+        asyncio.run(self._listen_forever())
+
+    async def _listen_forever(self):
+        while True:
+            try:
+                await self._listen()
+                logging.warning("WebSocket subscription ended. Reconnecting...")
+            except Exception as e:
+                logging.warning(f"WebSocket subscription dropped: {e}. Falling back to HTTP polling.")
+            self.connected.clear()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def _listen(self):
+        async with AsyncWeb3.persistent_websocket(WebsocketProviderV2(self.ws_url)) as w3:
+            heads_subscription = await w3.eth.subscribe('newHeads')
+            pending_subscription = None
+            if self.subscribe_pending:
+                # Ask for full transaction objects so the sender can be checked without an extra RPC call
+                pending_subscription = await w3.eth.subscribe('newPendingTransactions', True)
+
+            self.connected.set()
+            logging.info(f"Subscribed to new heads over WebSocket (pending transactions: {self.subscribe_pending}).")
+
+            async for response in w3.ws.process_subscriptions():
+                subscription = response.get('subscription')
+                result = response.get('result')
+                if subscription == heads_subscription:
+                    block_number = result['number']
+                    if isinstance(block_number, str):
+                        block_number = int(block_number, 16)
+                    self.heads.put(block_number)
+                elif pending_subscription and subscription == pending_subscription:
+                    try:
+                        self.pending.put_nowait(result)
+                    except queue.Full:
+                        # Pending transactions are only an early signal; dropping some is harmless
+                        pass
@@ -0,0 +1,143 @@
+import logging
+import queue
+import threading
+import time
+
+class PipelineStage:
+    """
+    A bounded queue served by a pool of worker threads. A full queue applies backpressure
+    to the producer; the time spent waiting is recorded alongside the queue-depth metrics.
+    """
+
+    def __init__(self, name, handler, workers=1, maxsize=1000):
+        self.name = name
+        self.handler = handler
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.lock = threading.Lock()
+        self.processed = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.blocked_seconds = 0.0
+
+    def start(self):
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f'{self.name}-{i}', daemon=True).start()
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            logging.warning(f"Pipeline stage '{self.name}' is full ({self.queue.maxsize} items). Waiting for room...")
+            started = time.monotonic()
+            self.queue.put(item)
+            with self.lock:
+                self.blocked_seconds += time.monotonic() - started
+        with self.lock:
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            try:
+                self.handler(item)
+                with self.lock:
+                    self.processed += 1
+            except Exception as e:
+                with self.lock:
+                    self.errors += 1
+                logging.error(f"Error in pipeline stage '{self.name}': {e}")
+            finally:
+                self.queue.task_done()
+
+    def metrics(self):
+        with self.lock:
+            return {
+                'depth': self.queue.qsize(),
+                'max_depth': self.max_depth,
+                'processed': self.processed,
+                'errors': self.errors,
+                'blocked_seconds': round(self.blocked_seconds, 3)
+            }
+
+class EventPipeline:
+    """
+    Decouples block scanning from downstream I/O. The scanner submits matching transactions,
+    a worker pool enriches them (action lookup, market cap) into messages, and a single sender
+    delivers the messages in the order the transactions were submitted: every event gets a
+    sequence number, and a message enriched ahead of its turn is held until the ones before it
+    are done. At most `max_held` events are enriched ahead of the oldest unfinished one; beyond
+    that the enrich workers wait, and the enrichment queue applies backpressure as usual.
+    """
+
+    def __init__(self, enrich, send, enrich_workers=4, queue_size=1000, metrics_interval=60, max_held=None):
+        self.enrich = enrich
+        self.enrich_stage = PipelineStage('enrich', self._enrich, workers=enrich_workers, maxsize=queue_size)
+        self.send_stage = PipelineStage('send', send, workers=1, maxsize=queue_size)
+        self.metrics_interval = metrics_interval
+        self.max_held = max(max_held or queue_size, enrich_workers)
+        self.submitted = 0
+        self.submit_lock = threading.Lock()
+        self.turn = threading.Condition()
+        self.send_lock = threading.Lock()
+        self.next_to_send = 0
+        self.held = {}
+
+    def start(self):
+        self.enrich_stage.start()
+        self.send_stage.start()
+        threading.Thread(target=self._log_metrics, name='pipeline-metrics', daemon=True).start()
+        return self
+
+    def submit(self, event):
+        """
+        Scanner stage entry point. Only waits if the enrichment queue is full.
+        """
+        # Events enter the queue in sequence order, so the oldest unfinished one is always being enriched
+        with self.submit_lock:
+            seq = self.submitted
+            self.submitted += 1
+            self.enrich_stage.put((seq, event))
+
+    def _enrich(self, item):
+        seq, event = item
+        with self.turn:
+            while seq - self.next_to_send >= self.max_held:
+                self.turn.wait()
+        result = None
+        try:
+            result = self.enrich(event)
+        finally:
+            # A failed or filtered event still takes its turn, so the ones after it are not held forever
+            with self.turn:
+                self.held[seq] = result
+            self._send_ready()
+
+    def _send_ready(self):
+        # One thread at a time hands results over in order; the state lock is not held while the send queue may block
+        with self.send_lock:
+            while True:
+                with self.turn:
+                    ready = []
+                    while self.next_to_send in self.held:
+                        ready.append(self.held.pop(self.next_to_send))
+                        self.next_to_send += 1
+                    if ready:
+                        self.turn.notify_all()
+                if not ready:
+                    return
+                for result in ready:
+                    if result:
+                        self.send_stage.put(result)
+
+    def metrics(self):
+        return {
+            'scan': {'submitted': self.submitted, 'held': len(self.held), 'max_held': self.max_held},
+            'enrich': self.enrich_stage.metrics(),
+            'send': self.send_stage.metrics()
+        }
+
+    def _log_metrics(self):
+        while True:
+            time.sleep(self.metrics_interval)
+            logging.info(f"Pipeline metrics: {self.metrics()}")
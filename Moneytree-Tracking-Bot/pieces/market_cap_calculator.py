@@ -3,6 +3,10 @@ from web3 import Web3
 import logging
 import yaml
 import os
+from pieces.token_cache import token_cache
+from pieces.multicall import Multicall
+from pieces.eth_price_oracle import EthPriceOracle
+from pieces.pool_cache import pool_cache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -46,41 +50,109 @@ with open('abis/IUniswapV3Factory.json') as file:
 with open('abis/IUniswapV3Pool.json') as file:
     uniswap_v3_pool_abi = json.load(file)
 
-chainlink_price_feed_abi = json.loads('[{"inputs":[],"name":"latestRoundData","outputs":[{"internalType":"uint80","name":"roundId","type":"uint80"},{"internalType":"int256","name":"answer","type":"int256"},{"internalType":"uint256","name":"startedAt","type":"uint256"},{"internalType":"uint256","name":"updatedAt","type":"uint256"},{"internalType":"uint80","name":"answeredInRound","type":"uint80"}],"stateMutability":"view","type":"function"}]')
 
 # Create contract instances
 uniswap_v2_factory = web3.eth.contract(address=Web3.to_checksum_address(UNISWAP_V2_FACTORY_ADDRESS), abi=uniswap_v2_factory_abi)
 uniswap_v3_factory = web3.eth.contract(address=Web3.to_checksum_address(UNISWAP_V3_FACTORY_ADDRESS), abi=uniswap_v3_factory_abi)
-chainlink_price_feed = web3.eth.contract(address=Web3.to_checksum_address(CHAINLINK_ETH_USD_FEED), abi=chainlink_price_feed_abi)
+
+# Batched reads, see pieces/multicall.py
+multicall = Multicall(web3)
+
+# Cached Chainlink ETH/USD price, refreshed in the background
+eth_price_oracle = EthPriceOracle(web3, CHAINLINK_ETH_USD_FEED, refresh_interval=config.get('ETH_PRICE_REFRESH_INTERVAL', 12))
+
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+UNISWAP_V3_FEE_TIERS = [500, 3000, 10000]
 
 def get_eth_price_in_usd():
-    latest_round_data = chainlink_price_feed.functions.latestRoundData().call()
-    eth_price_in_usd = latest_round_data[1] / 1e8  # Chainlink prices have 8 decimals
-    logging.info(f"ETH price in USD: {eth_price_in_usd}")
+    eth_price_in_usd = eth_price_oracle.get_price()
+    if eth_price_in_usd is not None:
+        logging.info(f"ETH price in USD: {eth_price_in_usd} (updated {eth_price_oracle.age():.0f} seconds ago)")
     return eth_price_in_usd
 
-def get_token_details(token_address):
+def fetch_token_metadata(token_address):
     token_contract = web3.eth.contract(address=Web3.to_checksum_address(token_address), abi=uniswap_v2_erc20_abi)
     name = token_contract.functions.name().call()
     symbol = token_contract.functions.symbol().call()
     decimals = token_contract.functions.decimals().call()
-    total_supply = token_contract.functions.totalSupply().call() / (10 ** decimals)
+    return name, symbol, decimals
+
+def fetch_token_total_supply(token_address):
+    token_contract = web3.eth.contract(address=Web3.to_checksum_address(token_address), abi=uniswap_v2_erc20_abi)
+    return token_contract.functions.totalSupply().call()
+
+def get_token_details(token_address):
+    name, symbol, decimals, total_supply_raw = token_cache.get(token_address, fetch_token_metadata, fetch_token_total_supply)
+    total_supply = total_supply_raw / (10 ** decimals)
     logging.info(f"Token details - Name: {name}, Symbol: {symbol}, Decimals: {decimals}, Total Supply: {total_supply}")
     return name, symbol, decimals, total_supply
 
-def get_uniswap_v2_price(token_address, token_decimals):
-    pair_address = uniswap_v2_factory.functions.getPair(Web3.to_checksum_address(token_address), Web3.to_checksum_address(WETH_ADDRESS)).call()
-    
-    if pair_address == '0x0000000000000000000000000000000000000000':
-        logging.info("No pair address found on Uniswap V2.")
-        return None, None
+def get_token_symbol_and_decimals(token_address):
+    name, symbol, decimals = token_cache.get_metadata(token_address, fetch_token_metadata)
+    return symbol, decimals
 
-    logging.info(f"Pair address found: {pair_address}")
-    pair_contract = web3.eth.contract(address=Web3.to_checksum_address(pair_address), abi=uniswap_v2_pair_abi)
-    reserves = pair_contract.functions.getReserves().call()
-    
+def find_pools(token_address, extra_calls=(), block_identifier='latest'):
+    """
+    Looks up the Uniswap V2 pair and the V3 pools of the token against WETH in one batched call,
+    together with any extra calls. Returns (block_number, pair_address, pools, extra_results)
+    where pools lists (fee, pool_address) for the fee tiers that have a pool.
+    """
+    token = Web3.to_checksum_address(token_address)
+    weth = Web3.to_checksum_address(WETH_ADDRESS)
+    calls = [(uniswap_v2_factory, 'getPair', [token, weth])]
+    calls += [(uniswap_v3_factory, 'getPool', [token, weth, fee]) for fee in UNISWAP_V3_FEE_TIERS]
+    block_number, results = multicall.call(calls + list(extra_calls), block_identifier)
+
+    pair_address = Web3.to_checksum_address(results[0]) if results[0] not in (None, ZERO_ADDRESS) else None
+    pools = [
+        (fee, Web3.to_checksum_address(pool_address))
+        for fee, pool_address in zip(UNISWAP_V3_FEE_TIERS, results[1:1 + len(UNISWAP_V3_FEE_TIERS)])
+        if pool_address not in (None, ZERO_ADDRESS)
+    ]
+    return block_number, pair_address, pools, results[1 + len(UNISWAP_V3_FEE_TIERS):]
+
+def read_pool_states(pair_address, pools, block_identifier='latest', extra_calls=()):
+    """
+    Reads getReserves/token0 of the V2 pair and slot0/liquidity of the V3 pools (plus any extra calls)
+    in one batched call pinned to block_identifier. Returns (block_number, pair_state, pool_states, extra_results)
+    where pair_state is (reserves, token0) and pool_states lists (fee, pool_address, slot0, liquidity).
+    """
+    calls = []
+    if pair_address:
+        pair_contract = web3.eth.contract(address=pair_address, abi=uniswap_v2_pair_abi)
+        calls += [(pair_contract, 'getReserves', []), (pair_contract, 'token0', [])]
+    for fee, pool_address in pools:
+        pool_contract = web3.eth.contract(address=pool_address, abi=uniswap_v3_pool_abi)
+        calls += [(pool_contract, 'slot0', []), (pool_contract, 'liquidity', [])]
+    block_number, results = multicall.call(calls + list(extra_calls), block_identifier)
+
+    pair_state = (results.pop(0), results.pop(0)) if pair_address else None
+    pool_states = [(fee, pool_address, results[2 * i], results[2 * i + 1]) for i, (fee, pool_address) in enumerate(pools)]
+    return block_number, pair_state, pool_states, results[2 * len(pools):]
+
+def read_pools(token_address, extra_calls=()):
+    """
+    Reads the pool states of the token (plus any extra calls) at a single block. The pair and pool
+    addresses come from pool_cache, so this is one batched call once the token has been resolved
+    and two the first time. Returns (block_number, pair_address, pair_state, pool_states, extra_results).
+    """
+    resolved = pool_cache.get(token_address, UNISWAP_V3_FEE_TIERS)
+    if resolved is not None:
+        pair_address, pools = resolved
+        block_number, pair_state, pool_states, extra_results = read_pool_states(pair_address, pools, extra_calls=extra_calls)
+        return block_number, pair_address, pair_state, pool_states, extra_results
+
+    block_number, pair_address, pools, extra_results = find_pools(token_address, extra_calls=extra_calls)
+    pool_cache.store(token_address, pair_address, pools, UNISWAP_V3_FEE_TIERS)
+    _, pair_state, pool_states, _ = read_pool_states(pair_address, pools, block_number)
+    return block_number, pair_address, pair_state, pool_states, extra_results
+
+def compute_uniswap_v2_price(token_address, token_decimals, pair_state):
+    reserves, token0 = pair_state
+    if reserves is None or token0 is None:
+        logging.error("Could not read the Uniswap V2 pair reserves.")
+        return None
     reserve0, reserve1 = reserves[0], reserves[1]
-    token0 = pair_contract.functions.token0().call()
 
     if Web3.to_checksum_address(token_address) == Web3.to_checksum_address(token0):
         reserve_token = reserve0
@@ -96,62 +168,92 @@ def get_uniswap_v2_price(token_address, token_decimals):
 
     if adjusted_reserve_token == 0:
         logging.error("Adjusted reserve token is zero, cannot calculate token price.")
-        return None, None
+        return None
 
     token_price = adjusted_reserve_weth / adjusted_reserve_token
     logging.info(f"Token price on Uniswap V2: {token_price} ETH")
-    return token_price, pair_address
+    return token_price
+
+def compute_uniswap_v3_price(pool_states):
+    for fee, pool_address, slot0, liquidity in pool_states:
+        if slot0 is None or liquidity is None:
+            logging.error(f"Error fetching Uniswap V3 price for fee tier {fee}: pool call failed")
+            continue
+        sqrtPriceX96 = slot0[0]
+
+        # Verify liquidity is above a reasonable threshold
+        if liquidity < 10**6:  # Set a threshold for minimum liquidity
+            logging.warning(f"Liquidity too low in Uniswap V3 pool (fee tier {fee}): {liquidity}")
+            continue
+
+        # Correct calculation for token price in WETH
+        token_price_in_weth = (sqrtPriceX96 ** 2) / (2 ** 192)
+        if token_price_in_weth == 0:
+            continue
+
+        # Since the price is in terms of WETH per token, invert if needed
+        token_price = 1 / token_price_in_weth
+
+        logging.info(f"Token price on Uniswap V3 (fee tier {fee}): {token_price} WETH")
+
+        # Check for unreasonable prices (e.g., greater than a reasonable range)
+        if token_price > 1000 or token_price < 0.0000001:
+            logging.warning(f"Token price {token_price} WETH seems unrealistic. Skipping this pool.")
+            continue
+
+        return token_price, pool_address
 
-def get_uniswap_v3_price(token_address, token_decimals):
-    fee_tiers = [500, 3000, 10000]
-    
-    for fee in fee_tiers:
-        try:
-            # Fetch pool address from Uniswap V3 Factory contract
-            pool_address = uniswap_v3_factory.functions.getPool(Web3.to_checksum_address(token_address), Web3.to_checksum_address(WETH_ADDRESS), fee).call()
-            
-            if pool_address != '0x0000000000000000000000000000000000000000':
-                pool_contract = web3.eth.contract(address=Web3.to_checksum_address(pool_address), abi=uniswap_v3_pool_abi)
-                slot0 = pool_contract.functions.slot0().call()
-                sqrtPriceX96 = slot0[0]
-                
-                # Fetch liquidity and verify it's above a reasonable threshold
-                liquidity = pool_contract.functions.liquidity().call()
-                if liquidity < 10**6:  # Set a threshold for minimum liquidity
-                    logging.warning(f"Liquidity too low in Uniswap V3 pool (fee tier {fee}): {liquidity}")
-                    continue
-                
-                # Correct calculation for token price in WETH
-                token_price_in_weth = (sqrtPriceX96 ** 2) / (2 ** 192)
-                
-                # Since the price is in terms of WETH per token, invert if needed
-                token_price = 1 / token_price_in_weth
-                
-                logging.info(f"Token price on Uniswap V3 (fee tier {fee}): {token_price} WETH")
-                
-                # Check for unreasonable prices (e.g., greater than a reasonable range)
-                if token_price > 1000 or token_price < 0.0000001:
-                    logging.warning(f"Token price {token_price} WETH seems unrealistic. Skipping this pool.")
-                    continue
-                
-                return token_price, pool_address
-        except Exception as e:
-            logging.error(f"Error fetching Uniswap V3 price for fee tier {fee}: {e}")
-    
     logging.info("No reliable pool address found on Uniswap V3.")
     return None, None
 
+def get_uniswap_v2_price(token_address, token_decimals):
+    _, pair_address, pair_state, _, _ = read_pools(token_address)
+
+    if pair_address is None:
+        logging.info("No pair address found on Uniswap V2.")
+        return None, None
+
+    logging.info(f"Pair address found: {pair_address}")
+    token_price = compute_uniswap_v2_price(token_address, token_decimals, pair_state)
+    if token_price is None:
+        return None, None
+    return token_price, pair_address
+
+def get_uniswap_v3_price(token_address, token_decimals):
+    _, _, _, pool_states, _ = read_pools(token_address)
+    return compute_uniswap_v3_price(pool_states)
+
 def calculate_market_cap(token_address):
     eth_price_in_usd = get_eth_price_in_usd()
     if eth_price_in_usd is None:
         logging.info("Cannot calculate market cap without ETH price.")
         return None
 
-    name, symbol, decimals, total_supply = get_token_details(token_address)
-    token_price, pair_address = get_uniswap_v2_price(token_address, decimals)
-    
+    # Token metadata and pool states, all read at the same block
+    token = Web3.to_checksum_address(token_address)
+    token_contract = web3.eth.contract(address=token, abi=uniswap_v2_erc20_abi)
+    extra_calls = [(token_contract, function_name, []) for function_name in ('name', 'symbol', 'decimals', 'totalSupply')]
+    block_number, pair_address, pair_state, pool_states, results = read_pools(token, extra_calls=extra_calls)
+    name, symbol, decimals, total_supply_raw = results
+
+    if None in (name, symbol, decimals):
+        # Non-standard metadata (e.g. bytes32 names), fall back to the cache and plain calls
+        name, symbol, decimals = token_cache.get_metadata(token, fetch_token_metadata)
+    else:
+        token_cache.get_metadata(token, lambda address: (name, symbol, decimals))
+    if total_supply_raw is None:
+        total_supply_raw = fetch_token_total_supply(token)
+    total_supply = total_supply_raw / (10 ** decimals)
+    logging.info(f"Token details - Name: {name}, Symbol: {symbol}, Decimals: {decimals}, Total Supply: {total_supply}")
+
+    token_price = None
+    if pair_address is not None:
+        logging.info(f"Pair address found: {pair_address}")
+        token_price = compute_uniswap_v2_price(token, decimals, pair_state)
+    else:
+        logging.info("No pair address found on Uniswap V2.")
     if token_price is None:
-        token_price, pair_address = get_uniswap_v3_price(token_address, decimals)
+        token_price, pair_address = compute_uniswap_v3_price(pool_states)
 
     if token_price is not None:
         market_cap_eth = total_supply * token_price
@@ -0,0 +1,114 @@
+import json
+import logging
+import os
+import threading
+import time
+from web3 import Web3
+
+# Get the absolute path of the parent directory
+parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+
+# Shared by both bots
+cache_directory = os.path.join(parent_directory, 'logs/cache')
+os.makedirs(cache_directory, exist_ok=True)
+pool_cache_path = os.path.join(cache_directory, 'pools.json')
+
+class PoolAddressCache:
+    """
+    Cache of the Uniswap V2 pair and V3 pools of each token against WETH, keyed by checksummed
+    token address. Pair and pool addresses never change once created, so found addresses are
+    kept forever and persisted in a JSON file shared by both bots. Venues without a pool are
+    only trusted for `negative_ttl` seconds after the lookup, since the pool may be created later;
+    the time of the lookup is persisted with the addresses, so a restart does not expire it.
+    """
+
+    def __init__(self, path, negative_ttl=60):
+        self.path = path
+        self.negative_ttl = negative_ttl
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.file_mtime = None
+        self._load()
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.file_mtime:
+                return
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+            self.file_mtime = mtime
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Ignoring unreadable pool cache '{self.path}': {e}")
+            return
+        for address, entry in stored.items():
+            self._merge(address, entry.get('pair'), entry.get('pools', {}), checked=entry.get('checked', 0))
+
+    def _save(self):
+        # Only found addresses are persisted, merged with what the other bot may have written
+        self._load()
+        stored = {}
+        for address, entry in self.entries.items():
+            pair_address, pools = self._found(address)
+            if pair_address or pools:
+                stored[address] = {'pair': pair_address, 'pools': pools, 'checked': entry['checked']}
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(stored, f)
+            os.replace(tmp_path, self.path)
+            self.file_mtime = os.path.getmtime(self.path)
+        except OSError as e:
+            logging.error(f"Failed to write pool cache '{self.path}': {e}")
+
+    def _merge(self, address, pair_address, pools, checked):
+        entry = self.entries.setdefault(address, {'pair': None, 'pools': {}, 'checked': 0})
+        entry['pair'] = entry['pair'] or pair_address
+        for fee, pool_address in pools.items():
+            entry['pools'][str(fee)] = entry['pools'].get(str(fee)) or pool_address
+        entry['checked'] = max(entry['checked'], checked)
+
+    def get(self, token_address, fee_tiers):
+        """
+        Returns (pair_address, [(fee, pool_address), ...]) for the token, or None if it has to be
+        resolved again: it is unknown, or a venue had no pool and that answer has expired.
+        """
+        address = Web3.to_checksum_address(token_address)
+        with self.lock:
+            entry = self.entries.get(address)
+            if entry is None:
+                # Another process may have resolved it in the meantime
+                self._load()
+                entry = self.entries.get(address)
+            if entry is None:
+                return None
+            pools = [(fee, entry['pools'].get(str(fee))) for fee in fee_tiers]
+            complete = entry['pair'] is not None and all(pool_address for fee, pool_address in pools)
+            if not complete and time.time() - entry['checked'] > self.negative_ttl:
+                return None
+            return entry['pair'], [(fee, pool_address) for fee, pool_address in pools if pool_address]
+
+    def store(self, token_address, pair_address, pools, fee_tiers):
+        """
+        Records a factory lookup. pools lists (fee, pool_address) for the fee tiers that have a pool;
+        the other tiers in fee_tiers are remembered as missing.
+        """
+        address = Web3.to_checksum_address(token_address)
+        found = dict(pools)
+        with self.lock:
+            self._merge(address, pair_address, {fee: found.get(fee) for fee in fee_tiers}, checked=time.time())
+            # Also saved when nothing new was found, so the other processes see the fresh lookup time
+            pair_address, pools = self._found(address)
+            if pair_address or pools:
+                self._save()
+
+    def _found(self, address):
+        entry = self.entries.get(address)
+        if entry is None:
+            return None
+        return entry['pair'], {fee: pool for fee, pool in entry['pools'].items() if pool}
+
+# Shared instance for the whole process
+pool_cache = PoolAddressCache(pool_cache_path)
@@ -0,0 +1,62 @@
+import unittest
+from types import SimpleNamespace
+from web3 import Web3
+from pieces.block_filter import BlockPrefilter, address_topic
+
+MONITORED = '0x1111111111111111111111111111111111111111'
+OTHER = '0x2222222222222222222222222222222222222222'
+
+def logs_bloom(*values):
+    """
+    Builds a logs bloom the way the yellow paper defines it: each value sets three bits, taken
+    from the first three byte pairs of its keccak hash, counted from the end of the 256 bytes.
+    """
+    bloom = bytearray(256)
+    for value in values:
+        value_hash = Web3.keccak(value)
+        for i in (0, 2, 4):
+            bit = ((value_hash[i] << 8) | value_hash[i + 1]) & 2047
+            bloom[255 - bit // 8] |= 1 << (bit % 8)
+    return bytes(bloom)
+
+class FakeEth:
+
+    def __init__(self, logs):
+        self.logs = logs
+        self.filters = []
+
+    def get_logs(self, log_filter):
+        self.filters.append(log_filter)
+        position = len(log_filter['topics']) - 1
+        return [log for log in self.logs if len(log['topics']) > position and log['topics'][position] in log_filter['topics'][position]]
+
+class BlockPrefilterTest(unittest.TestCase):
+
+    def test_matches_an_address_used_as_topic(self):
+        prefilter = BlockPrefilter(None, [MONITORED])
+        bloom = logs_bloom(Web3.to_bytes(hexstr=OTHER), address_topic(Web3.to_checksum_address(MONITORED)))
+        self.assertEqual(prefilter.match_bloom(bloom), [MONITORED])
+
+    def test_skips_a_block_without_the_address(self):
+        prefilter = BlockPrefilter(None, [MONITORED])
+        bloom = logs_bloom(address_topic(Web3.to_checksum_address(OTHER)), Web3.to_bytes(hexstr=MONITORED))
+        # The address emitting a log is not the address as a topic
+        self.assertEqual(prefilter.match_bloom(bloom), [])
+        self.assertEqual(prefilter.match_bloom(bytes(256)), [])
+
+    def test_candidate_transactions_in_block_order(self):
+        topic = Web3.to_hex(address_topic(Web3.to_checksum_address(MONITORED)))
+        logs = [
+            {'topics': ['0xtransfer', '0xsender', topic], 'transactionIndex': 5, 'logIndex': 9, 'transactionHash': b'\x05' * 32},
+            {'topics': ['0xtransfer', topic, '0xrecipient'], 'transactionIndex': 2, 'logIndex': 3, 'transactionHash': b'\x02' * 32},
+            {'topics': ['0xtransfer', topic, topic], 'transactionIndex': 2, 'logIndex': 4, 'transactionHash': b'\x02' * 32},
+        ]
+        eth = FakeEth(logs)
+        prefilter = BlockPrefilter(SimpleNamespace(eth=eth), [MONITORED])
+
+        tx_hashes = prefilter.candidate_transactions('0xblock', [MONITORED])
+        self.assertEqual(tx_hashes, [Web3.to_hex(b'\x02' * 32), Web3.to_hex(b'\x05' * 32)])
+        self.assertEqual([log_filter['blockHash'] for log_filter in eth.filters], ['0xblock', '0xblock'])
+
+if __name__ == '__main__':
+    unittest.main()
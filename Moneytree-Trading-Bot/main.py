@@ -1,4 +1,5 @@
 import asyncio
+import time
 from flask import Flask, request, jsonify
 import os
 from logging.handlers import TimedRotatingFileHandler
@@ -8,16 +9,19 @@ import yaml
 from web3 import Web3
 from asgiref.wsgi import WsgiToAsgi
 from datetime import datetime, timezone
-from multiprocessing import Process
 from pieces.filters import filter_message, extract_token_address
-from pieces.uniswap import get_uniswap_v2_price, get_uniswap_v3_price, get_token_details
+from pieces.uniswap import get_uniswap_price, get_token_details, get_token_decimals, eth_price_oracle
 from pieces.text_utils import insert_zero_width_space
 from pieces.telegram_utils import send_telegram_message
 from pieces.market_cap import calculate_market_cap
-from pieces.price_change_checker import check_no_change_threshold
-from pieces.trading_buy import buy_token
+from pieces.price_change_checker import NoChangeWindow, check_no_change_threshold
+from pieces.trading_buy import buy_token, buy_engine
 from pieces.trading_sell import sell_token
+from pieces.trading_utils import start_stuck_transaction_watcher, scam_checker
 from pieces.statistics import log_transaction
+from pieces.position_workers import PositionWorkerPool
+from pieces.price_feed import PriceFeed
+from pieces.position_board import PositionBoard
 
 app = Flask(__name__)
 
@@ -80,6 +84,15 @@ ENABLE_MARKET_CAP_FILTER = config['ENABLE_MARKET_CAP_FILTER']
 ENABLE_PRICE_CHANGE_CHECKER = config['ENABLE_PRICE_CHANGE_CHECKER']
 ENABLE_TRADING = config['ENABLE_TRADING']
 
+# Position workers
+POSITION_WORKERS = config.get('POSITION_WORKERS', 4)
+POSITION_WORKER_THREADS = config.get('POSITION_WORKER_THREADS', 32)
+PRICE_FEED_POLL_INTERVAL = config.get('PRICE_FEED_POLL_INTERVAL', 1)
+PRICE_TICK_TIMEOUT = config.get('PRICE_TICK_TIMEOUT', 60)
+
+# Redis of the console, open positions are shown on its dashboard
+REDIS_URL = config.get('REDIS_URL', 'redis://localhost:6379')
+
 # Load addresses to monitor from the configuration
 ADDRESSES_TO_MONITOR = config['ADDRESSES_TO_MONITOR']
 
@@ -109,16 +122,15 @@ with open('abis/IUniswapV3Pool.json') as file:
 uniswap_v2_factory = web3.eth.contract(address=Web3.to_checksum_address(UNISWAP_V2_FACTORY_ADDRESS), abi=uniswap_v2_factory_abi)
 uniswap_v3_factory = web3.eth.contract(address=Web3.to_checksum_address(UNISWAP_V3_FACTORY_ADDRESS), abi=uniswap_v3_factory_abi)
 
+# Follows the pool events of every watched token for all positions of a worker
+price_feed = PriceFeed(poll_interval=PRICE_FEED_POLL_INTERVAL)
+
+# Open positions and their latest prices, for the console's dashboard
+position_board = PositionBoard(REDIS_URL)
+
 def calculate_token_amount(eth_amount, token_price):
     return eth_amount / token_price
 
-def get_token_decimals(token_address):
-    token_address = Web3.to_checksum_address(token_address)
-    token_contract = web3.eth.contract(address=token_address, abi=uniswap_v2_erc20_abi)
-    decimals = token_contract.functions.decimals().call()
-    logging.info(f"Token decimals for {token_address}: {decimals}")
-    return decimals
-
 def format_large_number(number):
     if number >= 1_000_000_000:
         return f"{number / 1_000_000_000:.1f}B"
@@ -138,35 +150,36 @@ async def monitor_price(token_address, initial_price, token_decimals, transactio
 
     monitoring_id = tx_hash[:8]
 
-    start_time = datetime.now(timezone.utc)
+    no_change_window = NoChangeWindow(datetime.now(timezone.utc))
     sell_reason = ''
-    price_history = []
     use_moonbag = False  # Initialize use_moonbag to ensure it is always defined
 
     logging.info(f"Started monitoring for transaction {monitoring_id}. Initial price: {initial_price}, Token: {symbol}")
 
+    ticks = price_feed.subscribe(token_address, token_decimals)
     while True:
         try:
-            current_price = None
-            current_price, pair_address = get_uniswap_v2_price(token_address, token_decimals)
+            # Wait for the price at the next block, reading it directly if the feed has gone quiet
+            try:
+                block_number, current_price, pair_address = await asyncio.wait_for(ticks.get(), PRICE_TICK_TIMEOUT)
+            except asyncio.TimeoutError:
+                logging.warning(f"No price tick for {symbol} in {PRICE_TICK_TIMEOUT} seconds. Reading the price directly...")
+                current_price, pair_address = await asyncio.to_thread(get_uniswap_price, token_address, token_decimals)
+                block_number = 'latest'
+
+            # Skip this block if no valid price is available
             if current_price is None:
-                current_price, pair_address = get_uniswap_v3_price(token_address, token_decimals)
-
-            # Skip this iteration if no valid price is fetched
-            if current_price is None:
-                logging.warning(f"Failed to fetch a valid price for token {symbol} on both Uniswap V2 and V3. Retrying...")
-                await asyncio.sleep(3)
-                continue  # Retry fetching the price after a delay
-
-            # Only proceed with valid prices
-            price_history.append((datetime.now(timezone.utc), current_price))
+                logging.warning(f"Failed to fetch a valid price for token {symbol} on both Uniswap V2 and V3 at block {block_number}. Waiting for the next block...")
+                continue
 
             price_increase = (current_price - initial_price) / initial_price
             price_decrease = (initial_price - current_price) / initial_price
             percent_change = ((current_price - initial_price) / initial_price) * 100
 
             # Log the valid price
-            logging.info(f"Monitoring {monitoring_id} — Current price: {current_price} ETH ({percent_change:.2f}%). — {token_amount} {symbol}.")
+            logging.info(f"Monitoring {monitoring_id} — Current price at block {block_number}: {current_price} ETH ({percent_change:.2f}%). — {token_amount} {symbol}.")
+            position_board.update(tx_hash, wallet_name=from_name, token_symbol=symbol, token_hash=token_address, token_amount=token_amount,
+                                  initial_price=initial_price, price=current_price, percent_change=percent_change, block=block_number)
 
             # Sell conditions...
             if price_increase >= PRICE_INCREASE_THRESHOLD:
@@ -179,24 +192,24 @@ async def monitor_price(token_address, initial_price, token_decimals, transactio
                 break
 
             if ENABLE_PRICE_CHANGE_CHECKER:
-                no_change, token_amount_to_sell, sell_reason, start_time = check_no_change_threshold(
-                    start_time, price_history, monitoring_id, symbol, token_amount)
+                no_change, token_amount_to_sell, sell_reason = check_no_change_threshold(
+                    no_change_window, datetime.now(timezone.utc), current_price, monitoring_id, symbol, token_amount)
                 if no_change:
                     use_moonbag = False
                     break
 
-            await asyncio.sleep(2)
-
         except Exception as e:
             logging.error(f"Error during monitoring for token {symbol}: {e}")
             break
+    price_feed.unsubscribe(token_address, ticks)
+    position_board.remove(tx_hash)
 
     # Execute this block after the loop ends
     sell_tx_hash = None
     profit_or_loss = None
     try:
         if ENABLE_TRADING:
-            sell_tx_hash, profit_or_loss = sell_token(token_address, token_amount, tx_hash, use_moonbag)
+            sell_tx_hash, profit_or_loss = await asyncio.to_thread(sell_token, token_address, token_amount, tx_hash, use_moonbag)
     except Exception as e:
         logging.error(f"Error during sell: {e}")
         
@@ -221,12 +234,12 @@ async def monitor_price(token_address, initial_price, token_decimals, transactio
     )
     if use_moonbag:
         messageS += f'*Moonbag:*\n{token_amount * MOONBAG} {symbol}'
-    send_telegram_message(insert_zero_width_space(messageS))
+    await asyncio.to_thread(send_telegram_message, insert_zero_width_space(messageS))
 
     logging.info(f"Monitoring {monitoring_id} — Monitoring ended due to sell conditions.")
 
-def handle_transaction(data):
-    # Reconfigure logging in the child process to include the PID
+def init_position_worker():
+    # Reconfigure logging in the worker process to include the PID
     logger = logging.getLogger()  # Get the root logger
     for handler in logger.handlers[:]:  # Remove all old handlers
         logger.removeHandler(handler)
@@ -238,11 +251,20 @@ def handle_transaction(data):
     file_handler.setFormatter(formatter)
     logger.addHandler(file_handler)
     logger.setLevel(logging.INFO)
+    logger.info(f"Position worker started. PID: {os.getpid()}")
 
-    # Get the PID for this process
+    eth_price_oracle.get_price()  # Warm the cache so the first market cap check does not wait for the feed
+    if ENABLE_TRADING:
+        buy_engine.start()  # Fee estimates and chain id are ready before the first signal
+
+def open_position(data):
+    """
+    Filters the signal, checks the market cap and buys. Returns the arguments of monitor_price,
+    or None if no position was opened. Blocking, runs in a worker thread.
+    """
     pid = os.getpid()
-    logger.info(f"Starting a new process to handle the transaction. PID: {os.getpid()}")
-    
+    logger.info(f"Handling the transaction in position worker PID: {pid}")
+
     # The logic from your transaction handler
     initial_eth_balance = None
 
@@ -252,6 +274,10 @@ def handle_transaction(data):
         if token_address:
             logger.info(f"Extracted token address: {token_address}")
 
+            if ENABLE_TRADING:
+                # Evaluate the scam checks in the background while the market cap and price are checked
+                scam_checker.start(Web3.to_checksum_address(token_address))
+
             name, symbol, decimals, total_supply = get_token_details(token_address)
 
             # Statistics
@@ -296,9 +322,7 @@ def handle_transaction(data):
                     })
                     return
 
-            initial_price, pair_address = get_uniswap_v2_price(token_address, decimals)
-            if initial_price is None:
-                initial_price, pair_address = get_uniswap_v3_price(token_address, decimals)
+            initial_price, pair_address = get_uniswap_price(token_address, decimals)
             
             if initial_price is not None:
                 logger.info(f"Pair/Pool address: {pair_address}")
@@ -327,7 +351,7 @@ def handle_transaction(data):
                 # If trading is enabled, execute the buy transaction
                 if ENABLE_TRADING:
                     # Capture token amount, transaction hash, initial ETH balance, and initial price from buy_token function
-                    token_amount, buy_tx_hash, initial_eth_balance, initial_price = buy_token(token_address, AMOUNT_OF_ETH, tx_hash, decimals)
+                    token_amount, buy_tx_hash, initial_eth_balance, initial_price = buy_token(token_address, AMOUNT_OF_ETH, tx_hash, decimals, signal_time=data.get('received_at'))
 
                     if token_amount is None:
                         logger.error(f"No token amount for token {token_address}.")
@@ -381,10 +405,7 @@ def handle_transaction(data):
                     'initial_eth_balance': initial_eth_balance
                 }
 
-                if ALLOW_MULTIPLE_TRANSACTIONS:
-                    asyncio.run(monitor_price(token_address, initial_price, decimals, transaction_details))
-                else:
-                    asyncio.run(monitor_price(token_address, initial_price, decimals, transaction_details))
+                return token_address, initial_price, decimals, transaction_details
             else:
                 logger.info("Token price not available on either Uniswap V2 or V3.")
         else:
@@ -392,22 +413,38 @@ def handle_transaction(data):
     else:
         logger.info("No, it does not pass the filters")
 
+async def handle_transaction(data):
+    position = await asyncio.to_thread(open_position, data)
+    if position is not None:
+        await monitor_price(*position)
+
+# Positions are multiplexed as asyncio tasks over a fixed number of worker processes
+position_workers = PositionWorkerPool(handle_transaction, workers=POSITION_WORKERS, threads=POSITION_WORKER_THREADS, initializer=init_position_worker)
+
 @app.route('/transaction', methods=['POST'])
 def transaction():
     data = request.json
+    data['received_at'] = time.time()  # Signal time, the buy latency is measured from here
     logger.info('—————————————————————————————————————————————————————————————————————————————————————————————————————————')
     logger.info(f"Received transaction data: {data}")
 
-    # Start a new process to handle the transaction
-    p = Process(target=handle_transaction, args=(data,))
-    p.start()
-    
+    # Hand the transaction to the least busy position worker
+    worker = position_workers.submit(data)
+    logger.info(f"Transaction handed to position worker {worker}.")
+
     return jsonify({'status': 'processing'}), 200
 
+@app.route('/workers', methods=['GET'])
+def workers():
+    return jsonify(position_workers.status()), 200
+
 def run_server():
     app.run(host='0.0.0.0', port=5000)
 
 if __name__ == '__main__':
+    # Fork the workers before this process opens any RPC connection
+    position_workers.start()
+    start_stuck_transaction_watcher()
     asgi_app = WsgiToAsgi(app)
     import uvicorn
     uvicorn.run(asgi_app, host='0.0.0.0', port=5000, timeout_keep_alive=0)
@@ -0,0 +1,80 @@
+import fcntl
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+MAX_UINT256 = 2 ** 256 - 1
+
+class AllowanceCache:
+    """
+    Allowances the wallet has granted to routers, per token, kept in a JSON file shared by every
+    position worker, so a sell does not need to read allowance() or approve again. Each entry holds
+    the last known allowance and, while an approval is in flight, its transaction hash. Changes take
+    an exclusive lock on a companion lock file. Spending is tracked the way ERC-20 tokens do it: a
+    max approval is never reduced.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self._load()
+                yield state
+                self._save(state)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Ignoring unreadable allowance cache '{self.path}': {e}")
+        return {}
+
+    def _save(self, state):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    @staticmethod
+    def _key(owner, spender, token_address):
+        return f"{owner}:{spender}:{token_address}".lower()
+
+    def get(self, owner, spender, token_address):
+        """
+        Returns {'allowance', 'tx_hash', 'updated_at'} or None if nothing is known.
+        """
+        with self._locked() as state:
+            return state.get(self._key(owner, spender, token_address))
+
+    def set(self, owner, spender, token_address, allowance, tx_hash=None):
+        with self._locked() as state:
+            state[self._key(owner, spender, token_address)] = {'allowance': allowance, 'tx_hash': tx_hash, 'updated_at': time.time()}
+
+    def spend(self, owner, spender, token_address, amount):
+        with self._locked() as state:
+            entry = state.get(self._key(owner, spender, token_address))
+            if entry is not None and entry['allowance'] != MAX_UINT256:
+                entry['allowance'] = max(0, entry['allowance'] - amount)
+                entry['updated_at'] = time.time()
+
+    def forget(self, owner, spender, token_address, keep_pending=False):
+        """
+        Drops the entry. With keep_pending, an entry whose approval is still in flight is kept.
+        """
+        with self._locked() as state:
+            key = self._key(owner, spender, token_address)
+            if keep_pending and state.get(key, {}).get('tx_hash'):
+                return
+            state.pop(key, None)
@@ -0,0 +1,124 @@
+import logging
+import os
+import threading
+import time
+
+class FeeCache:
+    """
+    Base fee and suggested priority fee of the latest block, refreshed by a background thread
+    once per block, so building a transaction needs no fee lookups.
+    """
+
+    def __init__(self, web3, refresh_interval=1):
+        self.web3 = web3
+        self.refresh_interval = refresh_interval
+        self.lock = threading.Lock()
+        self.block_number = None
+        self.base_fee = None
+        self.priority_fee = None
+        self.refresher_pid = None
+
+    def refresh(self):
+        block = self.web3.eth.get_block('latest')
+        if block['number'] == self.block_number:
+            return
+        priority_fee = self.web3.eth.max_priority_fee
+        with self.lock:
+            self.block_number = block['number']
+            self.base_fee = block['baseFeePerGas']
+            self.priority_fee = priority_fee
+
+    def _refresh_loop(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Error refreshing fee estimates: {e}")
+            time.sleep(self.refresh_interval)
+
+    def start(self):
+        # Threads do not survive a fork, so every process starts its own refresher
+        with self.lock:
+            if self.refresher_pid == os.getpid():
+                return self
+            self.refresher_pid = os.getpid()
+        threading.Thread(target=self._refresh_loop, name='fee-cache', daemon=True).start()
+        return self
+
+    def get(self):
+        """
+        Returns (block_number, base_fee, priority_fee). Only waits for the node before the first refresh.
+        """
+        self.start()
+        if self.block_number is None:
+            self.refresh()
+        with self.lock:
+            return self.block_number, self.base_fee, self.priority_fee
+
+class BuyEngine:
+    """
+    Fast path for swapExactETHForTokens buys. Everything that does not depend on the price (chain
+    id, router call, value, gas limit) is prepared as a template as soon as the signal arrives;
+    fees come from the per-block FeeCache. Once the price is known, building the transaction only
+    fills in the minimum output and the deadline.
+    """
+
+    def __init__(self, web3, router, wallet_address, weth_address, gas_limit=None, automatic_fees=True,
+                 base_fee_multiplier=1, priority_fee_multiplier=1, total_fee_multiplier=1):
+        self.web3 = web3
+        self.router = router
+        self.wallet_address = wallet_address
+        self.weth_address = weth_address
+        self.gas_limit = gas_limit
+        self.automatic_fees = automatic_fees
+        self.base_fee_multiplier = base_fee_multiplier
+        self.priority_fee_multiplier = priority_fee_multiplier
+        self.total_fee_multiplier = total_fee_multiplier
+        self.fee_cache = FeeCache(web3)
+        self.chain_id = None
+
+    def start(self):
+        """
+        Starts the fee cache and reads the chain id, so the first buy of the process waits for neither.
+        """
+        self.fee_cache.start()
+        try:
+            if self.chain_id is None:
+                self.chain_id = self.web3.eth.chain_id
+        except Exception as e:
+            logging.error(f"Error reading the chain id: {e}")
+        return self
+
+    def prepare(self, token_address, amount_wei):
+        """
+        Returns the transaction template of a buy of token_address for amount_wei.
+        """
+        if self.chain_id is None:
+            self.chain_id = self.web3.eth.chain_id
+        return {
+            'from': self.wallet_address,
+            'to': self.router.address,
+            'value': amount_wei,
+            'chainId': self.chain_id,
+            'type': 2,
+            'path': [self.weth_address, token_address]
+        }
+
+    def fees(self):
+        block_number, base_fee, priority_fee = self.fee_cache.get()
+        if self.automatic_fees:
+            # Same defaults the node client would use
+            return priority_fee + 2 * base_fee, priority_fee
+        base_fee = int(base_fee * self.base_fee_multiplier)
+        priority_fee = int(priority_fee * self.priority_fee_multiplier)
+        return int((base_fee + priority_fee) * self.total_fee_multiplier), priority_fee
+
+    def build(self, template, amount_out_min, deadline):
+        """
+        Completes the template into a transaction ready to be signed.
+        """
+        txn = {key: value for key, value in template.items() if key != 'path'}
+        txn['data'] = self.router.encodeABI(fn_name='swapExactETHForTokens', args=[amount_out_min, template['path'], self.wallet_address, deadline])
+        txn['maxFeePerGas'], txn['maxPriorityFeePerGas'] = self.fees()
+        txn['gas'] = self.gas_limit or self.web3.eth.estimate_gas(txn)
+        return txn
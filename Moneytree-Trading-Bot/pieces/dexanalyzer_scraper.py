@@ -4,7 +4,11 @@ import time
 import logging
 import yaml
 
-def scrape_dexanalyzer(token_hash, save_html=True, max_attempts=30):
+def scrape_dexanalyzer(token_hash, save_html=True, max_attempts=30, deadline=None):
+    """
+    Returns (scam_detected, reason) read from the DexAnalyzer page of the token, or None when no
+    fully loaded page could be read (still loading, script error or deadline).
+    """
     logging.info(f"x Starting Anti-Scam.")
     # Get the absolute path of the parent directory
     parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -34,12 +38,16 @@ def scrape_dexanalyzer(token_hash, save_html=True, max_attempts=30):
     while attempt < max_attempts:
         attempt += 1
         try:
-            # Run the Puppeteer script
-            result = subprocess.run(['node', 'pieces/dexanalyzer_scraper.js', token_hash], capture_output=True, text=True, check=True)
+            # Run the Puppeteer script, killed if it runs past the deadline
+            timeout = None if deadline is None else max(1, deadline - time.time())
+            result = subprocess.run(['node', 'pieces/dexanalyzer_scraper.js', token_hash], capture_output=True, text=True, check=True, timeout=timeout)
             content = result.stdout
 
             # Check if the content contains the "Loading" message
             if "<h1>Loading" in content:
+                if deadline is not None and time.time() + 2 >= deadline:
+                    logging.warning("x [Anti-Scam] Deadline reached while the page is still loading. No verdict.")
+                    return None
                 logging.info(f"x [Anti-Scam] Attempt {attempt}: Page is still loading. Retrying...")
                 time.sleep(2)  # Wait for 2 seconds before retrying
                 continue
@@ -58,11 +66,11 @@ def scrape_dexanalyzer(token_hash, save_html=True, max_attempts=30):
 
         except subprocess.CalledProcessError as e:
             logging.error(f"x An error occurred: {e}")
-            return False, "Script error"  # Return error for subprocess failure
+            return None  # No page, no verdict
     
-    logging.error("x Maximum attempts reached. The page might still be loading.")
-    reason = "Scam detected: No info"
-    return True, reason  # Scam detected
+    # Only a fully loaded page gives a verdict
+    logging.error("x Maximum attempts reached. The page might still be loading. No verdict.")
+    return None
 
 def check_for_scam(content, enable_high_most_likely_scam_check, enable_renounced_check, enable_liquidity_check):
     # 1. MUST NOT CONTAIN 'HIGH</b></td><td>MOST LIKELY SCAM'
@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import threading
+import time
+from web3 import Web3
+
+chainlink_price_feed_abi = json.loads('[{"inputs":[],"name":"latestRoundData","outputs":[{"internalType":"uint80","name":"roundId","type":"uint80"},{"internalType":"int256","name":"answer","type":"int256"},{"internalType":"uint256","name":"startedAt","type":"uint256"},{"internalType":"uint256","name":"updatedAt","type":"uint256"},{"internalType":"uint80","name":"answeredInRound","type":"uint80"}],"stateMutability":"view","type":"function"}]')
+
+class EthPriceOracle:
+    """
+    Cached Chainlink ETH/USD price. A background thread polls `latestRoundData` every
+    `refresh_interval` seconds and keeps the latest round; the feed itself writes a new round
+    on its heartbeat (1 hour) or on a 0.5% deviation, so the cache follows it within one poll.
+    Readers get the cached value without any RPC call, together with its age from `updatedAt`.
+    """
+
+    def __init__(self, web3, feed_address, refresh_interval=12, heartbeat=3600, decimals=8):
+        self.feed = web3.eth.contract(address=Web3.to_checksum_address(feed_address), abi=chainlink_price_feed_abi)
+        self.refresh_interval = refresh_interval
+        self.heartbeat = heartbeat
+        self.decimals = decimals
+        self.lock = threading.Lock()
+        self.round = None
+        self.refresher_pid = None
+
+    def refresh(self):
+        """
+        Reads the latest round from the feed and caches it. Returns the cached round.
+        """
+        round_id, answer, started_at, updated_at, answered_in_round = self.feed.functions.latestRoundData().call()
+        price = answer / 10 ** self.decimals
+        with self.lock:
+            previous = self.round
+            if previous is None or round_id != previous['round_id']:
+                self.round = {'round_id': round_id, 'price': price, 'updated_at': updated_at}
+                if previous is not None:
+                    change = (price - previous['price']) / previous['price'] * 100
+                    logging.info(f"ETH price updated to {price} USD ({change:+.2f}%) in round {round_id}")
+            return self.round
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(self.refresh_interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Error refreshing ETH price: {e}")
+
+    def _ensure_refresher(self):
+        # Threads do not survive a fork, so every process starts its own refresher
+        with self.lock:
+            if self.refresher_pid == os.getpid():
+                return
+            self.refresher_pid = os.getpid()
+        threading.Thread(target=self._refresh_loop, name='eth-price-oracle', daemon=True).start()
+
+    def get_price(self):
+        """
+        Returns the cached ETH price in USD. Only the very first call of a process waits for the feed.
+        Returns None if no price could be read.
+        """
+        self._ensure_refresher()
+        current = self.round
+        if current is None:
+            try:
+                current = self.refresh()
+            except Exception as e:
+                logging.error(f"Error fetching ETH price: {e}")
+                return None
+        if self.is_stale():
+            logging.warning(f"ETH price {current['price']} USD is {self.age():.0f} seconds old.")
+        return current['price']
+
+    def age(self):
+        """
+        Seconds since the feed last updated the cached price, or None before the first read.
+        """
+        current = self.round
+        if current is None:
+            return None
+        return max(0, time.time() - current['updated_at'])
+
+    def is_stale(self):
+        # The feed updates at least once per heartbeat, allow one refresh interval of slack
+        age = self.age()
+        return age is not None and age > self.heartbeat + self.refresh_interval
+
+    def snapshot(self):
+        current = self.round
+        if current is None:
+            return None
+        return dict(current, age=self.age(), stale=self.is_stale())
@@ -0,0 +1,87 @@
+import logging
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class HttpClient:
+    """
+    Shared HTTP client for all outbound requests. Connections are kept alive and pooled
+    (at most `pool_maxsize` per host), every request gets a default timeout, failed
+    connections and idempotent requests are retried with backoff, and the latency of
+    every request is recorded in a histogram per destination host.
+    """
+
+    def __init__(self, pool_maxsize=10, timeout=(3.05, 15), retries=3, backoff_factor=0.5):
+        self.timeout = timeout
+        retry = Retry(
+            total=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            respect_retry_after_header=True,
+            raise_on_status=False  # Return the last response and let the caller decide
+        )
+        # pool_block keeps the number of connections per host at pool_maxsize
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=pool_maxsize, pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.lock = threading.Lock()
+        self.histograms = {}
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        started = time.monotonic()
+        try:
+            return self.session.request(method, url, **kwargs)
+        finally:
+            self._record(host, time.monotonic() - started)
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def _record(self, host, seconds):
+        with self.lock:
+            histogram = self.histograms.setdefault(host, {'count': 0, 'total': 0.0, 'buckets': [0] * (len(LATENCY_BUCKETS) + 1)})
+            histogram['count'] += 1
+            histogram['total'] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            else:
+                histogram['buckets'][-1] += 1
+
+    def metrics(self):
+        """
+        Returns the request count, average latency and latency histogram per destination host.
+        """
+        with self.lock:
+            labels = [f"<={bound}s" for bound in LATENCY_BUCKETS] + [f">{LATENCY_BUCKETS[-1]}s"]
+            return {
+                host: {
+                    'count': histogram['count'],
+                    'avg_seconds': round(histogram['total'] / histogram['count'], 3),
+                    'histogram': dict(zip(labels, histogram['buckets']))
+                }
+                for host, histogram in self.histograms.items()
+            }
+
+    def start_metrics_logger(self, interval=300):
+        def log_metrics():
+            while True:
+                time.sleep(interval)
+                logging.info(f"HTTP latency metrics: {self.metrics()}")
+        threading.Thread(target=log_metrics, name='http-metrics', daemon=True).start()
+
+# Shared instance for the whole process
+http_client = HttpClient()
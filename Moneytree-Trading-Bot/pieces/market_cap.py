@@ -1,5 +1,5 @@
 import logging
-from pieces.uniswap import get_eth_price_in_usd,  get_uniswap_v2_price, get_uniswap_v3_price
+from pieces.uniswap import get_eth_price_in_usd, read_pools, compute_uniswap_v2_price, compute_uniswap_v3_price
 
 def calculate_market_cap(token_address, name, symbol, total_supply, decimals):
     eth_price_in_usd = get_eth_price_in_usd()
@@ -7,10 +7,17 @@ def calculate_market_cap(token_address, name, symbol, total_supply, decimals):
         logging.info("Cannot calculate market cap without ETH price.")
         return None
 
-    token_price, pair_address = get_uniswap_v2_price(token_address, decimals)
-    
+    try:
+        _, pair_address, reserves, pool_states, _ = read_pools(token_address)
+    except Exception as e:
+        logging.error(f"Error reading market data for token {token_address}: {e}")
+        return None
+
+    token_price = None
+    if pair_address is not None:
+        token_price = compute_uniswap_v2_price(token_address, decimals, reserves)
     if token_price is None:
-        token_price, pair_address = get_uniswap_v3_price(token_address, decimals)
+        token_price, pair_address = compute_uniswap_v3_price(token_address, decimals, pool_states)
 
     if token_price is not None:
         market_cap_eth = total_supply * token_price
@@ -0,0 +1,52 @@
+import json
+import logging
+from eth_utils.abi import collapse_if_tuple
+from web3 import Web3
+
+# Multicall3 is deployed at the same address on mainnet and most other chains
+MULTICALL3_ADDRESS = Web3.to_checksum_address('0xcA11bde05977b3631167028862bE2a173976CA11')
+
+multicall3_abi = json.loads('[{"inputs":[{"components":[{"internalType":"address","name":"target","type":"address"},{"internalType":"bool","name":"allowFailure","type":"bool"},{"internalType":"bytes","name":"callData","type":"bytes"}],"internalType":"struct Multicall3.Call3[]","name":"calls","type":"tuple[]"}],"name":"aggregate3","outputs":[{"components":[{"internalType":"bool","name":"success","type":"bool"},{"internalType":"bytes","name":"returnData","type":"bytes"}],"internalType":"struct Multicall3.Result[]","name":"returnData","type":"tuple[]"}],"stateMutability":"payable","type":"function"},{"inputs":[],"name":"getBlockNumber","outputs":[{"internalType":"uint256","name":"blockNumber","type":"uint256"}],"stateMutability":"view","type":"function"}]')
+
+class Multicall:
+    """
+    Batches read-only contract calls into a single Multicall3 `aggregate3` eth_call,
+    so that all results come from the same block in one round-trip.
+
+    Calls are given as (contract, function_name, args) tuples. Results come back in the
+    same order; a single return value is unwrapped, several are returned as a tuple,
+    and a call that reverted returns None.
+    """
+
+    def __init__(self, web3):
+        self.web3 = web3
+        self.contract = web3.eth.contract(address=MULTICALL3_ADDRESS, abi=multicall3_abi)
+
+    def call(self, calls, block_identifier='latest'):
+        """
+        Executes the calls and returns (block_number, results). Pass the returned block number
+        as block_identifier of a follow-up batch to read the same state.
+        """
+        requests = [(MULTICALL3_ADDRESS, False, self.contract.encodeABI(fn_name='getBlockNumber'))]
+        output_types = []
+        for contract, function_name, args in calls:
+            requests.append((contract.address, True, contract.encodeABI(fn_name=function_name, args=args)))
+            outputs = contract.get_function_by_name(function_name).abi['outputs']
+            output_types.append([collapse_if_tuple(output) for output in outputs])
+
+        responses = self.contract.functions.aggregate3(requests).call(block_identifier=block_identifier)
+        block_number = self.web3.codec.decode(['uint256'], responses[0][1])[0]
+
+        results = []
+        for (success, return_data), types in zip(responses[1:], output_types):
+            if not success or not return_data:
+                results.append(None)
+                continue
+            try:
+                decoded = self.web3.codec.decode(types, return_data)
+            except Exception as e:
+                logging.warning(f"Could not decode multicall result: {e}")
+                results.append(None)
+                continue
+            results.append(decoded[0] if len(decoded) == 1 else tuple(decoded))
+        return block_number, results
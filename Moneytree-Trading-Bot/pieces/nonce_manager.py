@@ -0,0 +1,155 @@
+import fcntl
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+
+class NonceManager:
+    """
+    Wallet-level nonce allocator shared by every position worker. The next nonce, the nonces
+    allocated but not yet sent, the nonces released for reuse and the transactions sent but not
+    yet mined are kept in a JSON file; every change takes an exclusive lock on a companion lock
+    file, so processes never hand out the same nonce and allocation needs no RPC call. The state
+    is reconciled with the chain's transaction counts on first use, periodically, and after a
+    failed send.
+
+    Only a nonce whose transaction never reached the node is released, and it goes to the next
+    allocation; nonces other workers hold are never touched. A nonce left unused below a sent
+    transaction would hold that transaction back, so such gaps are reported by `gaps()` to be
+    filled.
+    """
+
+    def __init__(self, web3, address, path):
+        self.web3 = web3
+        self.address = address
+        self.path = path
+        self.lock_path = f"{path}.lock"
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self._load()
+                yield state
+                self._save(state)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+            if state.get('address') == self.address:
+                state.setdefault('allocated', {})
+                state.setdefault('released', [])
+                return state
+            logging.warning(f"Nonce state in '{self.path}' belongs to another wallet, starting over.")
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Ignoring unreadable nonce state '{self.path}': {e}")
+        return {'address': self.address, 'next': None, 'pending': {}, 'allocated': {}, 'released': []}
+
+    def _save(self, state):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def _reconcile(self, state):
+        pending_count = self.web3.eth.get_transaction_count(self.address, 'pending')
+        mined_count = self.web3.eth.get_transaction_count(self.address, 'latest')
+        for key in ('pending', 'allocated'):
+            for nonce in [nonce for nonce in state[key] if int(nonce) < mined_count]:
+                del state[key][nonce]
+        state['released'] = [nonce for nonce in state['released'] if nonce >= mined_count]
+        if state['next'] is None:
+            # Pending transactions we know of still hold their nonces
+            known = [int(nonce) + 1 for nonce in state['pending']]
+            state['next'] = max([pending_count] + known)
+        elif pending_count > state['next']:
+            logging.warning(f"Wallet sent transactions outside the bot, moving the next nonce from {state['next']} to {pending_count}.")
+            state['next'] = pending_count
+        return mined_count
+
+    def allocate(self):
+        """
+        Returns the lowest released nonce, or else the next nonce of the wallet, and reserves it.
+        """
+        with self._locked() as state:
+            if state['next'] is None:
+                self._reconcile(state)
+            if state['released']:
+                nonce = min(state['released'])
+                state['released'].remove(nonce)
+            else:
+                nonce = state['next']
+                state['next'] += 1
+            state['allocated'][str(nonce)] = time.time()
+            return nonce
+
+    def record(self, nonce, tx_hash, txn):
+        """
+        Remembers a sent transaction until it is mined, so it can be replaced or cancelled.
+        """
+        with self._locked() as state:
+            state['allocated'].pop(str(nonce), None)
+            state['pending'][str(nonce)] = {'tx_hash': tx_hash, 'tx': txn, 'sent_at': time.time()}
+
+    def release(self, nonce):
+        """
+        Hands a nonce whose transaction never reached the node to the next allocation. A nonce of a
+        pending transaction (a failed replacement) keeps its transaction.
+        """
+        with self._locked() as state:
+            state['allocated'].pop(str(nonce), None)
+            if str(nonce) not in state['pending'] and nonce not in state['released']:
+                state['released'].append(nonce)
+            self._reconcile(state)
+
+    def reconcile(self):
+        """
+        Drops mined transactions and catches up with transactions sent elsewhere. Returns the mined
+        transaction count.
+        """
+        with self._locked() as state:
+            return self._reconcile(state)
+
+    def pending(self):
+        with self._locked() as state:
+            return {int(nonce): entry for nonce, entry in state['pending'].items()}
+
+    def stuck(self, max_age):
+        """
+        Returns {nonce: entry} of the transactions that were sent more than max_age seconds ago and
+        are still not mined.
+        """
+        with self._locked() as state:
+            self._reconcile(state)
+            now = time.time()
+            return {int(nonce): entry for nonce, entry in state['pending'].items() if now - entry['sent_at'] > max_age}
+
+    def gaps(self, allocation_timeout):
+        """
+        Claims and returns the nonces below the highest pending one that hold no transaction: released
+        nonces, and allocations not sent within allocation_timeout seconds (a worker died or the send
+        failed without telling whether the node got it). The caller fills them and records the fills.
+        """
+        with self._locked() as state:
+            mined_count = self._reconcile(state)
+            if not state['pending']:
+                return []
+            highest = max(int(nonce) for nonce in state['pending'])
+            now = time.time()
+            gaps = []
+            for nonce in range(mined_count, highest):
+                allocated_at = state['allocated'].get(str(nonce))
+                if str(nonce) in state['pending'] or (allocated_at is not None and now - allocated_at < allocation_timeout):
+                    continue
+                if nonce in state['released']:
+                    state['released'].remove(nonce)
+                state['allocated'][str(nonce)] = now
+                gaps.append(nonce)
+            return gaps
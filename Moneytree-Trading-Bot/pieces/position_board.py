@@ -0,0 +1,27 @@
+import json
+import logging
+import time
+from redis import Redis
+
+class PositionBoard:
+    """
+    The open positions of all position workers with their latest price, in a Redis hash read by
+    the console's dashboard. Each worker updates its own positions on every price tick and removes
+    them when they are sold. The board is only for display, so Redis errors are logged, never raised.
+    """
+
+    def __init__(self, redis_url, key='dashboard:positions'):
+        self.redis = Redis.from_url(redis_url)
+        self.key = key
+
+    def update(self, position_id, **fields):
+        try:
+            self.redis.hset(self.key, position_id, json.dumps(dict(fields, updated_at=time.time())))
+        except Exception as e:
+            logging.warning(f"Could not update position {position_id} on the dashboard: {e}")
+
+    def remove(self, position_id):
+        try:
+            self.redis.hdel(self.key, position_id)
+        except Exception as e:
+            logging.warning(f"Could not remove position {position_id} from the dashboard: {e}")
@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Array, Process, Queue
+
+def run_worker(index, handler, initializer, tasks, positions, threads):
+    """
+    Worker process body. Runs one asyncio event loop for the life of the process and starts every
+    signal it receives as a task on it. Blocking calls inside the handler go through asyncio.to_thread,
+    which uses a thread pool of `threads` threads.
+    """
+    if initializer is not None:
+        initializer()
+
+    async def handle(data):
+        try:
+            await handler(data)
+        except Exception as e:
+            logging.error(f"Error handling transaction in position worker {index}: {e}")
+        finally:
+            with positions.get_lock():
+                positions[index] -= 1
+
+    async def serve():
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=threads, thread_name_prefix=f'position-{index}'))
+        running = set()
+        while True:
+            data = await asyncio.to_thread(tasks.get)
+            if data is None:
+                break
+            task = asyncio.create_task(handle(data))
+            running.add(task)
+            task.add_done_callback(running.discard)
+        if running:
+            await asyncio.gather(*running)
+
+    logging.info(f"Position worker {index} started.")
+    asyncio.run(serve())
+
+class PositionWorkerPool:
+    """
+    Fixed pool of long-lived worker processes for the trading bot. Each worker multiplexes any
+    number of positions as asyncio tasks, so processes, logging handlers, config, ABIs and Web3
+    providers are set up once per worker instead of once per signal. A signal goes to the worker
+    holding the fewest positions; a worker that dies is replaced.
+    """
+
+    def __init__(self, handler, workers=4, threads=32, initializer=None):
+        self.handler = handler
+        self.initializer = initializer
+        self.workers = workers
+        self.threads = threads
+        self.positions = Array('i', workers)
+        self.queues = [Queue() for _ in range(workers)]
+        self.processes = [None] * workers
+        self.lock = threading.Lock()
+
+    def _start_worker(self, index):
+        process = Process(
+            target=run_worker,
+            args=(index, self.handler, self.initializer, self.queues[index], self.positions, self.threads),
+            name=f'position-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self):
+        for index in range(self.workers):
+            self._start_worker(index)
+        threading.Thread(target=self._supervise, name='position-supervisor', daemon=True).start()
+        return self
+
+    def _supervise(self):
+        while True:
+            time.sleep(5)
+            with self.lock:
+                for index, process in enumerate(self.processes):
+                    if not process.is_alive():
+                        logging.error(f"Position worker {index} (PID {process.pid}) exited with code {process.exitcode}, "
+                                      f"{self.positions[index]} positions lost. Restarting it.")
+                        with self.positions.get_lock():
+                            self.positions[index] = 0
+                        self._start_worker(index)
+
+    def submit(self, data):
+        """
+        Hands a signal to the least busy worker and returns its index.
+        """
+        with self.lock, self.positions.get_lock():
+            index = min(range(self.workers), key=lambda i: self.positions[i])
+            self.positions[index] += 1
+            self.queues[index].put(data)
+        return index
+
+    def status(self):
+        with self.lock:
+            return [
+                {
+                    'worker': index,
+                    'pid': process.pid,
+                    'alive': process.is_alive(),
+                    'positions': self.positions[index]
+                }
+                for index, process in enumerate(self.processes)
+            ]
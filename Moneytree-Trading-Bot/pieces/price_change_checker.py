@@ -1,6 +1,6 @@
 import logging
 import yaml
-from datetime import datetime, timedelta, timezone
+from datetime import timedelta
 import os
 
 # Get the absolute path of the parent directory
@@ -23,33 +23,54 @@ except yaml.YAMLError as exc:
 NO_CHANGE_THRESHOLD = config['NO_CHANGE_THRESHOLD']  # now treated as a decimal
 NO_CHANGE_TIME_MINUTES = config['NO_CHANGE_TIME_MINUTES']
 
-def check_no_change_threshold(start_time, price_history, monitoring_id, symbol, token_amount):
-    current_time = datetime.now(timezone.utc)
-    intervals_passed = (current_time - start_time) // timedelta(minutes=NO_CHANGE_TIME_MINUTES)
-    threshold_decimal = NO_CHANGE_THRESHOLD  # Use the decimal value from the config
+class NoChangeWindow:
+    """
+    Tumbling NO_CHANGE_TIME_MINUTES intervals over the price ticks of one position. Only the first,
+    lowest and highest price of the open interval are kept, so a tick costs O(1) time and memory
+    however long the position stays open.
+    """
+
+    def __init__(self, start_time, interval=None):
+        self.interval = interval or timedelta(minutes=NO_CHANGE_TIME_MINUTES)
+        self.start_time = start_time
+        self.first_price = None
+        self.min_price = None
+        self.max_price = None
 
-    if intervals_passed > 0:
-        for interval in range(intervals_passed):
-            interval_start_time = start_time + timedelta(minutes=interval * NO_CHANGE_TIME_MINUTES)
-            interval_end_time = interval_start_time + timedelta(minutes=NO_CHANGE_TIME_MINUTES)
+    def add(self, timestamp, price):
+        """
+        Records a price. Returns (first, min, max) of the interval that this tick closed,
+        or None if no interval with prices was closed.
+        """
+        closed = None
+        if timestamp >= self.start_time + self.interval:
+            if self.first_price is not None:
+                closed = (self.first_price, self.min_price, self.max_price)
+            # Skip any empty intervals in one step
+            self.start_time += self.interval * ((timestamp - self.start_time) // self.interval)
+            self.first_price = None
 
-            # Filter the price history to only include prices within the current interval
-            interval_prices = [price for timestamp, price in price_history if interval_start_time <= timestamp < interval_end_time]
+        if self.first_price is None:
+            self.first_price = self.min_price = self.max_price = price
+        else:
+            self.min_price = min(self.min_price, price)
+            self.max_price = max(self.max_price, price)
+        return closed
 
-            if not interval_prices:
-                continue
+def check_no_change_threshold(window, current_time, current_price, monitoring_id, symbol, token_amount):
+    closed = window.add(current_time, current_price)
+    threshold_decimal = NO_CHANGE_THRESHOLD  # Use the decimal value from the config
 
-            min_price = min(interval_prices)
-            max_price = max(interval_prices)
-            initial_price = interval_prices[0]
-            price_increase = (max_price - initial_price) / initial_price
-            price_decrease = (initial_price - min_price) / initial_price
+    if closed is None:
+        return False, None, None
 
-            if abs(price_increase) < threshold_decimal and abs(price_decrease) < threshold_decimal:
-                logging.info(f"Monitoring {monitoring_id} — No significant price change — {threshold_decimal * 100:.2f}%. — detected in a {NO_CHANGE_TIME_MINUTES} minutes interval. Selling the token.")
-                return True, token_amount, f'Price did not change significantly — {threshold_decimal * 100:.2f}%. — in a {NO_CHANGE_TIME_MINUTES} minutes interval.', start_time
-            else:
-                logging.info(f"Monitoring {monitoring_id} — Significant price change — {threshold_decimal * 100:.2f}%. — in a {NO_CHANGE_TIME_MINUTES} minutes interval. Continuing monitoring.")
-                return False, None, None, interval_end_time  # Return the updated start time
+    initial_price, min_price, max_price = closed
+    price_increase = (max_price - initial_price) / initial_price
+    price_decrease = (initial_price - min_price) / initial_price
 
-    return False, None, None, start_time  # Return the original start time if no intervals passed
+    if abs(price_increase) < threshold_decimal and abs(price_decrease) < threshold_decimal:
+        logging.info(f"Monitoring {monitoring_id} — No significant price change — {threshold_decimal * 100:.2f}%. — detected in a {NO_CHANGE_TIME_MINUTES} minutes interval. Selling the token.")
+        return True, token_amount, f'Price did not change significantly — {threshold_decimal * 100:.2f}%. — in a {NO_CHANGE_TIME_MINUTES} minutes interval.'
+    else:
+        logging.info(f"Monitoring {monitoring_id} — Significant price change — {threshold_decimal * 100:.2f}%. — in a {NO_CHANGE_TIME_MINUTES} minutes interval. Continuing monitoring.")
+        return False, None, None
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+from itertools import groupby
+from web3 import Web3
+from pieces.uniswap import web3, read_token_states, select_uniswap_price, get_pool_logs, apply_pool_log
+
+class PriceFeed:
+    """
+    Shared, event-driven price feed for the positions of one worker process. Each token is
+    watched once however many positions hold it. Its pool state is read once with a batched
+    call, then kept current by following the Sync events of its V2 pair and the Swap events of
+    its V3 pools with one filtered eth_getLogs per new block for all watched tokens.
+
+    Subscribers receive a (block_number, token_price, pair_address) tick for every block in
+    which the price moved, in block order, and at least one tick per new block, so a threshold
+    is seen at the first block that crosses it. RPC cost grows with the number of blocks, not
+    with the number of positions.
+    """
+
+    def __init__(self, poll_interval=1, queue_size=100, max_log_range=100, resync_blocks=300):
+        self.poll_interval = poll_interval
+        self.queue_size = queue_size
+        self.max_log_range = max_log_range  # Beyond this gap the states are read again instead
+        self.resync_blocks = resync_blocks  # Re-read the states now and then in case of reorgs
+        self.subscribers = {}
+        self.decimals = {}
+        self.states = {}
+        self.synced_block = {}
+        self.addresses = {}
+        self.last_block = None
+        self.last_resync = None
+        self.task = None
+
+    def subscribe(self, token_address, token_decimals):
+        """
+        Starts watching the token and returns the asyncio.Queue its ticks are put on.
+        Must be called from the event loop of the worker.
+        """
+        token_address = Web3.to_checksum_address(token_address)
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self.decimals.setdefault(token_address, token_decimals)
+        self.subscribers.setdefault(token_address, set()).add(queue)
+        if token_address in self.states:
+            # The token is already followed, start from its current price
+            self.publish(token_address, self.synced_block[token_address], only=queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+        return queue
+
+    def unsubscribe(self, token_address, queue):
+        token_address = Web3.to_checksum_address(token_address)
+        queues = self.subscribers.get(token_address)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.subscribers[token_address]
+            del self.decimals[token_address]
+            self._forget(token_address)
+
+    def _forget(self, token_address):
+        self.states.pop(token_address, None)
+        self.synced_block.pop(token_address, None)
+        self.addresses = {address: token for address, token in self.addresses.items() if token != token_address}
+
+    def price(self, token_address):
+        return select_uniswap_price(token_address, self.decimals[token_address], *self.states[token_address])
+
+    def publish(self, token_address, block_number, only=None):
+        token_price, pair_address = self.price(token_address)
+        tick = (block_number, token_price, pair_address)
+        for queue in ([only] if only is not None else self.subscribers.get(token_address, ())):
+            if queue.full():
+                queue.get_nowait()  # Drop the oldest tick, the latest price is what matters
+            queue.put_nowait(tick)
+
+    async def run(self):
+        while True:
+            if self.subscribers:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    logging.error(f"Error refreshing the prices of {len(self.decimals)} watched tokens: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def refresh(self):
+        latest_block = await asyncio.to_thread(lambda: web3.eth.block_number)
+
+        if self.last_block is not None and (
+            latest_block - self.last_block > self.max_log_range or latest_block - self.last_resync >= self.resync_blocks
+        ):
+            await self.load_states(list(self.decimals))
+        new_tokens = [token_address for token_address in self.decimals if token_address not in self.states]
+        if new_tokens:
+            await self.load_states(new_tokens)
+        if self.last_block is None:
+            self.last_block = self.last_resync = min(self.synced_block.values())
+        if latest_block <= self.last_block:
+            return
+
+        logs = await asyncio.to_thread(get_pool_logs, list(self.addresses), self.last_block + 1, latest_block)
+        logs = [log for log in logs if not log.get('removed')]
+        for block_number, block_logs in groupby(logs, key=lambda log: log['blockNumber']):
+            moved = set()
+            for log in block_logs:
+                token_address = self.addresses.get(log['address'])
+                if token_address is None or block_number <= self.synced_block[token_address]:
+                    continue
+                self.states[token_address] = apply_pool_log(self.states[token_address], log)
+                moved.add(token_address)
+            for token_address in moved:
+                self.synced_block[token_address] = block_number
+                self.publish(token_address, block_number)
+
+        # Every watched token gets a tick for the latest block, moved or not
+        for token_address in self.states:
+            if self.synced_block[token_address] < latest_block:
+                self.synced_block[token_address] = latest_block
+                self.publish(token_address, latest_block)
+        self.last_block = latest_block
+
+    async def load_states(self, tokens):
+        """
+        Reads the current pool state of the tokens with one batched call and publishes their price.
+        """
+        block_number, states = await asyncio.to_thread(read_token_states, {token_address: self.decimals[token_address] for token_address in tokens})
+        for token_address, state in states.items():
+            if token_address not in self.decimals:
+                continue  # Unsubscribed meanwhile
+            self._forget(token_address)
+            pair_address, reserves, pool_states = state
+            if pair_address:
+                self.addresses[pair_address] = token_address
+            for fee, pool_address, slot0 in pool_states:
+                self.addresses[pool_address] = token_address
+            self.states[token_address] = state
+            self.synced_block[token_address] = block_number
+            self.publish(token_address, block_number)
+        if len(tokens) == len(self.decimals):
+            self.last_resync = block_number
+            if self.last_block is not None:
+                self.last_block = max(self.last_block, block_number)
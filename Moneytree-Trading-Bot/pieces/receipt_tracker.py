@@ -0,0 +1,183 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+class ReceiptTracker:
+    """
+    Waits for the receipts of every in-flight transaction of a process with one watcher thread.
+    Each new block is fetched once and its transaction hashes are matched against all pending
+    hashes together; only the matched transactions have their receipt read. Waiters hold a Future
+    that resolves within one block of the transaction being mined.
+
+    A hash is also looked up directly when it is waited for (or at the next block when only
+    tracked), then every `recheck_blocks` blocks and after a gap of more than `max_block_gap`
+    blocks, so a transaction mined before it was tracked is not missed.
+
+    A waited-for transaction is also followed by its sender and nonce: once the nonce is used
+    without the hash being mined, the transaction was replaced (e.g. by a fee bump from another
+    process), and the waiters get the receipt of the transaction that took the nonce.
+    """
+
+    def __init__(self, web3, poll_interval=1, max_block_gap=20, recheck_blocks=5):
+        self.web3 = web3
+        self.poll_interval = poll_interval
+        self.max_block_gap = max_block_gap
+        self.recheck_blocks = recheck_blocks
+        self.lock = threading.Lock()
+        self.pending = {}  # tx hash -> {'futures': [...], 'checked': block number, 'sender', 'nonce', 'since': block number}
+        self.last_block = None
+        self.watcher_pid = None
+
+    def track(self, tx_hash):
+        """
+        Returns a concurrent.futures.Future resolved with the receipt once the transaction is mined.
+        """
+        key = Web3.to_hex(tx_hash).lower()
+        future = Future()
+        with self.lock:
+            # Threads do not survive a fork, so every process starts its own watcher
+            start = self.watcher_pid != os.getpid()
+            if start:
+                self.watcher_pid = os.getpid()
+                self.pending = {}
+                self.last_block = None
+            entry = self.pending.setdefault(key, {'futures': [], 'checked': None, 'sender': None, 'nonce': None, 'since': None})
+            entry['futures'].append(future)
+        if start:
+            threading.Thread(target=self._watch, name='receipt-tracker', daemon=True).start()
+        return future
+
+    def wait(self, tx_hash, timeout=180):
+        """
+        Blocks until the transaction is mined and returns its receipt, or None after timeout seconds.
+        RPC errors are retried by the watcher, never raised.
+        """
+        future = self.track(tx_hash)
+        self._identify(Web3.to_hex(tx_hash).lower())
+        if self.last_block is not None:
+            # It may have been mined already, e.g. an approval sent at buy time
+            self._lookup([Web3.to_hex(tx_hash).lower()], self.last_block)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            self._discard(Web3.to_hex(tx_hash).lower(), future)
+            return None
+
+    def _identify(self, key):
+        try:
+            tx = self.web3.eth.get_transaction(key)
+            since = self.last_block if self.last_block is not None else self.web3.eth.block_number
+        except Exception as e:
+            # Still resolved by its hash, only a replacement would go unnoticed
+            logging.warning(f"Could not read the sender and nonce of {key}: {e}")
+            return
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is not None:
+                entry.update(sender=tx['from'], nonce=tx['nonce'], since=since)
+
+    def _replacement(self, key, block_number):
+        """
+        Returns the receipt of the transaction that used the nonce of this one, or None if the
+        nonce is still unused at block_number.
+        """
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None or entry['sender'] is None:
+                return None
+            sender, nonce, since = entry['sender'], entry['nonce'], entry['since']
+        if self.web3.eth.get_transaction_count(sender, block_number) <= nonce:
+            return None
+        # The first block with the nonce used holds the transaction that used it
+        low, high = min(since, block_number), block_number
+        while low < high:
+            middle = (low + high) // 2
+            if self.web3.eth.get_transaction_count(sender, middle) > nonce:
+                high = middle
+            else:
+                low = middle + 1
+        for tx in self.web3.eth.get_block(low, full_transactions=True)['transactions']:
+            if tx['from'] == sender and tx['nonce'] == nonce:
+                logging.info(f"Transaction {key} was replaced by {Web3.to_hex(tx['hash'])} (nonce {nonce}).")
+                return self.web3.eth.get_transaction_receipt(tx['hash'])
+        return None
+
+    def _discard(self, key, future):
+        with self.lock:
+            entry = self.pending.get(key)
+            if entry is None:
+                return
+            if future in entry['futures']:
+                entry['futures'].remove(future)
+            if not entry['futures']:
+                del self.pending[key]
+
+    def _resolve(self, key, receipt):
+        with self.lock:
+            entry = self.pending.pop(key, None)
+        for future in (entry['futures'] if entry else ()):
+            future.set_result(receipt)
+
+    def _lookup(self, keys, block_number):
+        for key in keys:
+            try:
+                receipt = self.web3.eth.get_transaction_receipt(key)
+            except TransactionNotFound:
+                try:
+                    receipt = self._replacement(key, block_number)
+                except Exception as e:
+                    logging.warning(f"Error checking whether {key} was replaced, will retry: {e}")
+                    continue
+                if receipt is None:
+                    with self.lock:
+                        if key in self.pending:
+                            self.pending[key]['checked'] = block_number
+                    continue
+            except Exception as e:
+                # Left pending (and unchecked), the watcher looks it up again
+                logging.warning(f"Error looking up the receipt of {key}, will retry: {e}")
+                continue
+            self._resolve(key, receipt)
+
+    def _watch(self):
+        while True:
+            try:
+                self.check()
+            except Exception as e:
+                logging.error(f"Error checking for transaction receipts: {e}")
+            time.sleep(self.poll_interval)
+
+    def check(self):
+        """
+        Resolves the pending transactions mined since the last check.
+        """
+        latest_block = self.web3.eth.block_number
+        if self.last_block is not None and latest_block <= self.last_block:
+            return
+        with self.lock:
+            keys = list(self.pending)
+        if not keys:
+            self.last_block = latest_block
+            return
+
+        if self.last_block is None or latest_block - self.last_block > self.max_block_gap:
+            self._lookup(keys, latest_block)
+        else:
+            for block_number in range(self.last_block + 1, latest_block + 1):
+                block = self.web3.eth.get_block(block_number)
+                with self.lock:
+                    mined = [key for key in (Web3.to_hex(tx).lower() for tx in block['transactions']) if key in self.pending]
+                self._lookup(mined, block_number)
+
+            # Look up hashes that may have been mined before they were tracked
+            with self.lock:
+                unchecked = [
+                    key for key, entry in self.pending.items()
+                    if entry['checked'] is None or latest_block - entry['checked'] >= self.recheck_blocks
+                ]
+            self._lookup(unchecked, latest_block)
+        self.last_block = latest_block
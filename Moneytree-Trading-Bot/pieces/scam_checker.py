@@ -0,0 +1,144 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from contextlib import contextmanager
+
+class ScamChecker:
+    """
+    Scam verdicts of tokens, evaluated in the background as soon as a signal arrives, so they are
+    ready by the time the market cap and price checks are done. `check(token_address, deadline=...)`
+    returns (scam_detected, reason), or None when it has no verdict, which is never cached.
+
+    Verdicts are cached per token for `ttl` seconds in a JSON file shared by all position workers,
+    and a token being evaluated by one worker is waited for, not evaluated again, by the others.
+    Waiting for a verdict is bounded by `deadline` seconds from the start of the evaluation, after
+    which `default_verdict` applies.
+    """
+
+    def __init__(self, check, path, ttl=900, deadline=120, default_verdict=(True, "Scam check deadline passed"), workers=4, poll_interval=1):
+        self.check = check
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.ttl = ttl
+        self.deadline = deadline
+        self.default_verdict = default_verdict
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.lock = threading.Lock()
+        self.executor = None
+        self.executor_pid = None
+        self.futures = {}
+
+    @contextmanager
+    def _locked(self):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                state = self._load()
+                yield state
+                self._save(state)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            pass
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Ignoring unreadable scam verdict cache '{self.path}': {e}")
+        return {}
+
+    def _save(self, state):
+        now = time.time()
+        state = {
+            key: entry for key, entry in state.items()
+            if now - entry.get('checked_at', 0) < self.ttl or entry.get('running_until', 0) > now
+        }
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.path)
+
+    def _cached(self, entry):
+        if entry is not None and 'scam' in entry and time.time() - entry['checked_at'] < self.ttl:
+            return entry['scam'], entry['reason']
+        return None
+
+    def start(self, token_address):
+        """
+        Starts evaluating the token unless a verdict is cached or on its way. Returns the Future of the verdict.
+        """
+        key = token_address.lower()
+        with self.lock:
+            # Threads do not survive a fork, so every process gets its own executor
+            if self.executor_pid != os.getpid():
+                self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='scam-check')
+                self.executor_pid = os.getpid()
+                self.futures = {}
+            future = self.futures.get(key)
+            if future is None:
+                deadline = time.time() + self.deadline
+                future = self.executor.submit(self._evaluate, token_address, deadline)
+                future.deadline = deadline
+                self.futures[key] = future
+                future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self.lock:
+            if self.futures.get(key) is future:
+                del self.futures[key]
+
+    def _evaluate(self, token_address, deadline):
+        key = token_address.lower()
+        with self._locked() as state:
+            entry = state.get(key)
+            verdict = self._cached(entry)
+            if verdict is not None:
+                logging.info(f"x Cached anti-scam verdict for token {token_address}: {verdict}")
+                return verdict
+            evaluated_elsewhere = entry is not None and entry.get('running_until', 0) > time.time()
+            if not evaluated_elsewhere:
+                state[key] = {'running_until': deadline}
+
+        if evaluated_elsewhere:
+            logging.info(f"x Token {token_address} is being checked by another worker, waiting for its verdict.")
+            while time.time() < deadline:
+                time.sleep(self.poll_interval)
+                with self._locked() as state:
+                    verdict = self._cached(state.get(key))
+                if verdict is not None:
+                    return verdict
+            return None
+
+        verdict = None
+        try:
+            verdict = self.check(token_address, deadline=deadline)
+        except Exception as e:
+            logging.error(f"x Anti-scam check of token {token_address} failed: {e}")
+        with self._locked() as state:
+            if verdict is None:
+                state.pop(key, None)
+            else:
+                state[key] = {'scam': verdict[0], 'reason': verdict[1], 'checked_at': time.time()}
+        return verdict
+
+    def verdict(self, token_address):
+        """
+        Returns (scam_detected, reason) of the token, waiting at most until the deadline of its evaluation.
+        """
+        future = self.start(token_address)
+        try:
+            verdict = future.result(timeout=max(0, future.deadline - time.time()))
+        except TimeoutError:
+            verdict = None
+        if verdict is None:
+            logging.warning(f"x No anti-scam verdict for token {token_address} within {self.deadline} seconds. Using the default: {self.default_verdict}")
+            return self.default_verdict
+        return verdict
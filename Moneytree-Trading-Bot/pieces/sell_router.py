@@ -0,0 +1,107 @@
+import json
+import logging
+from web3 import Web3
+
+# Uniswap V3 QuoterV2, quotes are read by simulating the swap with eth_call
+QUOTER_V2_ADDRESS = Web3.to_checksum_address('0x61fFE014bA17989E743c5F6cB21bF9697530B21e')
+
+quoter_v2_abi = json.loads('[{"inputs":[{"components":[{"internalType":"address","name":"tokenIn","type":"address"},{"internalType":"address","name":"tokenOut","type":"address"},{"internalType":"uint256","name":"amountIn","type":"uint256"},{"internalType":"uint24","name":"fee","type":"uint24"},{"internalType":"uint160","name":"sqrtPriceLimitX96","type":"uint160"}],"internalType":"struct IQuoterV2.QuoteExactInputSingleParams","name":"params","type":"tuple"}],"name":"quoteExactInputSingle","outputs":[{"internalType":"uint256","name":"amountOut","type":"uint256"},{"internalType":"uint160","name":"sqrtPriceX96After","type":"uint160"},{"internalType":"uint32","name":"initializedTicksCrossed","type":"uint32"},{"internalType":"uint256","name":"gasEstimate","type":"uint256"}],"stateMutability":"nonpayable","type":"function"}]')
+
+# Venue of the V2 pair, V3 pools are identified by their fee tier
+V2_VENUE = 'V2'
+
+class SellRouter:
+    """
+    Routes a token -> ETH sell across the Uniswap V2 pair and the V3 pools of the token. All venues
+    are quoted in one batched call, for the whole amount and for half of it, and the route with
+    the best total output is picked: the whole amount on one venue, or half on each of the two best
+    venues. Every leg gets a minimum output of its quote less the slippage tolerance.
+    """
+
+    def __init__(self, web3, multicall, v2_router, v3_router, weth_address, slippage_tolerance):
+        self.multicall = multicall
+        self.v2_router = v2_router
+        self.v3_router = v3_router
+        self.weth_address = weth_address
+        self.slippage_tolerance = slippage_tolerance
+        self.quoter = web3.eth.contract(address=QUOTER_V2_ADDRESS, abi=quoter_v2_abi)
+
+    def _quote_calls(self, token_address, venue, amount_in):
+        if venue == V2_VENUE:
+            return (self.v2_router, 'getAmountsOut', [amount_in, [token_address, self.weth_address]])
+        return (self.quoter, 'quoteExactInputSingle', [(token_address, self.weth_address, amount_in, venue, 0)])
+
+    @staticmethod
+    def _amount_out(venue, result):
+        if result is None:
+            return None
+        # getAmountsOut returns the amounts along the path, the quoter (amountOut, ...)
+        return result[-1] if venue == V2_VENUE else result[0]
+
+    def quote(self, token_address, amount_in, pair_address, pools):
+        """
+        Returns {venue: (amount_out, half_amount_out)} for the venues the token trades on.
+        A venue that could not be quoted has None amounts.
+        """
+        venues = ([V2_VENUE] if pair_address else []) + [fee for fee, pool_address in pools]
+        calls = []
+        for venue in venues:
+            calls.append(self._quote_calls(token_address, venue, amount_in))
+            calls.append(self._quote_calls(token_address, venue, amount_in // 2))
+        if not calls:
+            return {}
+        _, results = self.multicall.call(calls)
+        return {
+            venue: (self._amount_out(venue, results[2 * i]), self._amount_out(venue, results[2 * i + 1]))
+            for i, venue in enumerate(venues)
+        }
+
+    def route(self, token_address, amount_in, pair_address, pools, fee_on_transfer=False):
+        """
+        Returns the legs of the best route as [{'venue', 'amount_in', 'quote', 'amount_out_min'}].
+        Tokens taking a fee on transfer can only go through the V2 fee-on-transfer swap, their
+        output cannot be quoted.
+        """
+        if fee_on_transfer:
+            if not pair_address:
+                raise Exception("Fee-on-transfer sell needs a Uniswap V2 pair.")
+            return [{'venue': V2_VENUE, 'amount_in': amount_in, 'quote': None, 'amount_out_min': 0}]
+
+        quotes = self.quote(token_address, amount_in, pair_address, pools)
+        logging.info(f"Sell quotes for {amount_in} of {token_address} (whole, half): {quotes}")
+
+        candidates = [[(venue, amount_in, amount_out)] for venue, (amount_out, _) in quotes.items() if amount_out]
+        halves = sorted(((amount_out, venue) for venue, (_, amount_out) in quotes.items() if amount_out), key=lambda quote: quote[0], reverse=True)
+        if len(halves) >= 2:
+            half = amount_in // 2
+            (first_out, first_venue), (second_out, second_venue) = halves[:2]
+            candidates.append([(first_venue, half, first_out), (second_venue, amount_in - half, second_out)])
+        if not candidates:
+            raise Exception(f"No Uniswap V2 or V3 quote for selling {token_address}.")
+
+        best = max(candidates, key=lambda legs: sum(amount_out for _, _, amount_out in legs))
+        return [
+            {'venue': venue, 'amount_in': leg_amount, 'quote': amount_out, 'amount_out_min': int(amount_out * (1 - self.slippage_tolerance))}
+            for venue, leg_amount, amount_out in best
+        ]
+
+    def spender(self, leg):
+        router = self.v2_router if leg['venue'] == V2_VENUE else self.v3_router
+        return router.address
+
+    def swap_function(self, token_address, leg, recipient, deadline, fee_on_transfer=False):
+        """
+        Returns the router call of a leg, ready to be built into a transaction.
+        """
+        if leg['venue'] == V2_VENUE:
+            path = [token_address, self.weth_address]
+            if fee_on_transfer:
+                return self.v2_router.functions.swapExactTokensForETHSupportingFeeOnTransferTokens(leg['amount_in'], leg['amount_out_min'], path, recipient, deadline)
+            return self.v2_router.functions.swapExactTokensForETH(leg['amount_in'], leg['amount_out_min'], path, recipient, deadline)
+
+        # The V3 router swaps into WETH held by itself, then unwraps it to ETH for the recipient
+        swap = self.v3_router.encodeABI(fn_name='exactInputSingle', args=[(
+            token_address, self.weth_address, leg['venue'], self.v3_router.address, deadline, leg['amount_in'], leg['amount_out_min'], 0
+        )])
+        unwrap = self.v3_router.encodeABI(fn_name='unwrapWETH9', args=[leg['amount_out_min'], recipient])
+        return self.v3_router.functions.multicall([swap, unwrap])
@@ -0,0 +1,235 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import pytz
+
+# Days start at midnight in this timezone
+local_tz = pytz.timezone('Europe/Berlin')
+
+# Fields of a transaction record and their defaults when it is created
+FIELDS = {
+    "time": None,
+    "post_hash": None,
+    "wallet_name": "N/A",
+    "token_symbol": "N/A",
+    "token_hash": "N/A",
+    "pid": "N/A",
+    "amount_of_eth": "N/A",
+    "buy": "",
+    "buy_tx": "",
+    "sell": "",
+    "sell_tx": "",
+    "fail": "",
+    "profit_loss": ""
+}
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS transactions (
+    id INTEGER PRIMARY KEY,
+    {', '.join(f'{field} TEXT' for field in FIELDS)},
+    seq INTEGER NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE UNIQUE INDEX IF NOT EXISTS transactions_post_hash ON transactions (post_hash);
+CREATE UNIQUE INDEX IF NOT EXISTS transactions_seq ON transactions (seq);
+CREATE INDEX IF NOT EXISTS transactions_time ON transactions (time);
+CREATE INDEX IF NOT EXISTS transactions_updated_at ON transactions (updated_at);
+CREATE INDEX IF NOT EXISTS transactions_wallet ON transactions (wallet_name, updated_at);
+"""
+
+# Conditions of the statuses a record can be filtered by
+STATUSES = {
+    "pending": "buy = ''",
+    "open": "buy = 'YES' AND sell = '' AND fail = ''",
+    "bought": "buy = 'YES'",
+    "sold": "sell = 'YES'",
+    "failed": "fail != ''"
+}
+
+def day_start(days_ago=0):
+    """
+    Returns the UTC ISO timestamp of the local midnight that started the day `days_ago` days ago.
+    """
+    midnight = datetime.now(local_tz).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+    return local_tz.normalize(midnight).astimezone(timezone.utc).isoformat()
+
+def local_day(timestamp=None):
+    """
+    Returns the local day (YYYYMMDD) of a UTC ISO timestamp, or of now.
+    """
+    moment = datetime.now(local_tz) if timestamp is None else datetime.fromisoformat(timestamp).astimezone(local_tz)
+    return moment.strftime('%Y%m%d')
+
+class StatisticsStore:
+    """
+    Transaction statistics in a SQLite database in WAL mode, shared by the trading bot's position
+    workers (writers) and the console (reader). A record is keyed by the post hash of the copied
+    transaction and updated in place with an upsert, so a state change is one indexed write, and
+    SQLite's locking makes concurrent writers from several processes safe.
+
+    Every write stamps the record with `updated_at` and a new `seq`, a counter that only grows, so
+    readers can fetch what changed since a given seq. A day is the set of records updated since
+    local midnight; rotation is a query boundary instead of a file move.
+    """
+
+    def __init__(self, path, busy_timeout=10):
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.initialized = False
+
+    def connection(self):
+        # One connection per thread and process, sqlite3 connections must not cross either
+        connection = getattr(self.local, 'connection', None)
+        if connection is None or self.local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+            self.local.pid = os.getpid()
+            with self.lock:
+                if not self.initialized:
+                    connection.executescript(SCHEMA)
+                    self.initialized = True
+        return connection
+
+    @contextmanager
+    def _writing(self):
+        # Writers take the database lock up front, so the next seq cannot be taken twice
+        connection = self.connection()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield connection
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+
+    @staticmethod
+    def _next_seq(connection):
+        return connection.execute('SELECT COALESCE(MAX(seq), 0) + 1 FROM transactions').fetchone()[0]
+
+    def log(self, data):
+        """
+        Creates the record of data['post_hash'] or updates the fields given in data. Returns its new seq.
+        """
+        now = datetime.now(timezone.utc).isoformat()
+        fields = [field for field in FIELDS if field in data and field != 'post_hash']
+        values = {field: data.get(field, default) for field, default in FIELDS.items()}
+        if values['time'] is None:
+            values['time'] = now
+        with self._writing() as connection:
+            seq = self._next_seq(connection)
+            connection.execute(
+                f"INSERT INTO transactions ({', '.join(FIELDS)}, seq, updated_at) "
+                f"VALUES ({', '.join(f':{field}' for field in FIELDS)}, :seq, :updated_at) "
+                f"ON CONFLICT (post_hash) DO UPDATE SET "
+                f"{''.join(f'{field} = excluded.{field}, ' for field in fields)}seq = excluded.seq, updated_at = excluded.updated_at",
+                dict(values, seq=seq, updated_at=now)
+            )
+        return seq
+
+    def transactions(self, since=None, wallet_name=None, after_seq=None, limit=None, token=None, status=None, time_from=None, time_to=None):
+        """
+        Returns the records updated since the `since` UTC ISO timestamp, oldest change first. They can
+        be narrowed down to one wallet, a token (address or symbol), a status (see STATUSES), a range
+        of creation times (UTC ISO timestamps) and/or to a seq above after_seq.
+        """
+        conditions, parameters = [], []
+        if since is not None:
+            conditions.append('updated_at >= ?')
+            parameters.append(since)
+        if wallet_name is not None:
+            conditions.append('wallet_name = ?')
+            parameters.append(wallet_name)
+        if token is not None:
+            conditions.append('(lower(token_hash) = lower(?) OR lower(token_symbol) = lower(?))')
+            parameters += [token, token]
+        if status is not None:
+            conditions.append(STATUSES[status])
+        if time_from is not None:
+            conditions.append('time >= ?')
+            parameters.append(time_from)
+        if time_to is not None:
+            conditions.append('time < ?')
+            parameters.append(time_to)
+        if after_seq is not None:
+            conditions.append('seq > ?')
+            parameters.append(after_seq)
+        query = 'SELECT * FROM transactions'
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY seq'
+        if limit is not None:
+            query += ' LIMIT ?'
+            parameters.append(limit)
+        return [dict(row) for row in self.connection().execute(query, parameters)]
+
+    def latest_seq(self):
+        """
+        Returns the seq of the last write, 0 while the store is empty.
+        """
+        return self.connection().execute('SELECT COALESCE(MAX(seq), 0) FROM transactions').fetchone()[0]
+
+    def todays_transactions(self):
+        return self.transactions(since=day_start())
+
+    def profit_loss(self, since):
+        """
+        Returns the sum of the profit/loss of the records updated since the given UTC ISO timestamp.
+        """
+        row = self.connection().execute(
+            "SELECT COALESCE(SUM(CAST(profit_loss AS REAL)), 0) FROM transactions WHERE updated_at >= ? AND profit_loss != ''",
+            (since,)
+        ).fetchone()
+        return row[0]
+
+    def prune(self, days):
+        """
+        Deletes the records not updated for more than the given number of days.
+        """
+        with self._writing() as connection:
+            return connection.execute('DELETE FROM transactions WHERE updated_at < ?', (day_start(days),)).rowcount
+
+    def import_json_logs(self, directory):
+        """
+        Imports the daily JSON files of the former statistics logs once, when the store is still empty.
+        """
+        if not os.path.isdir(directory):
+            return 0
+        # Archives are named transaction_logs_YYYYMMDD.json and go before the current transaction_logs.json
+        files = sorted(
+            (f for f in os.listdir(directory) if f.startswith('transaction_logs') and f.endswith('.json')),
+            key=lambda f: (f == 'transaction_logs.json', f)
+        )
+        records = []
+        for file_name in files:
+            file_path = os.path.join(directory, file_name)
+            try:
+                with open(file_path, 'r') as f:
+                    logs = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logging.error(f"s Skipping unreadable statistics log {file_path}: {e}")
+                continue
+            updated_at = datetime.fromtimestamp(os.path.getmtime(file_path), tz=timezone.utc).isoformat()
+            records += [(log, updated_at) for log in logs]
+
+        with self._writing() as connection:
+            if connection.execute('SELECT 1 FROM transactions LIMIT 1').fetchone() is not None:
+                return 0
+            for seq, (log, updated_at) in enumerate(records, start=1):
+                values = {field: log.get(field, default) for field, default in FIELDS.items()}
+                connection.execute(
+                    f"INSERT OR REPLACE INTO transactions ({', '.join(FIELDS)}, seq, updated_at) "
+                    f"VALUES ({', '.join(f':{field}' for field in FIELDS)}, :seq, :updated_at)",
+                    dict(values, seq=seq, updated_at=updated_at)
+                )
+        if records:
+            logging.info(f"s Imported {len(records)} records from the JSON statistics logs into {self.path}")
+        return len(records)
@@ -3,6 +3,7 @@ import re
 import logging
 import yaml
 import os
+from pieces.http_client import http_client
 
 # Get the absolute path of the parent directory
 parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -48,8 +49,9 @@ def send_telegram_message(message):
 
     logging.info(f"Sending Telegram message!")
 
+    response = None
     try:
-        response = requests.post(url, data=data)
+        response = http_client.post(url, data=data)
         response.raise_for_status()
         logging.info(f"Telegram response: {response.json()}")
     except requests.exceptions.RequestException as e:
@@ -0,0 +1,134 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from web3 import Web3
+
+# Get the absolute path of the parent directory
+parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+
+# Shared by both bots
+cache_directory = os.path.join(parent_directory, 'logs/cache')
+os.makedirs(cache_directory, exist_ok=True)
+token_cache_path = os.path.join(cache_directory, 'token_metadata.json')
+
+class TokenMetadataCache:
+    """
+    In-memory LRU cache of ERC-20 metadata backed by a JSON file shared by both bots.
+    Entries are keyed by checksummed address. Name, symbol and decimals never expire;
+    the total supply is refreshed once it is older than `supply_ttl` seconds. Writes take an
+    exclusive lock on a companion lock file, so neither bot overwrites what the other just added.
+    """
+
+    def __init__(self, path, max_entries=5000, supply_ttl=300):
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self.max_entries = max_entries
+        self.supply_ttl = supply_ttl
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.file_mtime = None
+        self._load()
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+            if mtime == self.file_mtime:
+                return
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+            self.file_mtime = mtime
+        except FileNotFoundError:
+            return
+        except (OSError, json.JSONDecodeError) as e:
+            logging.error(f"Ignoring unreadable token metadata cache '{self.path}': {e}")
+            return
+        for address, entry in stored.items():
+            current = self.entries.get(address)
+            if current is None or entry.get('supply_updated', 0) > current.get('supply_updated', 0):
+                self.entries[address] = entry
+        self._evict()
+
+    def _save(self):
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(self.lock_path, 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    # Merge with what the other bot may have written, then replace the file atomically
+                    self._load()
+                    with open(tmp_path, 'w') as f:
+                        json.dump(self.entries, f)
+                    os.replace(tmp_path, self.path)
+                    self.file_mtime = os.path.getmtime(self.path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        except OSError as e:
+            logging.error(f"Failed to write token metadata cache '{self.path}': {e}")
+
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def get(self, token_address, fetch_metadata, fetch_total_supply):
+        """
+        Returns (name, symbol, decimals, total_supply_raw) for the token.
+        fetch_metadata(address) -> (name, symbol, decimals) is only called for unknown tokens,
+        fetch_total_supply(address) -> raw total supply only when the cached supply is stale.
+        """
+        address = Web3.to_checksum_address(token_address)
+        with self.lock:
+            entry = self.entries.get(address)
+            if entry is None:
+                # Another process may have cached it in the meantime
+                self._load()
+                entry = self.entries.get(address)
+            if entry is not None:
+                self.entries.move_to_end(address)
+                entry = dict(entry)
+
+        changed = False
+        if entry is None:
+            name, symbol, decimals = fetch_metadata(address)
+            entry = {'name': name, 'symbol': symbol, 'decimals': decimals}
+            changed = True
+        if time.time() - entry.get('supply_updated', 0) > self.supply_ttl:
+            entry['total_supply'] = str(fetch_total_supply(address))  # Raw supply can exceed JSON-safe ints
+            entry['supply_updated'] = time.time()
+            changed = True
+
+        if changed:
+            with self.lock:
+                self.entries[address] = entry
+                self.entries.move_to_end(address)
+                self._evict()
+                self._save()
+
+        return entry['name'], entry['symbol'], entry['decimals'], int(entry['total_supply'])
+
+    def get_metadata(self, token_address, fetch_metadata):
+        """
+        Returns (name, symbol, decimals) without touching the total supply.
+        """
+        address = Web3.to_checksum_address(token_address)
+        with self.lock:
+            entry = self.entries.get(address)
+            if entry is None:
+                self._load()
+                entry = self.entries.get(address)
+            if entry is not None:
+                self.entries.move_to_end(address)
+                return entry['name'], entry['symbol'], entry['decimals']
+
+        name, symbol, decimals = fetch_metadata(address)
+        with self.lock:
+            self.entries[address] = {'name': name, 'symbol': symbol, 'decimals': decimals}
+            self._evict()
+            self._save()
+        return name, symbol, decimals
+
+# Shared instance for the whole process
+token_cache = TokenMetadataCache(token_cache_path)
@@ -0,0 +1,156 @@
+import logging
+import os
+import yaml
+import json
+from web3 import Web3
+from pieces.trading_utils import sign_and_send
+from pieces.uniswap import get_approval_amount
+from pieces.allowance_cache import AllowanceCache, MAX_UINT256
+
+# Get the absolute path of the parent directory
+parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+
+# Construct the config file path in the parent directory
+config_file_path = os.path.join(parent_directory, 'config.yaml')
+
+try:
+    with open(config_file_path, 'r') as file:
+        config = yaml.safe_load(file)
+except FileNotFoundError:
+    logging.error(f"Configuration file '{config_file_path}' not found.")
+    exit()
+except yaml.YAMLError as exc:
+    logging.error(f"Error parsing YAML file: {exc}")
+    exit()
+
+# Initialize web3
+ETEREUM_NODE_URL = config['ETEREUM_NODE_URL']
+web3 = Web3(Web3.HTTPProvider(ETEREUM_NODE_URL))
+
+# Wallet details
+WALLET_PRIVATE_KEY = config['WALLET_PRIVATE_KEY']
+WALLET_ADDRESS = web3.eth.account.from_key(WALLET_PRIVATE_KEY).address
+
+# Load priority fee
+BASE_FEE_MULTIPLIER = config['BASE_FEE_MULTIPLIER']
+PRIORITY_FEE_MULTIPLIER = config['PRIORITY_FEE_MULTIPLIER']
+TOTAL_FEE_MULTIPLIER = config['TOTAL_FEE_MULTIPLIER']
+
+# How the router gets approved to sell tokens:
+#   exact  - approve the amount being sold, at sell time
+#   max    - approve the max amount at the first sell, later sells of the token need no approval
+#   prebuy - approve the max amount right after the buy is sent, so it is mined with the buy
+APPROVAL_STRATEGY = config.get('APPROVAL_STRATEGY', 'prebuy')
+
+# Uniswap Router address
+UNISWAP_V2_ROUTER_ADDRESS = Web3.to_checksum_address('0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D')  # Uniswap V2 Router
+
+with open('abis/IUniswapV2ERC20.json') as file:
+    uniswap_v2_erc20_abi = json.load(file)["abi"]
+
+# Allowances granted to the router, shared by all position workers
+allowance_directory = os.path.join(parent_directory, 'logs/mtdb')
+os.makedirs(allowance_directory, exist_ok=True)
+allowance_cache = AllowanceCache(os.path.join(allowance_directory, 'allowances.json'))
+
+def send_approval(token_address, amount, spender=UNISWAP_V2_ROUTER_ADDRESS):
+    """
+    Sends an approval of the spender (a router) for amount tokens and remembers it as in flight.
+    Returns the transaction hash.
+    """
+    token_contract = web3.eth.contract(address=token_address, abi=uniswap_v2_erc20_abi)
+    approve_txn = token_contract.functions.approve(
+        spender,
+        amount
+    ).build_transaction({
+        'from': WALLET_ADDRESS,
+    })
+
+    # Handle gas limit and fees for approval transaction
+    if not config['ENABLE_AUTOMATIC_FEES']:
+        # Estimate gas limit for approval
+        approve_txn['gas'] = web3.eth.estimate_gas(approve_txn)
+
+        # Manual fee setting based on multipliers
+        base_fee = int(web3.eth.get_block('latest')['baseFeePerGas'] * BASE_FEE_MULTIPLIER)
+        priority_fee = int(web3.eth.max_priority_fee * PRIORITY_FEE_MULTIPLIER)
+        total_fee = int((base_fee + priority_fee) * TOTAL_FEE_MULTIPLIER)
+
+        approve_txn['maxFeePerGas'] = total_fee
+        approve_txn['maxPriorityFeePerGas'] = priority_fee
+
+        logging.info(f"Manual fees applied for approval: Total Fee: {web3.from_wei(total_fee, 'gwei')} GWEI, Priority Fee: {web3.from_wei(priority_fee, 'gwei')} GWEI")
+
+    # Sign and send the approval transaction
+    approve_tx_hash = sign_and_send(approve_txn)
+    allowance_cache.set(WALLET_ADDRESS, spender, token_address, amount, tx_hash=approve_tx_hash.hex())
+    logging.info(f"APPROVE TRANSACTION SENT WITH HASH: {approve_tx_hash.hex()}")
+    return approve_tx_hash
+
+def wait_for_approval(token_address, approve_tx_hash, spender=UNISWAP_V2_ROUTER_ADDRESS):
+    """
+    Waits for an approval to be mined and caches the approved amount. Returns it, or None on failure.
+    """
+    approved_amount = get_approval_amount(approve_tx_hash)
+    if not isinstance(approved_amount, int):
+        allowance_cache.forget(WALLET_ADDRESS, spender, token_address)
+        return None
+    allowance_cache.set(WALLET_ADDRESS, spender, token_address, approved_amount)
+    return approved_amount
+
+def approve_after_buy(token_address):
+    """
+    With the prebuy strategy, approves the router for the max amount as soon as the buy is sent.
+    The approval takes the next nonce, so it is mined together with the buy and the sell later
+    needs no approval. Does nothing with the other strategies.
+    """
+    if APPROVAL_STRATEGY != 'prebuy':
+        return None
+    entry = allowance_cache.get(WALLET_ADDRESS, UNISWAP_V2_ROUTER_ADDRESS, token_address)
+    if entry is not None and entry['allowance'] == MAX_UINT256:
+        logging.info(f"Router already approved for {token_address}, skipping the approval.")
+        return None
+    try:
+        return send_approval(token_address, MAX_UINT256)
+    except Exception as e:
+        # The sell approves again if needed
+        logging.error(f"Failed to send the approval for {token_address} after the buy: {e}")
+        return None
+
+def ensure_allowance(token_contract, amount, spender=UNISWAP_V2_ROUTER_ADDRESS):
+    """
+    Makes sure the spender (a router) may spend amount tokens of the wallet, approving it if needed.
+    The cached allowance is used when it covers the amount, so the common case needs no RPC call.
+    Returns True if the spender may spend the amount.
+    """
+    token_address = token_contract.address
+    entry = allowance_cache.get(WALLET_ADDRESS, spender, token_address)
+
+    # An approval sent earlier (at buy time or by another position) may still be in flight
+    if entry is not None and entry['tx_hash']:
+        logging.info(f"Waiting for approval {entry['tx_hash']} of {token_address}.")
+        approved_amount = wait_for_approval(token_address, entry['tx_hash'], spender)
+        entry = None if approved_amount is None else {'allowance': approved_amount}
+
+    if entry is not None and entry['allowance'] >= amount:
+        logging.info(f"Cached token allowance {entry['allowance']} covers {amount} tokens, no approval needed.")
+        return True
+
+    allowance = token_contract.functions.allowance(WALLET_ADDRESS, spender).call()
+    logging.info(f"Current token allowance of {spender}: {allowance} tokens")
+    allowance_cache.set(WALLET_ADDRESS, spender, token_address, allowance)
+    if allowance >= amount:
+        return True
+
+    approval_amount = amount if APPROVAL_STRATEGY == 'exact' else MAX_UINT256
+    logging.info(f"Approving router {spender} to spend {approval_amount} tokens")
+    approve_tx_hash = send_approval(token_address, approval_amount, spender)
+    approved_amount = wait_for_approval(token_address, approve_tx_hash, spender)
+    return approved_amount is not None and approved_amount >= amount
+
+def spend_allowance(token_address, amount, spender=UNISWAP_V2_ROUTER_ADDRESS):
+    allowance_cache.spend(WALLET_ADDRESS, spender, token_address, amount)
+
+def forget_allowance(token_address, spender=UNISWAP_V2_ROUTER_ADDRESS):
+    # The cached allowance may be wrong, read it from the chain next time
+    allowance_cache.forget(WALLET_ADDRESS, spender, token_address, keep_pending=True)
@@ -6,13 +6,15 @@ import time
 from datetime import datetime, timedelta, timezone
 from web3 import Web3
 from pieces.trading_utils import (
-    retry_scam_check,
+    scam_checker,
     check_eth_balance,
     calculate_token_amount,
-    send_transaction
+    sign_and_send
 )
 from pieces.statistics import log_transaction
-from pieces.uniswap import get_uniswap_v2_price, get_uniswap_v3_price, get_swap_amount
+from pieces.uniswap import get_uniswap_price, get_swap_amount
+from pieces.buy_engine import BuyEngine
+from pieces.trading_approve import approve_after_buy
 
 # Get the absolute path of the parent directory
 parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -46,6 +48,9 @@ TOTAL_FEE_MULTIPLIER = config['TOTAL_FEE_MULTIPLIER']
 # Slippage
 SLIPPAGE_TOLERANCE = config['SLIPPAGE_TOLERANCE']
 
+# Fixed gas limit of buys, saves an estimate_gas call per buy (0 to estimate every buy instead)
+BUY_GAS_LIMIT = config.get('BUY_GAS_LIMIT', 300000)
+
 # Uniswap Router address
 UNISWAP_V2_ROUTER_ADDRESS = Web3.to_checksum_address('0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D')  # Uniswap V2 Router
 UNISWAP_V3_ROUTER_ADDRESS = Web3.to_checksum_address('0xE592427A0AEce92De3Edee1F18E0157C05861564')  # Uniswap V3 Router
@@ -75,7 +80,20 @@ uniswap_v3_factory = web3.eth.contract(address=Web3.to_checksum_address('0x1F984
 # Constants
 WETH_ADDRESS = Web3.to_checksum_address('0xC02aaA39b223FE8D0A0E5C4F27eAD9083C756Cc2')
 
-def buy_token(token_address, amount_eth, trans_hash, decimals):
+# Builds buy transactions from cached fees and a prepared template
+buy_engine = BuyEngine(
+    web3,
+    uniswap_v2_router,
+    WALLET_ADDRESS,
+    WETH_ADDRESS,
+    gas_limit=BUY_GAS_LIMIT,
+    automatic_fees=config['ENABLE_AUTOMATIC_FEES'],
+    base_fee_multiplier=BASE_FEE_MULTIPLIER,
+    priority_fee_multiplier=PRIORITY_FEE_MULTIPLIER,
+    total_fee_multiplier=TOTAL_FEE_MULTIPLIER
+)
+
+def buy_token(token_address, amount_eth, trans_hash, decimals, signal_time=None):
     max_retries = 30  # Maximum number of retries
     retry_count = 0  # Track the number of retries
 
@@ -83,14 +101,16 @@ def buy_token(token_address, amount_eth, trans_hash, decimals):
     retry_delays = [5] * max_retries
 
     try:
+        # Latency is measured from the moment the signal reached the bot
+        signal_time = signal_time or time.time()
         logging.info(f"Starting buy process for token: {token_address} with {amount_eth} ETH")
 
         # Ensure token_address is checksummed
         token_address = Web3.to_checksum_address(token_address)
         logging.debug(f"Checksummed token address: {token_address}")
 
-        # Run DexAnalyzer Scraper with retry logic
-        scam_detected, scam_reason = retry_scam_check(token_address)
+        # Scam verdict, usually evaluated while the market cap and price were checked
+        scam_detected, scam_reason = scam_checker.verdict(token_address)
         if scam_detected:
             # Log failure for scam detected
             log_transaction({
@@ -121,71 +141,42 @@ def buy_token(token_address, amount_eth, trans_hash, decimals):
             })
             return None, None, initial_eth_balance, None
 
-        # Determine transaction parameters
+        # Everything that does not depend on the price is prepared once
+        amount_wei = web3.to_wei(amount_eth, 'ether')
+        template = buy_engine.prepare(token_address, amount_wei)
         deadline = int((datetime.now(timezone.utc) + timedelta(minutes=10)).timestamp())
-        logging.debug(f"Transaction deadline: {deadline}, Slippage tolerance: {SLIPPAGE_TOLERANCE}")
+        logging.debug(f"Transaction deadline: {deadline}, Slippage tolerance: {SLIPPAGE_TOLERANCE}, Swap path: {template['path']}")
+        checks_done = time.time()
 
+        txn = None
         while retry_count < max_retries:
             try:
                 # Get token price from Uniswap
-                initial_price, pair_address = get_uniswap_v2_price(token_address, decimals)
-                if initial_price is None:
-                    initial_price, pair_address = get_uniswap_v3_price(token_address, decimals)
+                attempt_start = time.time()
+                initial_price, pair_address = get_uniswap_price(token_address, decimals)
                 if initial_price is None:
                     raise Exception("Token price not found on Uniswap V2 or V3.")
+                price_done = time.time()
                 logging.info(f"Token price: {initial_price}")
 
                 # Calculate the estimated output amount
-                estimated_output_amount = calculate_token_amount(web3.to_wei(amount_eth, 'ether'), initial_price)
+                estimated_output_amount = calculate_token_amount(amount_wei, initial_price)
                 logging.info(f"Estimated output amount (without slippage): {estimated_output_amount}")
 
                 # Calculate the minimum output amount (after applying slippage tolerance)
                 amount_out_min = int(estimated_output_amount * (1 - SLIPPAGE_TOLERANCE))
                 logging.info(f"Minimum output amount (amount_out_min) after slippage: {amount_out_min}")
 
-                # Create the path for the swap (WETH -> Token)
-                path = [WETH_ADDRESS, token_address]
-                logging.debug(f"Swap path: {path}")
-
-                # Create the transaction
-                txn = uniswap_v2_router.functions.swapExactETHForTokens(
-                    amount_out_min,
-                    path,
-                    WALLET_ADDRESS,
-                    deadline
-                ).build_transaction({
-                    'from': WALLET_ADDRESS,
-                    'value': web3.to_wei(amount_eth, 'ether'),
-                    'nonce': web3.eth.get_transaction_count(WALLET_ADDRESS),
-                })
-                logging.info("Transaction built successfully.")
-
-                # Handle gas and fee settings based on ENABLE_AUTOMATIC_FEES
-                if config['ENABLE_AUTOMATIC_FEES']:
-                    # Automatic mode: Do not manually set gas limit or fees
-                    logging.info("Automatic fees and gas limits are enabled. Letting the Ethereum node handle everything.")
-                else:
-                    # Estimate gas limit manually
-                    gas_limit = web3.eth.estimate_gas(txn)
-                    txn['gas'] = gas_limit
-                    logging.info(f"Estimated gas limit: {gas_limit}")
-
-                    # Manual fee setting based on multipliers
-                    base_fee = int(web3.eth.get_block('latest')['baseFeePerGas'] * BASE_FEE_MULTIPLIER)
-                    priority_fee = int(web3.eth.max_priority_fee * PRIORITY_FEE_MULTIPLIER)
-
-                    total_fee = int((base_fee + priority_fee) * TOTAL_FEE_MULTIPLIER)
-
-                    txn['maxFeePerGas'] = total_fee
-                    txn['maxPriorityFeePerGas'] = priority_fee
-
-                    logging.info(f"Manual fees applied: Total Fee: {web3.from_wei(total_fee, 'gwei')} GWEI, Priority Fee: {web3.from_wei(priority_fee, 'gwei')} GWEI")
-
-                # Sign the transaction
-                signed_txn = web3.eth.account.sign_transaction(txn, private_key=WALLET_PRIVATE_KEY)
-
-                # Send the transaction
-                tx_hash = send_transaction(signed_txn)
+                # Fill in the amounts and the cached fees
+                txn = buy_engine.build(template, amount_out_min, deadline)
+
+                # Sign the transaction with a locally allocated nonce and send it
+                tx_hash = sign_and_send(txn)
+                sent = time.time()
+                logging.info(f"Buy sent {(sent - signal_time) * 1000:.0f} ms after the signal "
+                             f"(checks: {(checks_done - signal_time) * 1000:.0f} ms, price: {(price_done - attempt_start) * 1000:.0f} ms, "
+                             f"build, sign and send: {(sent - price_done) * 1000:.0f} ms, attempt {retry_count + 1}). "
+                             f"Max fee: {web3.from_wei(txn['maxFeePerGas'], 'gwei')} GWEI, Priority Fee: {web3.from_wei(txn['maxPriorityFeePerGas'], 'gwei')} GWEI, Gas limit: {txn['gas']}")
                 log_transaction({
                         "post_hash": trans_hash,
                         "buy": "YES",
@@ -194,6 +185,9 @@ def buy_token(token_address, amount_eth, trans_hash, decimals):
                     })
                 logging.info(f"TRANSACTION SENT WITH HASH: {tx_hash.hex()}")
 
+                # Depending on APPROVAL_STRATEGY, approve the sell while the buy is being mined
+                approve_after_buy(token_address)
+
                 # Wait for the transaction to be mined and check final token balance
                 tokens_received = get_swap_amount(tx_hash, token_address)
                 if tokens_received is None:
@@ -207,7 +201,6 @@ def buy_token(token_address, amount_eth, trans_hash, decimals):
                 retry_count += 1
                 logging.error(f"Buy transaction failed on attempt {retry_count}. Error: {e}")
                 logging.debug(f"Detailed transaction object: {txn}")
-                logging.debug(f"Transaction data: {signed_txn.rawTransaction.hex()}")
 
                 # Wait before retrying based on retry_count
                 if retry_count < max_retries:
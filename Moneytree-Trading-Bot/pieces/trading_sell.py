@@ -6,10 +6,12 @@ import time
 from datetime import datetime, timedelta, timezone
 from web3 import Web3
 from pieces.trading_utils import (
-    send_transaction
+    sign_and_send
 )
 from pieces.statistics import log_transaction
-from pieces.uniswap import get_approval_amount, get_swap_amount
+from pieces.uniswap import get_receipt_amount, receipt_tracker, resolve_pools, multicall, RECEIPT_TIMEOUT
+from pieces.sell_router import SellRouter
+from pieces.trading_approve import ensure_allowance, spend_allowance, forget_allowance
 
 # Get the absolute path of the parent directory
 parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -75,6 +77,35 @@ uniswap_v3_factory = web3.eth.contract(address=Web3.to_checksum_address('0x1F984
 # Constants
 WETH_ADDRESS = Web3.to_checksum_address('0xC02aaA39b223FE8D0A0E5C4F27eAD9083C756Cc2')
 
+# Slippage bound of sells, defaults to the one of buys
+SELL_SLIPPAGE_TOLERANCE = config.get('SELL_SLIPPAGE_TOLERANCE', SLIPPAGE_TOLERANCE)
+
+# Quotes V2 and V3 and splits sells between them
+sell_router = SellRouter(web3, multicall, uniswap_v2_router, uniswap_v3_router, WETH_ADDRESS, SELL_SLIPPAGE_TOLERANCE)
+
+def build_sell_transaction(swap_function):
+    txn = swap_function.build_transaction({
+        'from': WALLET_ADDRESS,
+    })
+
+    # Handle gas limit and fees for sell transaction
+    if not config['ENABLE_AUTOMATIC_FEES']:
+        # Estimate gas limit
+        gas_limit = web3.eth.estimate_gas(txn)
+        txn['gas'] = gas_limit
+        logging.info(f"Estimated gas limit: {gas_limit}")
+
+        # Manual fee setting based on multipliers
+        base_fee = int(web3.eth.get_block('latest')['baseFeePerGas'] * BASE_FEE_MULTIPLIER)
+        priority_fee = int(web3.eth.max_priority_fee * PRIORITY_FEE_MULTIPLIER)
+        total_fee = int((base_fee + priority_fee) * TOTAL_FEE_MULTIPLIER)
+
+        txn['maxFeePerGas'] = total_fee
+        txn['maxPriorityFeePerGas'] = priority_fee
+
+        logging.info(f"Manual fees applied: Total Fee: {web3.from_wei(total_fee, 'gwei')} GWEI, Priority Fee: {web3.from_wei(priority_fee, 'gwei')} GWEI")
+    return txn
+
 def sell_token(token_address, token_amount, trans_hash, use_moonbag=False):
     max_retries = 30  # Maximum number of retries
     retry_count = 0  # Track the number of retries
@@ -85,6 +116,17 @@ def sell_token(token_address, token_amount, trans_hash, use_moonbag=False):
     # Flag to check if it's the first attempt
     first_attempt = True
 
+    # Tokens taking a fee on transfer break the normal swap with 'UniswapV2: K'
+    fee_on_transfer = False
+
+    # Legs sent and not yet mined, a split sell may be sent in several attempts
+    sent = []
+
+    # Mined legs that sold their tokens
+    tx_hashes = []
+    receipts = []
+    unmined = []
+
     while retry_count < max_retries:
         try:
             if first_attempt:
@@ -105,6 +147,7 @@ def sell_token(token_address, token_amount, trans_hash, use_moonbag=False):
             # Convert token amount to smallest unit
             if first_attempt:
                 amount_in_smallest_unit = int(token_amount)  # Assuming token_amount is already in smallest unit format
+                amount_remaining = amount_in_smallest_unit
                 logging.debug(f"Token amount in smallest unit: {amount_in_smallest_unit}")
 
             # Get the token contract
@@ -115,50 +158,17 @@ def sell_token(token_address, token_amount, trans_hash, use_moonbag=False):
             wallet_balance = token_contract.functions.balanceOf(WALLET_ADDRESS).call()
             logging.info(f"Wallet token balance: {wallet_balance} tokens")
 
-            if wallet_balance < amount_in_smallest_unit:
-                raise Exception(f"Insufficient token balance. Available: {wallet_balance}, Required: {amount_in_smallest_unit}")
-
-            # Check current allowance
-            allowance = token_contract.functions.allowance(WALLET_ADDRESS, UNISWAP_V2_ROUTER_ADDRESS).call()
-            logging.info(f"Current token allowance: {allowance} tokens")
-
-            if allowance < amount_in_smallest_unit:
-                logging.info(f"Approving Uniswap router to spend {amount_in_smallest_unit} tokens")
-                approve_txn = token_contract.functions.approve(
-                    UNISWAP_V2_ROUTER_ADDRESS,
-                    amount_in_smallest_unit
-                ).build_transaction({
-                    'from': WALLET_ADDRESS,
-                    'nonce': web3.eth.get_transaction_count(WALLET_ADDRESS),
-                })
-
-                # Handle gas limit and fees for approval transaction
-                if config['ENABLE_AUTOMATIC_FEES']:
-                    logging.info(f"Automatic fees are enabled, not specifying gas limits or fees.")
-                else:
-                    # Estimate gas limit for approval
-                    approve_gas_limit = web3.eth.estimate_gas(approve_txn)
-                    approve_txn['gas'] = approve_gas_limit
-                    logging.info(f"Estimated gas limit for approval: {approve_gas_limit}")
-
-                    # Manual fee setting based on multipliers
-                    base_fee = int(web3.eth.get_block('latest')['baseFeePerGas'] * BASE_FEE_MULTIPLIER)
-                    priority_fee = int(web3.eth.max_priority_fee * PRIORITY_FEE_MULTIPLIER)
-                    total_fee = int((base_fee + priority_fee) * TOTAL_FEE_MULTIPLIER)
+            if wallet_balance < amount_remaining:
+                raise Exception(f"Insufficient token balance. Available: {wallet_balance}, Required: {amount_remaining}")
 
-                    approve_txn['maxFeePerGas'] = total_fee
-                    approve_txn['maxPriorityFeePerGas'] = priority_fee
+            # Quote V2 and V3 and pick the best route, possibly split over two venues
+            pair_address, pools = resolve_pools(token_address)
+            legs = sell_router.route(token_address, amount_remaining, pair_address, pools, fee_on_transfer=fee_on_transfer)
+            logging.info(f"Sell route: {legs}")
 
-                    logging.info(f"Manual fees applied for approval: Total Fee: {web3.from_wei(total_fee, 'gwei')} GWEI, Priority Fee: {web3.from_wei(priority_fee, 'gwei')} GWEI")
-
-                # Sign and send the approval transaction
-                signed_approve_txn = web3.eth.account.sign_transaction(approve_txn, private_key=WALLET_PRIVATE_KEY)
-                approve_tx_hash = send_transaction(signed_approve_txn)
-                logging.info(f"APPROVE TRANSACTION SENT WITH HASH: {approve_tx_hash.hex()}")
-
-                # Wait for the approval to be confirmed and check allowance again
-                approved_amount = get_approval_amount(approve_tx_hash)
-                if approved_amount is None or approved_amount < amount_in_smallest_unit:
+            # Make sure the routers may spend the tokens, usually known from the allowance cache
+            for spender in {sell_router.spender(leg) for leg in legs}:
+                if not ensure_allowance(token_contract, sum(leg['amount_in'] for leg in legs if sell_router.spender(leg) == spender), spender):
                     logging.error("Token approval failed or took too long.")
                     log_transaction({
                         "post_hash": trans_hash,
@@ -167,105 +177,53 @@ def sell_token(token_address, token_amount, trans_hash, use_moonbag=False):
                         "profit_loss": ""
                     })
                     return None, None
-
-            # Add a delay only if it's the first attempt
-            if first_attempt:
-                logging.info("Waiting 5 seconds after approval...")
-                time.sleep(5)
-                first_attempt = False
+            first_attempt = False
 
             # Define the transaction parameters
             deadline = int((datetime.now(timezone.utc) + timedelta(minutes=10)).timestamp())
-            amount_out_min = 0  # Set slippage tolerance here if needed
-
-            # Attempt normal sell transaction
-            txn = uniswap_v2_router.functions.swapExactTokensForETH(
-                amount_in_smallest_unit,
-                amount_out_min,
-                [token_address, WETH_ADDRESS],
-                Web3.to_checksum_address(WALLET_ADDRESS),
-                deadline
-            ).build_transaction({
-                'from': WALLET_ADDRESS,
-                'nonce': web3.eth.get_transaction_count(WALLET_ADDRESS),
-            })
-
-            logging.info("Normal sell transaction built successfully.")
-
-            # Handle gas limit and fees for sell transaction
-            if config['ENABLE_AUTOMATIC_FEES']:
-                logging.info(f"Automatic fees are enabled, not specifying gas limits or fees.")
-            else:
-                # Estimate gas limit
-                gas_limit = web3.eth.estimate_gas(txn)
-                txn['gas'] = gas_limit
-                logging.info(f"Estimated gas limit: {gas_limit}")
-
-                # Manual fee setting based on multipliers
-                base_fee = int(web3.eth.get_block('latest')['baseFeePerGas'] * BASE_FEE_MULTIPLIER)
-                priority_fee = int(web3.eth.max_priority_fee * PRIORITY_FEE_MULTIPLIER)
-                total_fee = int((base_fee + priority_fee) * TOTAL_FEE_MULTIPLIER)
-
-                txn['maxFeePerGas'] = total_fee
-                txn['maxPriorityFeePerGas'] = priority_fee
-
-                logging.info(f"Manual fees applied: Total Fee: {web3.from_wei(total_fee, 'gwei')} GWEI, Priority Fee: {web3.from_wei(priority_fee, 'gwei')} GWEI")
-
-            # Sign and send the transaction
-            signed_txn = web3.eth.account.sign_transaction(txn, private_key=WALLET_PRIVATE_KEY)
-            tx_hash = send_transaction(signed_txn)
-            logging.info(f"SELL TRANSACTION SENT WITH HASH: {tx_hash.hex()}")
+
+            # Build every leg first, then send them back to back
+            transactions = [
+                (leg, build_sell_transaction(sell_router.swap_function(token_address, leg, WALLET_ADDRESS, deadline, fee_on_transfer=fee_on_transfer)))
+                for leg in legs
+            ]
+            for leg, txn in transactions:
+                tx_hash = sign_and_send(txn)
+                sent.append((leg, tx_hash))
+                amount_remaining -= leg['amount_in']
+                spend_allowance(token_address, leg['amount_in'], sell_router.spender(leg))
+                logging.info(f"SELL TRANSACTION SENT WITH HASH: {tx_hash.hex()} ({leg['amount_in']} tokens on {leg['venue']}, minimum output {leg['amount_out_min']})")
+
+            # Wait for the legs to be mined, the tokens of a reverted leg are still ours and are routed again
+            for leg, tx_hash in sent:
+                receipt = receipt_tracker.wait(tx_hash, timeout=RECEIPT_TIMEOUT)
+                if receipt is None:
+                    logging.error(f"Sell transaction {tx_hash.hex()} not mined after {RECEIPT_TIMEOUT} seconds.")
+                    unmined.append(tx_hash)
+                elif receipt['status'] == 1:
+                    tx_hashes.append(tx_hash)
+                    receipts.append(receipt)
+                else:
+                    logging.warning(f"Sell transaction {tx_hash.hex()} on {leg['venue']} reverted, {leg['amount_in']} tokens left to sell.")
+                    amount_remaining += leg['amount_in']
+            sent = []
+            if unmined:
+                break  # Whether they sold is unknown, so nothing is sent again
+            if amount_remaining > 0:
+                raise Exception(f"Sell reverted, {amount_remaining} tokens left to sell.")
             break  # Exit retry loop on success
 
         except Exception as e:
             logging.error(f"Sell transaction failed on attempt {retry_count + 1}. Error: {e}")
+            if not first_attempt:
+                for spender in (UNISWAP_V2_ROUTER_ADDRESS, UNISWAP_V3_ROUTER_ADDRESS):
+                    forget_allowance(token_address, spender)
 
-            # Check if error is 'UniswapV2: K'
-            if 'UniswapV2: K' in str(e):
-                logging.warning("UniswapV2: K error occurred, attempting fallback sell.")
-
-                try:
-                    # Attempt fallback sell transaction
-                    txn = uniswap_v2_router.functions.swapExactTokensForETHSupportingFeeOnTransferTokens(
-                        amount_in_smallest_unit,
-                        amount_out_min,
-                        [token_address, WETH_ADDRESS],
-                        WALLET_ADDRESS,
-                        deadline
-                    ).build_transaction({
-                        'from': WALLET_ADDRESS,
-                        'nonce': web3.eth.get_transaction_count(WALLET_ADDRESS),
-                    })
-
-                    logging.info("Fallback sell transaction built successfully.")
-
-                    # Handle gas limit and fees for fallback sell transaction
-                    if config['ENABLE_AUTOMATIC_FEES']:
-                        logging.info(f"Automatic fees are enabled, not specifying gas limits or fees.")
-                    else:
-                        # Estimate gas limit
-                        gas_limit = web3.eth.estimate_gas(txn)
-                        txn['gas'] = gas_limit
-                        logging.info(f"Estimated gas limit: {gas_limit}")
-
-                        # Manual fee setting based on multipliers
-                        base_fee = int(web3.eth.get_block('latest')['baseFeePerGas'] * BASE_FEE_MULTIPLIER)
-                        priority_fee = int(web3.eth.max_priority_fee * PRIORITY_FEE_MULTIPLIER)
-                        total_fee = int((base_fee + priority_fee) * TOTAL_FEE_MULTIPLIER)
-
-                        txn['maxFeePerGas'] = total_fee
-                        txn['maxPriorityFeePerGas'] = priority_fee
-
-                        logging.info(f"Manual fees applied: Total Fee: {web3.from_wei(total_fee, 'gwei')} GWEI, Priority Fee: {web3.from_wei(priority_fee, 'gwei')} GWEI")
-
-                    # Sign and send the fallback transaction
-                    signed_txn = web3.eth.account.sign_transaction(txn, private_key=WALLET_PRIVATE_KEY)
-                    tx_hash = send_transaction(signed_txn)
-                    logging.info(f"FALLBACK SELL TRANSACTION SENT WITH HASH: {tx_hash.hex()}")
-                    break  # Exit retry loop on fallback success
-
-                except Exception as fallback_e:
-                    logging.error(f"Fallback sell transaction failed. Error: {fallback_e}")
+            # 'UniswapV2: K' (or 'IIA' from a V3 pool) means the token takes a fee on transfer
+            if ('UniswapV2: K' in str(e) or 'IIA' in str(e)) and not fee_on_transfer:
+                logging.warning("Fee-on-transfer token detected, retrying with the fee-on-transfer sell.")
+                fee_on_transfer = True
+                continue
 
             # Increment retry count and delay before retrying
             retry_count += 1
@@ -284,8 +242,9 @@ def sell_token(token_address, token_amount, trans_hash, use_moonbag=False):
                 })
                 return None, None
 
-    # Wait for the transaction to be mined and check final ETH balance
-    received_eth = get_swap_amount(tx_hash, WETH_ADDRESS)
+    # Add up the ETH the mined legs received
+    swap_amounts = [get_receipt_amount(receipt, WETH_ADDRESS) for receipt in receipts]
+    received_eth = None if unmined else sum(amount for amount in swap_amounts if isinstance(amount, int))
     logging.info(f"Final ETH Balance: {received_eth} ETH")
     if received_eth is None:
         logging.error("Failed to detect received ETH after sell.")
@@ -310,12 +269,12 @@ def sell_token(token_address, token_amount, trans_hash, use_moonbag=False):
         logging.error(f"Failed to calculate profit/loss: {e}")
         profit_loss = "0"
 
-    # Log the transaction
+    # Log the transaction, a split sell is recorded under its first leg
     log_transaction({
         "post_hash": trans_hash,
         "sell": "YES",
-        "sell_tx": tx_hash.hex(),
+        "sell_tx": tx_hashes[0].hex(),
         "profit_loss": f"{profit_loss:.18f}"
     })
 
-    return tx_hash.hex(), profit_loss
+    return tx_hashes[0].hex(), profit_loss
@@ -3,8 +3,12 @@ import os
 import yaml
 import json
 import time
+import threading
 from web3 import Web3
+from web3.exceptions import TransactionNotFound
 from pieces.dexanalyzer_scraper import scrape_dexanalyzer
+from pieces.nonce_manager import NonceManager
+from pieces.scam_checker import ScamChecker
 
 # Get the absolute path of the parent directory
 parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
@@ -38,6 +42,23 @@ TOTAL_FEE_MULTIPLIER = config['TOTAL_FEE_MULTIPLIER']
 # Slippage
 SLIPPAGE_TOLERANCE = config['SLIPPAGE_TOLERANCE']
 
+# Stuck transactions are re-sent with fees raised by this factor (nodes require at least 10%)
+STUCK_TRANSACTION_SECONDS = config.get('STUCK_TRANSACTION_SECONDS', 180)
+REPLACEMENT_FEE_BUMP = max(config.get('REPLACEMENT_FEE_BUMP', 1.125), 1.1)
+
+# A nonce allocated but not sent within this time, below a sent transaction, is filled with a self-transfer
+NONCE_GAP_SECONDS = config.get('NONCE_GAP_SECONDS', 60)
+
+# Nonces are handed out locally, shared by all position workers
+nonce_directory = os.path.join(parent_directory, 'logs/mtdb')
+os.makedirs(nonce_directory, exist_ok=True)
+nonce_manager = NonceManager(web3, WALLET_ADDRESS, os.path.join(nonce_directory, 'nonces.json'))
+
+# Scam verdicts are cached per token and have a deadline, after which the default verdict applies
+SCAM_CHECK_TTL = config.get('SCAM_CHECK_TTL', 900)
+SCAM_CHECK_DEADLINE = config.get('SCAM_CHECK_DEADLINE', 120)
+SCAM_CHECK_DEFAULT_VERDICT = config.get('SCAM_CHECK_DEFAULT_VERDICT', 'scam')
+
 # Uniswap Router address
 UNISWAP_V2_ROUTER_ADDRESS = Web3.to_checksum_address('0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D')  # Uniswap V2 Router
 UNISWAP_V3_ROUTER_ADDRESS = Web3.to_checksum_address('0xE592427A0AEce92De3Edee1F18E0157C05861564')  # Uniswap V3 Router
@@ -67,12 +88,29 @@ uniswap_v3_factory = web3.eth.contract(address=Web3.to_checksum_address('0x1F984
 # Constants
 WETH_ADDRESS = Web3.to_checksum_address('0xC02aaA39b223FE8D0A0E5C4F27eAD9083C756Cc2')
 
-def retry_scam_check(token_address, retries=30, delay_seconds=10):
+def retry_scam_check(token_address, retries=30, delay_seconds=10, deadline=None):
+    """
+    Returns (scam_detected, reason). When the deadline cuts the retries short, the last verdict
+    DexAnalyzer gave stands. Returns None only when no page loaded at all; then no verdict is
+    cached and the default verdict applies.
+    """
+    scam_reason = None
     for attempt in range(retries):
         # Get both the scam detection status and the scam reason from scrape_dexanalyzer
-        scam_detected, scam_reason = scrape_dexanalyzer(token_address)
+        result = scrape_dexanalyzer(token_address, deadline=deadline)
+        if result is None:
+            if scam_reason is not None:
+                logging.warning(f"x No page from DexAnalyzer on retry for token {token_address}. Keeping the last reason: {scam_reason}")
+                return True, scam_reason
+            logging.warning(f"x No anti-scam verdict from DexAnalyzer for token {token_address}.")
+            return None
+        scam_detected, scam_reason = result
         
         if scam_detected:
+            if deadline is not None and time.time() + delay_seconds >= deadline:
+                # No time left to retry, the last real verdict stands
+                logging.warning(f"x SCAM detected for token {token_address}, deadline reached after {attempt + 1} attempts. Skipping the buy. Reason: {scam_reason}")
+                return True, scam_reason
             logging.warning(f"x SCAM detected for token {token_address}. Reason: {scam_reason}. Retrying ({attempt + 1}/{retries}) in {delay_seconds} seconds.")
             time.sleep(delay_seconds)
         else:
@@ -80,9 +118,18 @@ def retry_scam_check(token_address, retries=30, delay_seconds=10):
             return False, ""  # No scam detected, return False and no reason
     
     # If scam detected after all retries, return True and the final reason
-    logging.warning(f"x SCAM detected for token {token_address} after {retries} retries. Skipping the buy. Final reason: {scam_reason}")
+    logging.warning(f"x SCAM detected for token {token_address} after {attempt + 1} attempts. Skipping the buy. Final reason: {scam_reason}")
     return True, scam_reason  # Scam detected after all retries
 
+# Started when a signal arrives, read by the buy
+scam_checker = ScamChecker(
+    retry_scam_check,
+    os.path.join(nonce_directory, 'scam_verdicts.json'),
+    ttl=SCAM_CHECK_TTL,
+    deadline=SCAM_CHECK_DEADLINE,
+    default_verdict=(True, "Scam check deadline passed.") if SCAM_CHECK_DEFAULT_VERDICT == 'scam' else (False, "")
+)
+
 def calculate_token_amount(eth_amount, token_price):
     logging.debug(f"Calculating token amount: ETH amount={eth_amount}, Token price={token_price}")
     return eth_amount / token_price
@@ -95,6 +142,90 @@ def check_eth_balance():
         logging.error(f"Error checking ETH balance: {e}")
         return None
 
-def send_transaction(signed_txn):
-    tx_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+def sign_and_send(txn, nonce=None):
+    """
+    Signs the transaction with a nonce from the nonce manager (or the given one, to replace a
+    pending transaction) and sends it. Returns the transaction hash.
+    """
+    txn = dict(txn)
+    txn['nonce'] = nonce_manager.allocate() if nonce is None else nonce
+    signed_txn = web3.eth.account.sign_transaction(txn, private_key=WALLET_PRIVATE_KEY)
+    try:
+        tx_hash = web3.eth.send_raw_transaction(signed_txn.rawTransaction)
+    except Exception as send_error:
+        # The send can fail after the node accepted the transaction (a timeout), so ask the node
+        try:
+            web3.eth.get_transaction(signed_txn.hash)
+        except TransactionNotFound:
+            # The nonce was not used, let the next transaction have it
+            nonce_manager.release(txn['nonce'])
+            raise send_error
+        except Exception:
+            # Unknown, the nonce stays allocated and is filled if it ends up as a gap
+            raise send_error
+        logging.warning(f"Sending transaction with nonce {txn['nonce']} raised '{send_error}', but the node has it: {signed_txn.hash.hex()}")
+        tx_hash = signed_txn.hash
+    nonce_manager.record(txn['nonce'], tx_hash.hex(), txn)
     return tx_hash
+
+def replace_transaction(nonce, cancel=False):
+    """
+    Re-sends the pending transaction with this nonce with fees raised by REPLACEMENT_FEE_BUMP.
+    With cancel, a zero-value transfer to the wallet itself is sent in its place instead.
+    Returns the hash of the replacement.
+    """
+    entry = nonce_manager.pending().get(nonce)
+    if entry is None:
+        raise Exception(f"No pending transaction with nonce {nonce}.")
+    txn = dict(entry['tx'])
+    if cancel:
+        txn = {'from': WALLET_ADDRESS, 'to': WALLET_ADDRESS, 'value': 0, 'gas': 21000, 'chainId': txn['chainId'],
+               'maxFeePerGas': txn['maxFeePerGas'], 'maxPriorityFeePerGas': txn['maxPriorityFeePerGas']}
+
+    # Outbid both the stuck transaction and the current market
+    base_fee = web3.eth.get_block('latest')['baseFeePerGas']
+    priority_fee = max(int(txn['maxPriorityFeePerGas'] * REPLACEMENT_FEE_BUMP), web3.eth.max_priority_fee)
+    txn['maxPriorityFeePerGas'] = priority_fee
+    txn['maxFeePerGas'] = max(int(txn['maxFeePerGas'] * REPLACEMENT_FEE_BUMP), 2 * base_fee + priority_fee)
+
+    tx_hash = sign_and_send(txn, nonce=nonce)
+    logging.info(f"{'Cancelled' if cancel else 'Replaced'} transaction {entry['tx_hash']} (nonce {nonce}) with {tx_hash.hex()}. "
+                 f"Max fee: {web3.from_wei(txn['maxFeePerGas'], 'gwei')} GWEI, Priority Fee: {web3.from_wei(priority_fee, 'gwei')} GWEI")
+    return tx_hash
+
+def replace_stuck_transactions(max_age=STUCK_TRANSACTION_SECONDS):
+    """
+    Bumps the fees of every transaction that has been pending for more than max_age seconds.
+    """
+    for nonce, entry in sorted(nonce_manager.stuck(max_age).items()):
+        try:
+            replace_transaction(nonce)
+        except Exception as e:
+            logging.error(f"Failed to replace stuck transaction {entry['tx_hash']} (nonce {nonce}): {e}")
+
+def fill_nonce_gaps(allocation_timeout=NONCE_GAP_SECONDS):
+    """
+    Sends a zero-value transfer to the wallet itself for every unused nonce below a pending
+    transaction, which would otherwise never be mined.
+    """
+    for nonce in nonce_manager.gaps(allocation_timeout):
+        base_fee = web3.eth.get_block('latest')['baseFeePerGas']
+        priority_fee = web3.eth.max_priority_fee
+        txn = {'from': WALLET_ADDRESS, 'to': WALLET_ADDRESS, 'value': 0, 'gas': 21000, 'chainId': web3.eth.chain_id,
+               'maxFeePerGas': 2 * base_fee + priority_fee, 'maxPriorityFeePerGas': priority_fee}
+        try:
+            tx_hash = sign_and_send(txn, nonce=nonce)
+            logging.info(f"Filled nonce gap {nonce} with self-transfer {tx_hash.hex()}.")
+        except Exception as e:
+            logging.error(f"Failed to fill nonce gap {nonce}: {e}")
+
+def start_stuck_transaction_watcher(interval=30):
+    def watch():
+        while True:
+            time.sleep(interval)
+            try:
+                fill_nonce_gaps()
+                replace_stuck_transactions()
+            except Exception as e:
+                logging.error(f"Error checking for stuck transactions: {e}")
+    threading.Thread(target=watch, name='stuck-transactions', daemon=True).start()
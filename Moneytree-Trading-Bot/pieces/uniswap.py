@@ -3,8 +3,12 @@ from web3 import Web3
 import os
 import json
 import yaml
-from web3.exceptions import TransactionNotFound
-import time
+from functools import lru_cache
+from pieces.token_cache import token_cache
+from pieces.multicall import Multicall
+from pieces.eth_price_oracle import EthPriceOracle
+from pieces.pool_cache import pool_cache
+from pieces.receipt_tracker import ReceiptTracker
 
 
 # Get the absolute path of the parent directory
@@ -45,60 +49,191 @@ with open('abis/IUniswapV3Factory.json') as file:
 with open('abis/IUniswapV3Pool.json') as file:
     uniswap_v3_pool_abi = json.load(file)
 
-chainlink_price_feed_abi = json.loads('[{"inputs":[],"name":"latestRoundData","outputs":[{"internalType":"uint80","name":"roundId","type":"uint80"},{"internalType":"int256","name":"answer","type":"int256"},{"internalType":"uint256","name":"startedAt","type":"uint256"},{"internalType":"uint256","name":"updatedAt","type":"uint256"},{"internalType":"uint80","name":"answeredInRound","type":"uint80"}],"stateMutability":"view","type":"function"}]')
 
 # Create contract instances
 uniswap_v2_factory = web3.eth.contract(address=Web3.to_checksum_address(UNISWAP_V2_FACTORY_ADDRESS), abi=uniswap_v2_factory_abi)
 uniswap_v3_factory = web3.eth.contract(address=Web3.to_checksum_address(UNISWAP_V3_FACTORY_ADDRESS), abi=uniswap_v3_factory_abi)
-chainlink_price_feed = web3.eth.contract(address=Web3.to_checksum_address(CHAINLINK_ETH_USD_FEED), abi=chainlink_price_feed_abi)
+
+# Batched reads, see pieces/multicall.py
+multicall = Multicall(web3)
+
+# Cached Chainlink ETH/USD price, refreshed in the background
+eth_price_oracle = EthPriceOracle(web3, CHAINLINK_ETH_USD_FEED, refresh_interval=config.get('ETH_PRICE_REFRESH_INTERVAL', 12))
+
+# Waits for the receipts of all in-flight transactions with one block watcher
+receipt_tracker = ReceiptTracker(web3)
+# Outlasts the stuck transaction watcher, which replaces a transaction after STUCK_TRANSACTION_SECONDS
+RECEIPT_TIMEOUT = config.get('RECEIPT_TIMEOUT', 3 * config.get('STUCK_TRANSACTION_SECONDS', 180))
+
+ZERO_ADDRESS = '0x0000000000000000000000000000000000000000'
+UNISWAP_V3_FEE_TIERS = [500, 3000, 10000]
+
+# Pool events that carry the new price
+SYNC_TOPIC = Web3.to_hex(Web3.keccak(text='Sync(uint112,uint112)'))
+UNISWAP_V3_SWAP_TOPIC = Web3.to_hex(Web3.keccak(text='Swap(address,address,int256,int256,uint160,uint128,int24)'))
+
+# Token events read from receipts
+TRANSFER_TOPIC = Web3.to_hex(Web3.keccak(text='Transfer(address,address,uint256)'))
+APPROVAL_TOPIC = Web3.to_hex(Web3.keccak(text='Approval(address,address,uint256)'))
 
 def get_eth_price_in_usd():
-    latest_round_data = chainlink_price_feed.functions.latestRoundData().call()
-    eth_price_in_usd = latest_round_data[1] / 1e8  # Chainlink prices have 8 decimals
-    logging.info(f"ETH price in USD: {eth_price_in_usd}")
+    eth_price_in_usd = eth_price_oracle.get_price()
+    if eth_price_in_usd is not None:
+        logging.info(f"ETH price in USD: {eth_price_in_usd} (updated {eth_price_oracle.age():.0f} seconds ago)")
     return eth_price_in_usd
 
-def get_token_details(token_address):
+def fetch_token_metadata(token_address):
     token_contract = web3.eth.contract(address=Web3.to_checksum_address(token_address), abi=uniswap_v2_erc20_abi)
     name = token_contract.functions.name().call()
     symbol = token_contract.functions.symbol().call()
     decimals = token_contract.functions.decimals().call()
-    total_supply = token_contract.functions.totalSupply().call() / (10 ** decimals)
+    return name, symbol, decimals
+
+def fetch_token_total_supply(token_address):
+    token_contract = web3.eth.contract(address=Web3.to_checksum_address(token_address), abi=uniswap_v2_erc20_abi)
+    return token_contract.functions.totalSupply().call()
+
+def get_token_details(token_address):
+    name, symbol, decimals, total_supply_raw = token_cache.get(token_address, fetch_token_metadata, fetch_token_total_supply)
+    total_supply = total_supply_raw / (10 ** decimals)
     logging.info(f"Token details - Name: {name}, Symbol: {symbol}, Decimals: {decimals}, Total Supply: {total_supply}")
     return name, symbol, decimals, total_supply
 
-def get_uniswap_v2_price(token_address, token_decimals):
-    try:
-        # Fetch pair address from Uniswap V2 Factory contract
-        pair_address = uniswap_v2_factory.functions.getPair(Web3.to_checksum_address(token_address), Web3.to_checksum_address(WETH_ADDRESS)).call()
+def get_token_decimals(token_address):
+    name, symbol, decimals = token_cache.get_metadata(token_address, fetch_token_metadata)
+    logging.info(f"Token decimals for {Web3.to_checksum_address(token_address)}: {decimals}")
+    return decimals
 
-        if pair_address == '0x0000000000000000000000000000000000000000':
-            logging.warning(f"Uniswap V2 pair not found for token {token_address} and WETH.")
-            return None, None
+def find_pools(token_address, extra_calls=(), block_identifier='latest'):
+    """
+    Looks up the Uniswap V2 pair and the V3 pools of the token against WETH in one batched call,
+    together with any extra calls. Returns (block_number, pair_address, pools, extra_results)
+    where pools lists (fee, pool_address) for the fee tiers that have a pool.
+    """
+    token = Web3.to_checksum_address(token_address)
+    weth = Web3.to_checksum_address(WETH_ADDRESS)
+    calls = [(uniswap_v2_factory, 'getPair', [token, weth])]
+    calls += [(uniswap_v3_factory, 'getPool', [token, weth, fee]) for fee in UNISWAP_V3_FEE_TIERS]
+    block_number, results = multicall.call(calls + list(extra_calls), block_identifier)
+
+    pair_address = Web3.to_checksum_address(results[0]) if results[0] not in (None, ZERO_ADDRESS) else None
+    pools = [
+        (fee, Web3.to_checksum_address(pool_address))
+        for fee, pool_address in zip(UNISWAP_V3_FEE_TIERS, results[1:1 + len(UNISWAP_V3_FEE_TIERS)])
+        if pool_address not in (None, ZERO_ADDRESS)
+    ]
+    return block_number, pair_address, pools, results[1 + len(UNISWAP_V3_FEE_TIERS):]
 
-        # Create pair contract instance
-        pair_contract = web3.eth.contract(address=Web3.to_checksum_address(pair_address), abi=uniswap_v2_pair_abi)
+@lru_cache(maxsize=1024)
+def get_pair_contract(pair_address):
+    return web3.eth.contract(address=pair_address, abi=uniswap_v2_pair_abi)
 
-        # Fetch reserves from the pair contract
-        reserves = pair_contract.functions.getReserves().call()
+@lru_cache(maxsize=1024)
+def get_pool_contract(pool_address):
+    return web3.eth.contract(address=pool_address, abi=uniswap_v3_pool_abi)
+
+def pool_state_calls(pair_address, pools):
+    calls = []
+    if pair_address:
+        calls.append((get_pair_contract(pair_address), 'getReserves', []))
+    for fee, pool_address in pools:
+        calls.append((get_pool_contract(pool_address), 'slot0', []))
+    return calls
+
+def split_pool_states(pair_address, pools, results):
+    """
+    Splits the results of pool_state_calls (and whatever followed them) into
+    (reserves, pool_states, remaining_results) where pool_states lists (fee, pool_address, slot0).
+    """
+    offset = 1 if pair_address else 0
+    reserves = results[0] if pair_address else None
+    pool_states = [(fee, pool_address, slot0) for (fee, pool_address), slot0 in zip(pools, results[offset:])]
+    return reserves, pool_states, results[offset + len(pools):]
+
+def read_pool_states(pair_address, pools, block_identifier='latest', extra_calls=()):
+    """
+    Reads the V2 reserves and the V3 slot0 of the given pools (plus any extra calls) in one
+    batched call pinned to block_identifier. Returns (block_number, reserves, pool_states, extra_results)
+    where pool_states lists (fee, pool_address, slot0).
+    """
+    block_number, results = multicall.call(pool_state_calls(pair_address, pools) + list(extra_calls), block_identifier)
+    reserves, pool_states, extra_results = split_pool_states(pair_address, pools, results)
+    return block_number, reserves, pool_states, extra_results
+
+def resolve_pools(token_address):
+    """
+    Returns (pair_address, pools) of the token from pool_cache, looking them up on a miss.
+    """
+    resolved = pool_cache.get(token_address, UNISWAP_V3_FEE_TIERS)
+    if resolved is None:
+        _, pair_address, pools, _ = find_pools(token_address)
+        pool_cache.store(token_address, pair_address, pools, UNISWAP_V3_FEE_TIERS)
+        resolved = pair_address, pools
+    return resolved
+
+def read_pools(token_address, extra_calls=()):
+    """
+    Reads the pool states of the token (plus any extra calls) at a single block. The pair and pool
+    addresses come from pool_cache, so this is one batched call once the token has been resolved
+    and two the first time. Returns (block_number, pair_address, reserves, pool_states, extra_results).
+    """
+    resolved = pool_cache.get(token_address, UNISWAP_V3_FEE_TIERS)
+    if resolved is not None:
+        pair_address, pools = resolved
+        block_number, reserves, pool_states, extra_results = read_pool_states(pair_address, pools, extra_calls=extra_calls)
+        return block_number, pair_address, reserves, pool_states, extra_results
+
+    block_number, pair_address, pools, extra_results = find_pools(token_address, extra_calls=extra_calls)
+    pool_cache.store(token_address, pair_address, pools, UNISWAP_V3_FEE_TIERS)
+    _, reserves, pool_states, _ = read_pool_states(pair_address, pools, block_number)
+    return block_number, pair_address, reserves, pool_states, extra_results
+
+def compute_uniswap_v2_price(token_address, token_decimals, reserves):
+    if reserves is None:
+        logging.warning(f"Could not read Uniswap V2 reserves for token {token_address} and WETH.")
+        return None
+
+    # Determine which reserve is for WETH and which is for the token
+    if Web3.to_checksum_address(token_address) < Web3.to_checksum_address(WETH_ADDRESS):
+        reserve_token, reserve_weth = reserves[0], reserves[1]
+    else:
         reserve_weth, reserve_token = reserves[0], reserves[1]
 
-        # Determine which reserve is for WETH and which is for the token
-        if Web3.to_checksum_address(token_address) < Web3.to_checksum_address(WETH_ADDRESS):
-            reserve_token, reserve_weth = reserves[0], reserves[1]
-        else:
-            reserve_weth, reserve_token = reserves[0], reserves[1]
+    # Adjust reserves
+    adjusted_reserve_token = reserve_token / (10 ** token_decimals)
+    adjusted_reserve_weth = reserve_weth / (10 ** 18)
 
-        # Adjust reserves
-        adjusted_reserve_token = reserve_token / (10 ** token_decimals)
-        adjusted_reserve_weth = reserve_weth / (10 ** 18)
+    if adjusted_reserve_token == 0 or adjusted_reserve_weth == 0:
+        logging.warning(f"Reserves are zero for token {token_address} and WETH in Uniswap V2 pair.")
+        return None
 
-        if adjusted_reserve_token == 0 or adjusted_reserve_weth == 0:
-            logging.warning(f"Reserves are zero for token {token_address} and WETH in Uniswap V2 pair.")
+    # Calculate price
+    return adjusted_reserve_weth / adjusted_reserve_token
+
+def compute_uniswap_v3_price(token_address, token_decimals, pool_states):
+    for fee, pool_address, slot0 in pool_states:
+        if slot0 is None:
+            logging.error(f"Error fetching Uniswap V3 price for token {token_address} and fee tier {fee}: slot0 call failed")
+            continue
+        sqrtPriceX96 = slot0[0]
+
+        # Calculate token price
+        token_price = (sqrtPriceX96 ** 2 / (2 ** 192)) * (10 ** token_decimals) / (10 ** 18)
+        return token_price, pool_address
+
+    logging.warning(f"Uniswap V3 price not available for token {token_address} in any fee tier.")
+    return None, None
+
+def get_uniswap_v2_price(token_address, token_decimals):
+    try:
+        _, pair_address, reserves, _, _ = read_pools(token_address)
+        if pair_address is None:
+            logging.warning(f"Uniswap V2 pair not found for token {token_address} and WETH.")
             return None, None
 
-        # Calculate price
-        token_price = adjusted_reserve_weth / adjusted_reserve_token
+        token_price = compute_uniswap_v2_price(token_address, token_decimals, reserves)
+        if token_price is None:
+            return None, None
         return token_price, pair_address
 
     except Exception as e:
@@ -106,112 +241,140 @@ def get_uniswap_v2_price(token_address, token_decimals):
         return None, None
 
 def get_uniswap_v3_price(token_address, token_decimals):
-    fee_tiers = [500, 3000, 10000]
-    
-    for fee in fee_tiers:
-        try:
-            # Fetch pool address from Uniswap V3 Factory contract
-            pool_address = uniswap_v3_factory.functions.getPool(Web3.to_checksum_address(token_address), Web3.to_checksum_address(WETH_ADDRESS), fee).call()
-
-            if pool_address != '0x0000000000000000000000000000000000000000':
-                # Create pool contract instance
-                pool_contract = web3.eth.contract(address=Web3.to_checksum_address(pool_address), abi=uniswap_v3_pool_abi)
-
-                # Fetch slot0 from the pool contract
-                slot0 = pool_contract.functions.slot0().call()
-                sqrtPriceX96 = slot0[0]
-
-                # Calculate token price
-                token_price = (sqrtPriceX96 ** 2 / (2 ** 192)) * (10 ** token_decimals) / (10 ** 18)
-                return token_price, pool_address
-            else:
-                logging.warning(f"Uniswap V3 pool not found for token {token_address}, WETH, and fee tier {fee}.")
-        except Exception as e:
-            logging.error(f"Error fetching Uniswap V3 price for token {token_address} and fee tier {fee}: {e}")
-    
-    logging.warning(f"Uniswap V3 price not available for token {token_address} in any fee tier.")
-    return None, None
+    try:
+        _, _, _, pool_states, _ = read_pools(token_address)
+        return compute_uniswap_v3_price(token_address, token_decimals, pool_states)
+    except Exception as e:
+        logging.error(f"Error fetching Uniswap V3 price for token {token_address}: {e}")
+        return None, None
+
+def select_uniswap_price(token_address, token_decimals, pair_address, reserves, pool_states):
+    if pair_address is not None:
+        token_price = compute_uniswap_v2_price(token_address, token_decimals, reserves)
+        if token_price is not None:
+            return token_price, pair_address
+    else:
+        logging.warning(f"Uniswap V2 pair not found for token {token_address} and WETH.")
+    return compute_uniswap_v3_price(token_address, token_decimals, pool_states)
+
+def get_uniswap_price(token_address, token_decimals):
+    """
+    Returns (token_price, pair_or_pool_address) from Uniswap V2, falling back to V3, with all
+    reads pinned to the same block.
+    """
+    try:
+        _, pair_address, reserves, pool_states, _ = read_pools(token_address)
+    except Exception as e:
+        logging.error(f"Error fetching Uniswap prices for token {token_address}: {e}")
+        return None, None
+    return select_uniswap_price(token_address, token_decimals, pair_address, reserves, pool_states)
+
+def read_token_states(tokens):
+    """
+    Reads the pool states of several tokens with a single batched call.
+    Returns (block_number, {token_address: (pair_address, reserves, pool_states)}).
+    """
+    resolved = {token_address: resolve_pools(token_address) for token_address in tokens}
+    calls = []
+    for pair_address, pools in resolved.values():
+        calls += pool_state_calls(pair_address, pools)
+    block_number, results = multicall.call(calls)
+
+    states = {}
+    for token_address, (pair_address, pools) in resolved.items():
+        reserves, pool_states, results = split_pool_states(pair_address, pools, results)
+        states[token_address] = (pair_address, reserves, pool_states)
+    return block_number, states
+
+def get_pool_logs(addresses, from_block, to_block):
+    """
+    Returns the V2 Sync and V3 Swap events of the given pairs and pools, in chain order.
+    """
+    # An empty address filter would match every contract on chain
+    if not addresses:
+        return []
+    return web3.eth.get_logs({
+        'fromBlock': from_block,
+        'toBlock': to_block,
+        'address': addresses,
+        'topics': [[SYNC_TOPIC, UNISWAP_V3_SWAP_TOPIC]]
+    })
+
+def apply_pool_log(state, log):
+    """
+    Returns the (pair_address, reserves, pool_states) state of a token updated with a Sync or Swap
+    event of one of its pools. Sync carries the new reserves, Swap the new sqrtPriceX96.
+    """
+    pair_address, reserves, pool_states = state
+    topic = Web3.to_hex(log['topics'][0])
+    if topic == SYNC_TOPIC and log['address'] == pair_address:
+        reserves = tuple(web3.codec.decode(['uint112', 'uint112'], bytes(log['data'])))
+    elif topic == UNISWAP_V3_SWAP_TOPIC:
+        sqrtPriceX96 = web3.codec.decode(['int256', 'int256', 'uint160', 'uint128', 'int24'], bytes(log['data']))[2]
+        pool_states = [
+            (fee, pool_address, (sqrtPriceX96,) if pool_address == log['address'] else slot0)
+            for fee, pool_address, slot0 in pool_states
+        ]
+    return pair_address, reserves, pool_states
+
+def get_swap_amount(tx_hash, token_contract_address, timeout=RECEIPT_TIMEOUT):
+    # Wait for the transaction to be mined
+    tx_receipt = receipt_tracker.wait(tx_hash, timeout=timeout)
+    if tx_receipt is None:
+        logging.error(f"Transaction {Web3.to_hex(tx_hash)} not mined after {timeout} seconds.")
+        return None
+    logging.info(f"Transaction receipt found in block {tx_receipt['blockNumber']}.")
+    return get_receipt_amount(tx_receipt, token_contract_address)
+
+def get_receipt_amount(tx_receipt, token_contract_address):
+    """
+    Returns the amount of the token moved by the transfers of a mined transaction.
+    """
+    # Check for token swap events (Transfer method signature: 0xddf252ad)
+    token_transfers = [log for log in tx_receipt.logs if log['topics'] and Web3.to_hex(log['topics'][0]) == TRANSFER_TOPIC]
+
+    if not token_transfers:
+        logging.warning(f"No token transfers found in transaction {Web3.to_hex(tx_receipt['transactionHash'])}.")
+        return "No token transfers found in this transaction"
+
+    # Log the fact that we found two or more swap events
+    logging.info(f"Token transfers found: {len(token_transfers)} transfers.")
+
+    total_token_amount = 0
+
+    # Loop through all transfers and sum the amount for the specified token
+    for transfer in token_transfers:
+        contract_address = transfer['address']
+
+        if token_contract_address and web3.to_checksum_address(contract_address) != web3.to_checksum_address(token_contract_address):
+            # Skip if the contract address doesn't match the specified token contract
+            continue
+
+        token_amount = int.from_bytes(transfer['data'], byteorder='big')
+        total_token_amount += token_amount
+
+    # Log the total token amount for the specified token
+    logging.info(f"Total token amount found for {token_contract_address}: {total_token_amount}")
+
+    return total_token_amount  # Return the total token amount
+
+def get_approval_amount(tx_hash, timeout=RECEIPT_TIMEOUT):
+    # Wait for the transaction to be mined
+    tx_receipt = receipt_tracker.wait(tx_hash, timeout=timeout)
+    if tx_receipt is None:
+        logging.error(f"Transaction {Web3.to_hex(tx_hash)} not mined after {timeout} seconds.")
+        return None
+    logging.info(f"Transaction receipt found in block {tx_receipt['blockNumber']} for tx: {Web3.to_hex(tx_hash)}")
+
+    # Check for Approval event (Approval method signature: 0x8c5be1e5)
+    approval_logs = [log for log in tx_receipt.logs if log['topics'] and Web3.to_hex(log['topics'][0]) == APPROVAL_TOPIC]
+
+    if not approval_logs:
+        logging.warning(f"No approval events found in transaction {Web3.to_hex(tx_hash)}.")
+        return "No approvals found in this transaction"
+
+    # Decode approval event data
+    approval_amount = int.from_bytes(approval_logs[0]['data'], byteorder='big')
+    logging.info(f"Approval amount found: {approval_amount}")
 
-def get_swap_amount(tx_hash, token_contract_address, max_retries=90, delay=2):
-    retries = 0
-    while retries < max_retries:
-        try:
-            # Attempt to get the transaction receipt
-            tx_receipt = web3.eth.get_transaction_receipt(tx_hash)
-            
-            # Log successful retrieval of the transaction receipt
-            logging.info(f"Transaction receipt found on try {retries + 1}.")
-            
-            # If successful, check for token swap events (Transfer method signature: 0xddf252ad)
-            token_transfers = [log for log in tx_receipt.logs if log['topics'][0].hex() == Web3.keccak(text="Transfer(address,address,uint256)").hex()]
-            
-            if not token_transfers:
-                    logging.warning(f"No token transfers found in transaction {tx_hash}.")
-                    return "No token transfers found in this transaction"
-            
-            # Log the fact that we found two or more swap events
-            logging.info(f"Token transfers found: {len(token_transfers)} transfers.")
-
-            total_token_amount = 0
-            
-            # Loop through all transfers and sum the amount for the specified token
-            for transfer in token_transfers:
-                contract_address = transfer['address']
-                    
-                if token_contract_address and web3.to_checksum_address(contract_address) != web3.to_checksum_address(token_contract_address):
-                    # Skip if the contract address doesn't match the specified token contract
-                    continue
-                    
-                token_amount = int.from_bytes(transfer['data'], byteorder='big')
-                total_token_amount += token_amount
-                
-            # Log the total token amount for the specified token
-            logging.info(f"Total token amount found for {token_contract_address}: {total_token_amount}")
-                
-            return total_token_amount  # Return the total token amount
-
-        except TransactionNotFound:
-            # Log retry attempt and wait before trying again
-            retries += 1
-            logging.warning(f"Transaction {tx_hash} not found on try {retries}. Retrying in {delay} seconds...")
-            time.sleep(delay)  # Wait for the specified delay before retrying
-
-    # After max_retries attempts, log and return None if transaction still not found
-    logging.error(f"Transaction {tx_hash} not found after {max_retries} attempts.")
-    return None
-
-def get_approval_amount(tx_hash, max_retries=90, delay=2):
-    retries = 0
-    while retries < max_retries:
-        try:
-            # Attempt to get the transaction receipt
-            tx_receipt = web3.eth.get_transaction_receipt(tx_hash)
-            
-            # Log successful retrieval of the transaction receipt
-            logging.info(f"Transaction receipt found on try {retries + 1} for tx: {tx_hash}")
-            
-            # Check for Approval event (Approval method signature: 0x8c5be1e5)
-            approval_logs = [log for log in tx_receipt.logs if log['topics'][0].hex() == Web3.keccak(text="Approval(address,address,uint256)").hex()]
-            
-            if not approval_logs:
-                logging.warning(f"No approval events found in transaction {tx_hash}.")
-                return "No approvals found in this transaction"
-            
-            # Decode approval event data
-            for approval in approval_logs:
-                approval_amount = int.from_bytes(approval['data'], byteorder='big')
-                
-                # Log the found approval amount
-                logging.info(f"Approval amount found: {approval_amount}")
-                
-                return approval_amount  # Return the approval amount if found
-
-        except TransactionNotFound:
-            # Log retry attempt and wait before trying again
-            retries += 1
-            logging.warning(f"Transaction {tx_hash} not found on try {retries}. Retrying in {delay} seconds...")
-            time.sleep(delay)  # Wait for the specified delay before retrying
-
-    # After max_retries attempts, log and return None if transaction still not found
-    logging.error(f"Transaction {tx_hash} not found after {max_retries} attempts.")
-    return None
\ No newline at end of file
+    return approval_amount  # Return the approval amount if found
@@ -12,11 +12,13 @@ def main():
     save_html = save_html_input in ['yes', 'y']
 
     # Run the scraper
-    scam_detected = scrape_dexanalyzer(token_hash, save_html=save_html)
+    result = scrape_dexanalyzer(token_hash, save_html=save_html)
 
     # Print the result
-    if scam_detected:
-        print(f"Alert: DexAnalyzer detected a SCAM for token {token_hash}.")
+    if result is None:
+        print(f"No verdict: DexAnalyzer did not give a loaded page for token {token_hash}.")
+    elif result[0]:
+        print(f"Alert: DexAnalyzer detected a SCAM for token {token_hash}. {result[1]}")
     else:
         print(f"No alert: DexAnalyzer did not detect a scam for token {token_hash}.")
 
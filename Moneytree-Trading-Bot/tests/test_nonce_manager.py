@@ -0,0 +1,99 @@
+import os
+import tempfile
+import time
+import unittest
+from types import SimpleNamespace
+from pieces.nonce_manager import NonceManager
+
+WALLET = '0x000000000000000000000000000000000000dEaD'
+
+class FakeEth:
+    """
+    Transaction counts of the wallet: `mined` transactions in the latest block, `pending` with the mempool.
+    """
+
+    def __init__(self, mined=0, pending=0):
+        self.mined = mined
+        self.pending = pending
+
+    def get_transaction_count(self, address, block_identifier):
+        return self.pending if block_identifier == 'pending' else self.mined
+
+class NonceManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.eth = FakeEth(mined=7, pending=7)
+        self.path = os.path.join(self.directory.name, 'nonces.json')
+        self.nonce_manager = NonceManager(SimpleNamespace(eth=self.eth), WALLET, self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def send(self, nonce):
+        self.nonce_manager.record(nonce, f"0x{nonce:064x}", {'nonce': nonce})
+        self.eth.pending = max(self.eth.pending, nonce + 1)
+
+    def test_allocates_from_the_pending_count(self):
+        self.assertEqual([self.nonce_manager.allocate() for _ in range(3)], [7, 8, 9])
+
+    def test_processes_sharing_the_file_never_get_the_same_nonce(self):
+        other = NonceManager(SimpleNamespace(eth=self.eth), WALLET, self.path)
+        nonces = [manager.allocate() for manager in (self.nonce_manager, other, self.nonce_manager, other)]
+        self.assertEqual(nonces, [7, 8, 9, 10])
+
+    def test_released_nonce_goes_to_the_next_allocation(self):
+        first, second = self.nonce_manager.allocate(), self.nonce_manager.allocate()
+        self.send(second)
+        self.nonce_manager.release(first)
+        self.assertEqual(self.nonce_manager.allocate(), first)
+        self.assertEqual(self.nonce_manager.allocate(), second + 1)
+
+    def test_release_keeps_a_pending_transaction(self):
+        nonce = self.nonce_manager.allocate()
+        self.send(nonce)
+        # A failed replacement releases the nonce of a transaction the node still has
+        self.nonce_manager.release(nonce)
+        self.assertIn(nonce, self.nonce_manager.pending())
+        self.assertEqual(self.nonce_manager.allocate(), nonce + 1)
+
+    def test_mined_transactions_are_dropped(self):
+        for _ in range(2):
+            self.send(self.nonce_manager.allocate())
+        self.eth.mined = 8
+        self.nonce_manager.reconcile()
+        self.assertEqual(list(self.nonce_manager.pending()), [8])
+
+    def test_catches_up_with_transactions_sent_elsewhere(self):
+        self.nonce_manager.allocate()
+        self.eth.pending = 12
+        self.nonce_manager.reconcile()
+        self.assertEqual(self.nonce_manager.allocate(), 12)
+
+    def test_gaps_below_a_pending_transaction(self):
+        released, abandoned, recent = (self.nonce_manager.allocate() for _ in range(3))
+        self.send(self.nonce_manager.allocate())
+        self.nonce_manager.release(released)
+
+        # Allocations younger than the timeout may still be sent
+        self.assertEqual(self.nonce_manager.gaps(allocation_timeout=60), [released])
+        with self.nonce_manager._locked() as state:
+            state['allocated'][str(abandoned)] = time.time() - 120
+        self.assertEqual(self.nonce_manager.gaps(allocation_timeout=60), [abandoned])
+
+        # A claimed gap is not handed out twice
+        self.assertEqual(self.nonce_manager.gaps(allocation_timeout=60), [])
+        self.assertNotEqual(self.nonce_manager.allocate(), released)
+
+    def test_no_gaps_without_pending_transactions(self):
+        self.nonce_manager.allocate()
+        self.assertEqual(self.nonce_manager.gaps(allocation_timeout=0), [])
+
+    def test_stuck_transactions(self):
+        nonce = self.nonce_manager.allocate()
+        self.send(nonce)
+        self.assertEqual(self.nonce_manager.stuck(max_age=60), {})
+        self.assertEqual(list(self.nonce_manager.stuck(max_age=-1)), [nonce])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import tempfile
+import time
+import unittest
+from pieces.pool_cache import PoolAddressCache
+
+TOKEN = '0x1111111111111111111111111111111111111111'
+PAIR = '0x2222222222222222222222222222222222222222'
+POOL = '0x3333333333333333333333333333333333333333'
+FEE_TIERS = [500, 3000, 10000]
+
+class PoolAddressCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'pools.json')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_unknown_token(self):
+        self.assertIsNone(PoolAddressCache(self.path).get(TOKEN, FEE_TIERS))
+
+    def test_found_addresses_are_shared_through_the_file(self):
+        PoolAddressCache(self.path).store(TOKEN, PAIR, [(3000, POOL)], FEE_TIERS)
+        self.assertEqual(PoolAddressCache(self.path).get(TOKEN.lower(), FEE_TIERS), (PAIR, [(3000, POOL)]))
+
+    def test_missing_venues_expire(self):
+        pool_cache = PoolAddressCache(self.path, negative_ttl=0.05)
+        pool_cache.store(TOKEN, PAIR, [(3000, POOL)], FEE_TIERS)
+        self.assertEqual(pool_cache.get(TOKEN, FEE_TIERS), (PAIR, [(3000, POOL)]))
+        time.sleep(0.1)
+        self.assertIsNone(pool_cache.get(TOKEN, FEE_TIERS))
+        # Complete for the tiers asked, so nothing is missing
+        self.assertEqual(pool_cache.get(TOKEN, [3000]), (PAIR, [(3000, POOL)]))
+
+    def test_a_restart_keeps_the_time_of_the_lookup(self):
+        PoolAddressCache(self.path, negative_ttl=60).store(TOKEN, PAIR, [(3000, POOL)], FEE_TIERS)
+        self.assertEqual(PoolAddressCache(self.path, negative_ttl=60).get(TOKEN, FEE_TIERS), (PAIR, [(3000, POOL)]))
+
+    def test_token_without_any_pool_is_only_remembered_in_memory(self):
+        pool_cache = PoolAddressCache(self.path)
+        pool_cache.store(TOKEN, None, [], FEE_TIERS)
+        self.assertEqual(pool_cache.get(TOKEN, FEE_TIERS), (None, []))
+        self.assertIsNone(PoolAddressCache(self.path).get(TOKEN, FEE_TIERS))
+
+    def test_pools_found_later_are_merged(self):
+        pool_cache = PoolAddressCache(self.path)
+        pool_cache.store(TOKEN, PAIR, [], FEE_TIERS)
+        pool_cache.store(TOKEN, None, [(3000, POOL)], FEE_TIERS)
+        self.assertEqual(PoolAddressCache(self.path).get(TOKEN, [3000]), (PAIR, [(3000, POOL)]))
+
+if __name__ == '__main__':
+    unittest.main()
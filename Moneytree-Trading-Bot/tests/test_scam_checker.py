@@ -0,0 +1,86 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from pieces.scam_checker import ScamChecker
+
+TOKEN = '0x1111111111111111111111111111111111111111'
+DEFAULT_VERDICT = (True, "Scam check deadline passed.")
+
+class ScamCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'scam_verdicts.json')
+        self.checked = []
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def checker(self, verdicts, ttl=900, deadline=2, delay=0):
+        verdicts = list(verdicts)
+
+        def check(token_address, deadline=None):
+            self.checked.append(token_address)
+            time.sleep(delay)
+            return verdicts.pop(0)
+
+        return ScamChecker(check, self.path, ttl=ttl, deadline=deadline, default_verdict=DEFAULT_VERDICT, poll_interval=0.01)
+
+    def test_verdict_is_cached(self):
+        scam_checker = self.checker([(True, "Scam detected: Not Renounced")])
+        self.assertEqual(scam_checker.verdict(TOKEN), (True, "Scam detected: Not Renounced"))
+        self.assertEqual(scam_checker.verdict(TOKEN.upper().replace('0X', '0x')), (True, "Scam detected: Not Renounced"))
+        self.assertEqual(len(self.checked), 1)
+
+    def test_cache_is_shared_through_the_file(self):
+        self.checker([(False, "")]).verdict(TOKEN)
+        other = self.checker([(True, "never asked")])
+        self.assertEqual(other.verdict(TOKEN), (False, ""))
+        self.assertEqual(len(self.checked), 1)
+
+    def test_expired_verdict_is_checked_again(self):
+        scam_checker = self.checker([(True, "first"), (False, "")], ttl=0)
+        self.assertEqual(scam_checker.verdict(TOKEN), (True, "first"))
+        self.assertEqual(scam_checker.verdict(TOKEN), (False, ""))
+        self.assertEqual(len(self.checked), 2)
+
+    def test_no_verdict_is_never_cached(self):
+        scam_checker = self.checker([None, (False, "")])
+        self.assertEqual(scam_checker.verdict(TOKEN), DEFAULT_VERDICT)
+        self.assertEqual(scam_checker.verdict(TOKEN), (False, ""))
+        self.assertEqual(len(self.checked), 2)
+
+    def test_failed_check_falls_back_to_the_default(self):
+        def check(token_address, deadline=None):
+            raise Exception("DexAnalyzer is down")
+
+        scam_checker = ScamChecker(check, self.path, deadline=2, default_verdict=DEFAULT_VERDICT)
+        self.assertEqual(scam_checker.verdict(TOKEN), DEFAULT_VERDICT)
+
+    def test_deadline_applies_the_default_verdict(self):
+        scam_checker = self.checker([(False, "")], deadline=0.1, delay=0.5)
+        self.assertEqual(scam_checker.verdict(TOKEN), DEFAULT_VERDICT)
+
+    def test_concurrent_requests_share_one_check(self):
+        scam_checker = self.checker([(False, "")], delay=0.2)
+        verdicts = []
+        threads = [threading.Thread(target=lambda: verdicts.append(scam_checker.verdict(TOKEN))) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(verdicts, [(False, "")] * 4)
+        self.assertEqual(len(self.checked), 1)
+
+    def test_token_checked_by_another_worker_is_waited_for(self):
+        first = self.checker([(True, "Scam detected: HIGH Priority")], delay=0.2)
+        second = self.checker([(False, "never asked")])
+        first.start(TOKEN)
+        time.sleep(0.05)
+        self.assertEqual(second.verdict(TOKEN), (True, "Scam detected: HIGH Priority"))
+        self.assertEqual(len(self.checked), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import unittest
+from types import SimpleNamespace
+from web3 import Web3
+from pieces.sell_router import SellRouter, V2_VENUE
+
+TOKEN = '0x1111111111111111111111111111111111111111'
+WETH = '0xC02aaA39b223FE8D0A0e5C4F27eAD9083C756Cc2'
+PAIR = '0x2222222222222222222222222222222222222222'
+POOLS = [(3000, '0x3333333333333333333333333333333333333333'), (10000, '0x4444444444444444444444444444444444444444')]
+
+class FakeMulticall:
+    """
+    Answers quote calls from {venue: function(amount_in) -> amount_out}; a venue mapped to None fails.
+    """
+
+    def __init__(self, quotes):
+        self.quotes = quotes
+        self.calls = []
+
+    def call(self, calls):
+        self.calls.append(calls)
+        results = []
+        for contract, function_name, args in calls:
+            if function_name == 'getAmountsOut':
+                amount_in, venue = args[0], V2_VENUE
+            else:
+                amount_in, venue = args[0][2], args[0][3]
+            quote = self.quotes.get(venue)
+            if quote is None:
+                results.append(None)
+            elif venue == V2_VENUE:
+                results.append([amount_in, quote(amount_in)])
+            else:
+                results.append((quote(amount_in), 0, 0, 0))
+        return 1, results
+
+def constant_product(reserve_in, reserve_out):
+    return lambda amount_in: amount_in * 997 * reserve_out // (reserve_in * 1000 + amount_in * 997)
+
+class SellRouterTest(unittest.TestCase):
+
+    def router(self, quotes, slippage_tolerance=0.1):
+        self.multicall = FakeMulticall(quotes)
+        v2_router = SimpleNamespace(address='0x7a250d5630B4cF539739dF2C5dAcb4c659F2488D')
+        v3_router = SimpleNamespace(address='0xE592427A0AEce92De3Edee1F18E0157C05861564')
+        return SellRouter(Web3(), self.multicall, v2_router, v3_router, WETH, slippage_tolerance)
+
+    def test_whole_amount_on_the_best_venue(self):
+        router = self.router({V2_VENUE: lambda amount_in: amount_in * 2, 3000: lambda amount_in: amount_in * 3, 10000: None})
+        legs = router.route(TOKEN, 1000, PAIR, POOLS)
+        self.assertEqual(legs, [{'venue': 3000, 'amount_in': 1000, 'quote': 3000, 'amount_out_min': 2700}])
+        # Every venue is quoted in one batch, for the whole amount and for half of it
+        self.assertEqual(len(self.multicall.calls), 1)
+        self.assertEqual(len(self.multicall.calls[0]), 6)
+
+    def test_splits_when_two_halves_pay_more(self):
+        # Two shallow pools of the same depth, half on each moves the price less
+        router = self.router({V2_VENUE: constant_product(10 ** 6, 10 ** 6), 3000: constant_product(10 ** 6, 10 ** 6)})
+        legs = router.route(TOKEN, 10 ** 6 + 1, PAIR, POOLS[:1])
+        self.assertEqual([leg['venue'] for leg in legs], [V2_VENUE, 3000])
+        self.assertEqual(sum(leg['amount_in'] for leg in legs), 10 ** 6 + 1)
+        self.assertGreater(sum(leg['quote'] for leg in legs), constant_product(10 ** 6, 10 ** 6)(10 ** 6 + 1))
+
+    def test_minimum_output_applies_the_slippage_tolerance(self):
+        router = self.router({V2_VENUE: lambda amount_in: 1000}, slippage_tolerance=0.49)
+        self.assertEqual(router.route(TOKEN, 10, PAIR, [])[0]['amount_out_min'], 510)
+
+    def test_fee_on_transfer_goes_through_v2_unquoted(self):
+        router = self.router({})
+        legs = router.route(TOKEN, 1000, PAIR, POOLS, fee_on_transfer=True)
+        self.assertEqual(legs, [{'venue': V2_VENUE, 'amount_in': 1000, 'quote': None, 'amount_out_min': 0}])
+        self.assertEqual(self.multicall.calls, [])
+        with self.assertRaises(Exception):
+            router.route(TOKEN, 1000, None, POOLS, fee_on_transfer=True)
+
+    def test_fails_without_any_quote(self):
+        router = self.router({V2_VENUE: None, 3000: lambda amount_in: 0})
+        with self.assertRaises(Exception):
+            router.route(TOKEN, 1000, PAIR, POOLS[:1])
+
+    def test_spender_of_each_venue(self):
+        router = self.router({})
+        self.assertEqual(router.spender({'venue': V2_VENUE}), router.v2_router.address)
+        self.assertEqual(router.spender({'venue': 3000}), router.v3_router.address)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify
 import yaml
 import os
 from datetime import timedelta
@@ -6,8 +6,9 @@ from functools import wraps
 from dotenv import load_dotenv
 import logging
 from logging.handlers import TimedRotatingFileHandler
-from pieces.systemd_service_manager import start_service, stop_service, restart_service, get_service_status
-from pieces.statistics import get_transactions, calculate_profit_loss, get_todays_pl
+from pieces.systemd_service_manager import start_service, stop_service, restart_service, get_service_info
+from pieces.statistics import get_transactions, calculate_profit_loss, get_todays_pl, statistics_store, profit_loss_aggregator
+from pieces.dashboard_events import DashboardPublisher, EventBroadcaster
 import bcrypt
 import threading
 from flask_limiter import Limiter
@@ -171,10 +172,25 @@ def update():
 def get_transactions_route():
     return get_transactions()
 
-# Start the background thread for calculating profit/loss
+# Start the background thread aggregating profit/loss, one worker of the deployment leads it
 profit_loss_thread = threading.Thread(target=calculate_profit_loss, args=(logger,), daemon=True)
 profit_loss_thread.start()
 
+# Publishes the dashboard's state to Redis once per deployment, and streams it to the dashboards of this worker
+dashboard_publisher = DashboardPublisher(redis_connection, statistics_store, profit_loss_aggregator, get_service_info)
+event_broadcaster = EventBroadcaster(redis_connection)
+
+dashboard_publisher_thread = threading.Thread(target=dashboard_publisher.run, args=(logger,), daemon=True)
+dashboard_publisher_thread.start()
+
+@app.route('/events')
+@login_required
+@limiter.exempt
+def events():
+    # Server-Sent Events of P/L, service status, transactions and positions, the dashboard's only push channel
+    return Response(event_broadcaster.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/todays_pl', methods=['GET'])
 @login_required
 @limiter.exempt
@@ -206,7 +222,8 @@ def restart_mtb():
 @login_required
 @limiter.exempt
 def mtb_status():
-    status = get_service_status('mtb')
+    # Read by the leader's probe, no worker probes systemd for a request
+    status = dashboard_publisher.service_status('mtb')
     return {'status': status}
 
 @app.route('/start_mtdb', methods=['POST'])
@@ -234,5 +251,11 @@ def restart_mtdb():
 @login_required
 @limiter.exempt
 def mtdb_status():
-    status = get_service_status('mtdb')
+    status = dashboard_publisher.service_status('mtdb')
     return {'status': status}
+
+@app.route('/services_status', methods=['GET'])
+@login_required
+@limiter.exempt
+def services_status():
+    return jsonify(dashboard_publisher.services())
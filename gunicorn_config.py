@@ -6,6 +6,10 @@ from logging.handlers import TimedRotatingFileHandler
 bind = "0.0.0.0:8000"
 workers = 4
 
+# Dashboards hold an event stream open, each one takes a thread of a worker
+worker_class = "gthread"
+threads = 32
+
 # Log directories and files
 log_dir = "logs/gunicorn"
 accesslog = os.path.join(log_dir, "gunicorn_access.log")
@@ -1,6 +1,7 @@
 # Helper functions to update different sections of the config
 def update_ethereum_settings(config, form):
     config['ETEREUM_NODE_URL'] = form.get('ETEREUM_NODE_URL', config.get('ETEREUM_NODE_URL'))
+    config['ETEREUM_NODE_WS_URL'] = form.get('ETEREUM_NODE_WS_URL', config.get('ETEREUM_NODE_WS_URL'))
     config['WETH_ADDRESS'] = form.get('WETH_ADDRESS', config.get('WETH_ADDRESS'))
     config['UNISWAP_V2_FACTORY_ADDRESS'] = form.get('UNISWAP_V2_FACTORY_ADDRESS', config.get('UNISWAP_V2_FACTORY_ADDRESS'))
     config['UNISWAP_V3_FACTORY_ADDRESS'] = form.get('UNISWAP_V3_FACTORY_ADDRESS', config.get('UNISWAP_V3_FACTORY_ADDRESS'))
@@ -0,0 +1,178 @@
+import json
+import os
+import queue
+import threading
+import time
+from pieces.leader_lock import LeaderLock
+from pieces.statistics_store import day_start, local_day
+
+class DashboardPublisher:
+    """
+    Publishes the dashboard's state to a Redis channel when it changes: today's profit/loss, the
+    status of the services, changed transactions and the open positions of the trading bot. Every
+    gunicorn worker starts one, but only the holder of a Redis leader lock publishes, so the state
+    is read once per deployment however many dashboards are open.
+
+    The last published value of every event is kept in a Redis hash, so a dashboard connecting
+    later starts from it. Transactions are deltas from a seq on and are not kept. The full service
+    entries of the leader's status probe are kept next to it, so every worker answers status
+    requests from the one probe of the deployment.
+    """
+
+    def __init__(self, redis, store, aggregator, service_info, services=('mtb', 'mtdb'), channel='dashboard',
+                 interval=1, status_interval=5, position_max_age=300, page_size=500):
+        self.redis = redis
+        self.store = store
+        self.aggregator = aggregator
+        self.service_info = service_info
+        self.services = services
+        self.channel = channel
+        self.snapshot_key = f"{channel}:snapshot"
+        self.positions_key = f"{channel}:positions"
+        self.services_key = f"{channel}:services"
+        self.interval = interval
+        self.status_interval = status_interval
+        self.position_max_age = position_max_age
+        self.page_size = page_size
+        self.leader_lock = LeaderLock(redis, f"{channel}:leader")
+        self.seq = None
+        self.status_checked_at = 0
+
+    def publish(self, event, data, keep=True):
+        message = json.dumps({'event': event, 'data': data})
+        if keep:
+            if self.redis.hget(self.snapshot_key, event) == message.encode():
+                return
+            self.redis.hset(self.snapshot_key, event, message)
+        self.redis.publish(self.channel, message)
+
+    def step(self):
+        self.publish('pl', {'todaysPL': round(self.aggregator.day_total(), 6)})
+
+        if time.time() - self.status_checked_at >= self.status_interval:
+            self.status_checked_at = time.time()
+            info = self.service_info()
+            self.redis.set(self.services_key, json.dumps(info))
+            self.publish('status', {service: info[service]['status'] if service in info else 'error' for service in self.services})
+
+        # A new leader only announces the transactions written from now on
+        if self.seq is None:
+            self.seq = self.store.latest_seq()
+        transactions = self.store.transactions(since=day_start(), after_seq=self.seq, limit=self.page_size + 1)
+        if transactions:
+            has_more = len(transactions) > self.page_size
+            transactions = transactions[:self.page_size]
+            self.publish('transactions', {
+                'day': local_day(),
+                'after': self.seq,
+                'transactions': transactions,
+                'cursor': transactions[-1]['seq'],
+                'has_more': has_more
+            }, keep=False)
+            self.seq = transactions[-1]['seq']
+
+        now = time.time()
+        positions = {}
+        for position_id, position in self.redis.hgetall(self.positions_key).items():
+            position = json.loads(position)
+            if now - position['updated_at'] < self.position_max_age:
+                positions[position_id.decode()] = position
+        self.publish('positions', positions)
+
+    def services(self):
+        """
+        Returns the service entries last read by the leader, keyed by service.
+        """
+        info = self.redis.get(self.services_key)
+        return json.loads(info) if info is not None else {}
+
+    def service_status(self, service):
+        entry = self.services().get(service)
+        return entry['status'] if entry is not None else 'error'
+
+    def run(self, logger):
+        while True:
+            try:
+                if self.leader_lock.acquire():
+                    self.step()
+                else:
+                    self.seq = None
+            except Exception as e:
+                logger.error(f"Error publishing dashboard events: {e}")
+            time.sleep(self.interval)
+
+class EventBroadcaster:
+    """
+    Fans the dashboard channel out to the Server-Sent Events streams of a gunicorn worker. The worker
+    holds one Redis subscription, whatever the number of connected dashboards; each stream gets the
+    messages through its own bounded queue, the oldest message giving way when a client lags.
+    """
+
+    def __init__(self, redis, channel='dashboard', queue_size=100, heartbeat=15):
+        self.redis = redis
+        self.channel = channel
+        self.snapshot_key = f"{channel}:snapshot"
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self.lock = threading.Lock()
+        self.clients = set()
+        self.listener_pid = None
+
+    def _start_listener(self):
+        with self.lock:
+            # Threads do not survive a fork, so every worker starts its own listener
+            if self.listener_pid == os.getpid():
+                return
+            self.listener_pid = os.getpid()
+            self.clients = set()
+        threading.Thread(target=self._listen, daemon=True).start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                for message in pubsub.listen():
+                    self._broadcast(message['data'].decode())
+            except Exception:
+                time.sleep(1)
+
+    def _broadcast(self, message):
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            while True:
+                try:
+                    client.put_nowait(message)
+                    break
+                except queue.Full:
+                    try:
+                        client.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    @staticmethod
+    def _format(message):
+        event = json.loads(message)
+        return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    def stream(self):
+        """
+        Yields the Server-Sent Events of one client: the last known state first, then every change.
+        """
+        self._start_listener()
+        client = queue.Queue(maxsize=self.queue_size)
+        with self.lock:
+            self.clients.add(client)
+        try:
+            for message in self.redis.hgetall(self.snapshot_key).values():
+                yield self._format(message.decode())
+            while True:
+                try:
+                    yield self._format(client.get(timeout=self.heartbeat))
+                except queue.Empty:
+                    # Keeps proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+        finally:
+            with self.lock:
+                self.clients.discard(client)
@@ -0,0 +1,34 @@
+import os
+import socket
+import uuid
+
+class LeaderLock:
+    """
+    A Redis lock that makes one gunicorn worker of the deployment the leader of a background job.
+    The leader renews the lock on every call; when it stops doing so, the lock expires after `ttl`
+    seconds and the next worker asking takes it over.
+    """
+
+    RENEW_SCRIPT = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) else return 0 end"
+
+    def __init__(self, redis, key, ttl=30):
+        self.redis = redis
+        self.key = key
+        self.ttl = ttl
+        self.identity = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        self.renew = redis.register_script(self.RENEW_SCRIPT)
+
+    def acquire(self):
+        """
+        Takes or renews the lock. Returns whether this worker is the leader.
+        """
+        if self.renew(keys=[self.key], args=[self.identity, self.ttl * 1000]):
+            return True
+        return bool(self.redis.set(self.key, self.identity, nx=True, px=self.ttl * 1000))
+
+    def held(self, client=None):
+        """
+        Returns whether this worker holds the lock, read through client (e.g. a watching pipeline).
+        """
+        value = (client if client is not None else self.redis).get(self.key)
+        return value is not None and value.decode() == self.identity
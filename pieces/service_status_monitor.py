@@ -0,0 +1,209 @@
+import logging
+import os
+import subprocess
+import threading
+import time
+
+try:
+    import dbus
+except ImportError:
+    dbus = None
+
+try:
+    from dbus.mainloop.glib import DBusGMainLoop
+    from gi.repository import GLib
+except ImportError:
+    DBusGMainLoop = GLib = None
+
+# Properties read for every unit, systemd reports unset numbers as the largest uint64
+PROPERTIES = ['ActiveState', 'SubState', 'ActiveEnterTimestampMonotonic', 'NRestarts', 'MemoryCurrent', 'CPUUsageNSec', 'MainPID']
+UNSET = 2 ** 64 - 1
+
+class SystemctlBus:
+    """
+    Reads unit properties with one `systemctl show` for all units. Cannot watch for changes.
+    """
+
+    def properties(self, units):
+        result = subprocess.run(['systemctl', 'show', *units, f"--property=Id,{','.join(PROPERTIES)}"],
+                                stdout=subprocess.PIPE, check=True)
+        properties = {}
+        # One block of Key=Value lines per unit, separated by an empty line
+        for block in result.stdout.decode().strip().split('\n\n'):
+            values = dict(line.split('=', 1) for line in block.splitlines() if '=' in line)
+            properties[values.pop('Id')] = values
+        return properties
+
+    def watch(self, units, callback):
+        return False
+
+class DBusSystemdBus:
+    """
+    Reads unit properties from systemd over the system D-Bus. With a GLib main loop available,
+    it also calls back on every state change of a unit, so changes are seen without waiting.
+    """
+
+    def __init__(self):
+        self.main_loop = DBusGMainLoop() if DBusGMainLoop is not None else None
+        self.bus = dbus.SystemBus(mainloop=self.main_loop) if self.main_loop is not None else dbus.SystemBus()
+        systemd = self.bus.get_object('org.freedesktop.systemd1', '/org/freedesktop/systemd1')
+        self.manager = dbus.Interface(systemd, 'org.freedesktop.systemd1.Manager')
+        self.paths = {}
+
+    def _path(self, unit):
+        if unit not in self.paths:
+            self.paths[unit] = str(self.manager.LoadUnit(unit))
+        return self.paths[unit]
+
+    def properties(self, units):
+        properties = {}
+        for unit in units:
+            unit_object = dbus.Interface(self.bus.get_object('org.freedesktop.systemd1', self._path(unit)), 'org.freedesktop.DBus.Properties')
+            values = dict(unit_object.GetAll('org.freedesktop.systemd1.Unit'))
+            values.update(unit_object.GetAll('org.freedesktop.systemd1.Service'))
+            properties[unit] = {name: values.get(name) for name in PROPERTIES}
+        return properties
+
+    def watch(self, units, callback):
+        if self.main_loop is None:
+            return False
+        units_by_path = {self._path(unit): unit for unit in units}
+
+        def changed(interface, changed_properties, invalidated, path=None):
+            if path in units_by_path:
+                callback(units_by_path[path])
+
+        # systemd only emits unit signals to subscribed clients
+        self.manager.Subscribe()
+        self.bus.add_signal_receiver(changed, signal_name='PropertiesChanged', dbus_interface='org.freedesktop.DBus.Properties',
+                                     bus_name='org.freedesktop.systemd1', path_keyword='path')
+        threading.Thread(target=GLib.MainLoop().run, daemon=True).start()
+        return True
+
+class FakeSystemdBus:
+    """
+    A bus holding unit properties in memory, for running the monitor without systemd.
+    `set()` changes a unit and notifies the watcher like systemd would.
+    """
+
+    def __init__(self, units=None):
+        self.units = {unit: dict(values) for unit, values in (units or {}).items()}
+        self.callbacks = []
+
+    def set(self, unit, **values):
+        self.units.setdefault(unit, {}).update(values)
+        for callback in self.callbacks:
+            callback(unit)
+
+    def properties(self, units):
+        return {unit: dict(self.units.get(unit, {'ActiveState': 'inactive'})) for unit in units}
+
+    def watch(self, units, callback):
+        self.callbacks.append(callback)
+        return True
+
+def default_bus():
+    if dbus is not None:
+        try:
+            return DBusSystemdBus()
+        except Exception as e:
+            logging.warning(f"systemd D-Bus API not available, falling back to systemctl: {e}")
+    return SystemctlBus()
+
+def _number(value):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value == UNSET else value
+
+class ServiceStatusMonitor:
+    """
+    Status of systemd services, kept in memory so reading it costs no subprocess. One thread per
+    process refreshes all services every `interval` seconds with a single probe, and right away
+    when the bus reports a change. Each entry holds the status ('running' or 'stopped'), systemd's
+    states, uptime and CPU time in seconds, the restart count, memory in bytes and `checked_at`.
+    """
+
+    def __init__(self, services, bus=None, interval=5):
+        self.services = list(services)
+        self.bus_factory = (lambda: bus) if bus is not None else default_bus
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.changed = threading.Event()
+        self.ready = threading.Event()
+        self.thread_pid = None
+        self.bus = None
+        self.cache = {}
+
+    def start(self):
+        with self.lock:
+            # Threads do not survive a fork, so every process starts its own monitor
+            if self.thread_pid == os.getpid():
+                return
+            self.thread_pid = os.getpid()
+            self.changed = threading.Event()
+            self.ready = threading.Event()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        units = [f"{service}.service" for service in self.services]
+        try:
+            self.bus = self.bus_factory()
+            if self.bus.watch(units, lambda unit: self.changed.set()):
+                logging.info(f"Watching {', '.join(units)} for state changes.")
+        except Exception as e:
+            logging.error(f"Could not watch {', '.join(units)}: {e}")
+            self.bus = self.bus or SystemctlBus()
+        while True:
+            self.refresh()
+            self.changed.wait(self.interval)
+            self.changed.clear()
+
+    def refresh(self):
+        units = [f"{service}.service" for service in self.services]
+        try:
+            properties = self.bus.properties(units)
+            now, monotonic_now = time.time(), time.monotonic()
+            cache = {}
+            for service, unit in zip(self.services, units):
+                values = properties.get(unit, {})
+                active_state = str(values.get('ActiveState', 'unknown'))
+                active_since = _number(values.get('ActiveEnterTimestampMonotonic'))
+                cpu = _number(values.get('CPUUsageNSec'))
+                cache[service] = {
+                    'status': 'running' if active_state == 'active' else 'stopped',
+                    'active_state': active_state,
+                    'sub_state': str(values.get('SubState', 'unknown')),
+                    'uptime': monotonic_now - active_since / 1e6 if active_state == 'active' and active_since else None,
+                    'restarts': _number(values.get('NRestarts')),
+                    'memory': _number(values.get('MemoryCurrent')),
+                    'cpu': cpu / 1e9 if cpu is not None else None,
+                    'main_pid': _number(values.get('MainPID')),
+                    'checked_at': now
+                }
+            self.cache = cache
+        except Exception as e:
+            logging.error(f"Error checking the status of {', '.join(units)}: {e}")
+        finally:
+            self.ready.set()
+
+    def refresh_soon(self):
+        """
+        Makes the monitor refresh now instead of at the end of its interval, e.g. after a restart.
+        """
+        self.changed.set()
+
+    def info(self, service=None):
+        """
+        Returns the cached entry of a service, or of all services, waiting for the first probe if needed.
+        """
+        self.start()
+        self.ready.wait(self.interval)
+        if service is None:
+            return dict(self.cache)
+        return self.cache.get(service)
+
+    def status(self, service):
+        entry = self.info(service)
+        return entry['status'] if entry is not None else 'error'
@@ -1,43 +1,195 @@
 import json
 import time
-from flask import jsonify
+from datetime import datetime, timedelta, timezone
+from flask import jsonify, make_response, request
 from redis import Redis
+from redis.exceptions import WatchError
+from pieces.leader_lock import LeaderLock
+from pieces.statistics_store import STATUSES, StatisticsStore, day_start, local_day, local_tz
 
 # Set up Redis connection (you can adjust the host/port as needed)
 redis_connection = Redis(host='localhost', port=6379)
 
-# Function to read transaction logs and return JSON data
+# Written by the trading bot, read here
+statistics_store = StatisticsStore('logs/statistics/transactions.db')
+
+# Rows returned by /get_transactions per page, unless fewer are asked for
+TRANSACTIONS_PAGE_SIZE = 500
+
+def _utc_timestamp(value):
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = local_tz.localize(moment)
+    return moment.astimezone(timezone.utc).isoformat()
+
+# Function to read today's transactions and return JSON data
 def get_transactions():
+    """
+    Returns today's records that changed after the `since` seq (0 for all of them), oldest change
+    first, with the seq to pass as `since` next time. A page holds at most `limit` records; while
+    `has_more` is set, the next page follows from the returned cursor. Records can be filtered by
+    `wallet`, `token`, `status` and a `from`/`to` range of creation times.
+
+    The ETag is the day and the seq of the last write, so a client that is up to date gets a 304
+    without the records being read.
+    """
+    day = local_day()
     try:
-        with open('logs/statistics/transaction_logs.json', 'r') as f:
-            data = json.load(f)
-        return jsonify(data)
+        etag = f"{day}-{statistics_store.latest_seq()}"
+        if request.if_none_match.contains(etag):
+            response = make_response('', 304)
+            response.set_etag(etag)
+            return response
+
+        since = request.args.get('since', 0, type=int)
+        limit = min(request.args.get('limit', TRANSACTIONS_PAGE_SIZE, type=int), TRANSACTIONS_PAGE_SIZE)
+        status = request.args.get('status')
+        if status is not None and status not in STATUSES:
+            return jsonify({'error': f"Unknown status, use one of: {', '.join(STATUSES)}."}), 400
+        try:
+            time_from = _utc_timestamp(request.args['from']) if 'from' in request.args else None
+            time_to = _utc_timestamp(request.args['to']) if 'to' in request.args else None
+        except ValueError:
+            return jsonify({'error': "'from' and 'to' must be ISO timestamps."}), 400
+
+        transactions = statistics_store.transactions(
+            since=day_start(), after_seq=since, limit=limit + 1, wallet_name=request.args.get('wallet'),
+            token=request.args.get('token'), status=status, time_from=time_from, time_to=time_to
+        )
+        has_more = len(transactions) > limit
+        transactions = transactions[:limit]
+        response = jsonify({
+            'day': day,
+            'transactions': transactions,
+            'cursor': transactions[-1]['seq'] if transactions else since,
+            'has_more': has_more
+        })
+        # Pages are only cacheable when they hold everything up to the last write
+        if not has_more:
+            response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
     except Exception as e:
         return jsonify({'error': 'Unable to read transaction logs.'}), 500
 
-# Function to calculate the sum of profit_loss fields
+class ProfitLossAggregator:
+    """
+    Keeps profit/loss totals per day, and per wallet and token within a day, in Redis. It follows
+    the statistics store by seq, so each pass only reads the records written since the last one.
+    A record counts towards the local day it was last updated on, like the console's daily view;
+    its previous contribution is taken back when it changes. Contributions are kept per day for
+    `record_days` days, the longest a record is expected to keep changing.
+
+    Every gunicorn worker starts one, but only the holder of a Redis leader lock works, so the
+    totals are computed once per deployment. Another worker takes over when the lock expires. A
+    batch is applied in one Redis transaction that watches the seq and the lock, so a leader that
+    lost the lock mid-batch applies nothing.
+    """
+
+    def __init__(self, store, redis, prefix='pl', poll_interval=1, lock_ttl=30, batch_size=1000, record_days=7):
+        self.store = store
+        self.redis = redis
+        self.prefix = prefix
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.record_days = record_days
+        self.leader_lock = LeaderLock(redis, self.key('leader'), ttl=lock_ttl)
+
+    def key(self, *parts):
+        return ':'.join((self.prefix,) + parts)
+
+    def step(self):
+        """
+        Applies the records written since the last pass. Returns how many were applied, 0 when this
+        worker is no longer the leader.
+        """
+        seq_key = self.key('seq')
+        with self.redis.pipeline() as pipeline:
+            try:
+                pipeline.watch(seq_key, self.leader_lock.key)
+                if not self.leader_lock.held(pipeline):
+                    return 0
+                last_seq = int(pipeline.get(seq_key) or 0)
+                records = self.store.transactions(after_seq=last_seq, limit=self.batch_size)
+                if not records:
+                    return 0
+
+                ids = [str(record['id']) for record in records]
+                previous = {}
+                now = datetime.now(local_tz)
+                for days_ago in range(self.record_days):
+                    day = (now - timedelta(days=days_ago)).strftime('%Y%m%d')
+                    for record_id, contribution in zip(ids, pipeline.hmget(self.key('day', day, 'records'), ids)):
+                        if contribution is not None:
+                            previous.setdefault(record_id, json.loads(contribution))
+
+                pipeline.multi()
+                for record_id, record in zip(ids, records):
+                    if record_id in previous:
+                        self._add(pipeline, previous[record_id], -1)
+                        pipeline.hdel(self.key('day', previous[record_id]['day'], 'records'), record_id)
+                    try:
+                        value = float(record['profit_loss']) if record['profit_loss'] else 0.0
+                    except ValueError:
+                        value = 0.0
+                    if not value:
+                        continue
+                    contribution = {'day': local_day(record['updated_at']), 'wallet': record['wallet_name'] or 'N/A',
+                                    'token': record['token_hash'] or 'N/A', 'value': value}
+                    self._add(pipeline, contribution, 1)
+                    records_key = self.key('day', contribution['day'], 'records')
+                    pipeline.hset(records_key, record_id, json.dumps(contribution))
+                    pipeline.expire(records_key, (self.record_days + 1) * 86400)
+                pipeline.set(seq_key, records[-1]['seq'])
+                pipeline.execute()
+                return len(records)
+            except WatchError:
+                # The lock changed hands or expired, or another leader moved the seq
+                return 0
+
+    def _add(self, pipeline, contribution, sign):
+        if not contribution['value']:
+            return
+        value = sign * contribution['value']
+        pipeline.incrbyfloat(self.key('day', contribution['day']), value)
+        pipeline.hincrbyfloat(self.key('day', contribution['day'], 'wallets'), contribution['wallet'], value)
+        pipeline.hincrbyfloat(self.key('day', contribution['day'], 'tokens'), contribution['token'], value)
+
+    def run(self, logger):
+        while True:
+            try:
+                if self.leader_lock.acquire():
+                    # Catch up before sleeping, the lock is renewed for every batch
+                    while self.step() == self.batch_size and self.leader_lock.acquire():
+                        pass
+            except Exception as e:
+                logger.error(f"Error aggregating profit_loss: {e}")
+            time.sleep(self.poll_interval)
+
+    def day_total(self, day=None):
+        return float(self.redis.get(self.key('day', day or local_day())) or 0)
+
+    def day_breakdown(self, day=None):
+        """
+        Returns the profit/loss of the day per wallet and per token.
+        """
+        day = day or local_day()
+        return {
+            'wallets': {wallet.decode(): float(value) for wallet, value in self.redis.hgetall(self.key('day', day, 'wallets')).items()},
+            'tokens': {token.decode(): float(value) for token, value in self.redis.hgetall(self.key('day', day, 'tokens')).items()}
+        }
+
+profit_loss_aggregator = ProfitLossAggregator(statistics_store, redis_connection)
+
+# Background thread of every worker, only one of them aggregates at a time
 def calculate_profit_loss(logger):
-    while True:
-        try:
-            with open('logs/statistics/transaction_logs.json', 'r') as f:
-                transactions = json.load(f)
-                total_profit_loss = sum(
-                    float(tx['profit_loss']) for tx in transactions if tx['profit_loss']
-                )
-                # Store the total profit/loss in Redis to share it between threads
-                redis_connection.set('todays_profit_loss', total_profit_loss)
-        except Exception as e:
-            logger.error(f"Error calculating profit_loss: {e}")
-            redis_connection.set('todays_profit_loss', 0)
-        time.sleep(15)
+    profit_loss_aggregator.run(logger)
 
 # Route handler to fetch the current profit/loss from Redis
 def get_todays_pl(logger):
     try:
-        # Fetch the calculated profit/loss from Redis
-        todays_pl = redis_connection.get('todays_profit_loss')
-        if todays_pl is None:
-            todays_pl = 0.0
+        # Fetch the running total of today from Redis
+        todays_pl = profit_loss_aggregator.day_total()
         # Limit to 6 decimal places
         todays_pl = round(float(todays_pl), 6)
         return jsonify({"todaysPL": todays_pl})
@@ -1,14 +1,19 @@
 import subprocess
 import logging
 import os
+from pieces.service_status_monitor import ServiceStatusMonitor
 
 # Get the absolute path of the parent directory
 parent_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 
+# Status of the bots, read from memory and refreshed in the background
+service_status_monitor = ServiceStatusMonitor(['mtb', 'mtdb'])
+
 def start_service(service_name):
     try:
         subprocess.run(['sudo', 'systemctl', 'start', f'{service_name}.service'], check=True)
         logging.info(f"{service_name} service started successfully.")
+        service_status_monitor.refresh_soon()
         return True, f"{service_name} service started successfully."
     except subprocess.CalledProcessError as e:
         logging.error(f"Error starting {service_name} service: {e}")
@@ -18,6 +23,7 @@ def stop_service(service_name):
     try:
         subprocess.run(['sudo', 'systemctl', 'stop', f'{service_name}.service'], check=True)
         logging.info(f"{service_name} service stopped successfully.")
+        service_status_monitor.refresh_soon()
         return True, f"{service_name} service stopped successfully."
     except subprocess.CalledProcessError as e:
         logging.error(f"Error stopping {service_name} service: {e}")
@@ -27,18 +33,17 @@ def restart_service(service_name):
     try:
         subprocess.run(['sudo', 'systemctl', 'restart', f'{service_name}.service'], check=True)
         logging.info(f"{service_name} service restarted successfully.")
+        service_status_monitor.refresh_soon()
         return True, f"{service_name} service restarted successfully."
     except subprocess.CalledProcessError as e:
         logging.error(f"Error restarting {service_name} service: {e}")
         return False, f"Error restarting {service_name} service: {e}"
 
 def get_service_status(service_name):
-    try:
-        result = subprocess.run(['systemctl', 'is-active', f'{service_name}.service'], stdout=subprocess.PIPE)
-        status = result.stdout.decode().strip()
-        if status == 'active':
-            return 'running'
-        return 'stopped'
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Error checking {service_name} service status: {e}")
-        return 'error'
\ No newline at end of file
+    return service_status_monitor.status(service_name)
+
+def get_service_info(service_name=None):
+    """
+    Returns the cached status, uptime, restart count, memory and CPU time of a service, or of all of them.
+    """
+    return service_status_monitor.info(service_name)
@@ -131,24 +131,27 @@ function restartMTdB() {
         });
 }
 
+// Update a status indicator with the status of its service
+function renderServiceStatus(lightId, textId, status) {
+    const statusLight = document.getElementById(lightId);
+    const statusText = document.getElementById(textId);
+
+    if (status === 'running') {
+        statusLight.style.backgroundColor = 'green';  // Set background color to green
+        statusLight.classList.add('glow');  // Add glowing effect when running
+        statusText.textContent = 'Running';
+    } else {
+        statusLight.style.backgroundColor = 'red';  // Set background color to red
+        statusLight.classList.remove('glow');  // Remove glowing effect when stopped
+        statusText.textContent = 'Stopped';
+    }
+}
+
 // Update the status indicator based on whether MTB is running
 function updateMTBStatus() {
     fetch('/mtb_status')  // Assuming this is the correct Flask route
         .then(response => response.json())
-        .then(data => {
-            const statusLight = document.getElementById('statusLight');
-            const statusText = document.getElementById('statusText');
-            
-            if (data.status === 'running') {
-                statusLight.style.backgroundColor = 'green';  // Set background color to green
-                statusLight.classList.add('glow');  // Add glowing effect when running
-                statusText.textContent = 'Running';
-            } else {
-                statusLight.style.backgroundColor = 'red';  // Set background color to red
-                statusLight.classList.remove('glow');  // Remove glowing effect when stopped
-                statusText.textContent = 'Stopped';
-            }
-        })
+        .then(data => renderServiceStatus('statusLight', 'statusText', data.status))
         .catch(error => {
             console.error('Error fetching MTB status:', error);
         });
@@ -158,33 +161,16 @@ function updateMTBStatus() {
 function updateMTdBStatus() {
     fetch('/mtdb_status')  // Assuming this is the correct Flask route
         .then(response => response.json())
-        .then(data => {
-            const mtdbStatusLight = document.getElementById('mtdbStatusLight');
-            const mtdbStatusText = document.getElementById('mtdbStatusText');
-            
-            if (data.status === 'running') {
-                mtdbStatusLight.style.backgroundColor = 'green';  // Set background color to green
-                mtdbStatusLight.classList.add('glow');  // Add glowing effect when running
-                mtdbStatusText.textContent = 'Running';
-            } else {
-                mtdbStatusLight.style.backgroundColor = 'red';  // Set background color to red
-                mtdbStatusLight.classList.remove('glow');  // Remove glowing effect when stopped
-                mtdbStatusText.textContent = 'Stopped';
-            }
-        })
+        .then(data => renderServiceStatus('mtdbStatusLight', 'mtdbStatusText', data.status))
         .catch(error => {
             console.error('Error fetching MTdB status:', error);
         });
 }
 
-// Check the statuses when the page loads
+// Check the statuses when the page loads, changes are pushed by the server afterwards
 document.addEventListener('DOMContentLoaded', () => {
     updateMTBStatus();
     updateMTdBStatus();
-
-    // Optionally, update statuses periodically (e.g., every 5 seconds)
-    setInterval(updateMTBStatus, 5000);
-    setInterval(updateMTdBStatus, 5000);
 });
 
 
@@ -242,66 +228,146 @@ function copyToClipboard(text) {
     }
 }
 
-// Function to update the transaction table and add click-to-copy functionality
-function updateTransactionTable(transactions) {
+// Rows of the transaction table by post hash, and the sync state of today's transactions
+const transactionRows = new Map();
+let transactionsDay = null;
+let transactionsCursor = 0;
+let fetchingTransactions = false;
+
+// Function to fill a table row with a transaction and add click-to-copy functionality
+function renderTransactionRow(row, transaction) {
+    const buyStatusClass = transaction.buy === 'YES' ? 'status-yes' : 'status-no';
+    const sellStatusClass = transaction.sell === 'YES' ? 'status-yes' : 'status-no';
+    const profitLossClass = transaction.profit_loss > 0 ? 'profit' : 'loss';
+
+    // Add clickable elements for post_hash, buy_tx, and sell_tx
+    row.innerHTML = `
+        <td>${new Date(transaction.time).toLocaleString()}</td> <!-- Time column -->
+        <td class="short-hash" onclick="copyToClipboard('${transaction.post_hash}')">${formatPostHash(transaction.post_hash)}</td>
+        <td class="short-hash" onclick="copyToClipboard('${transaction.pid}')">${(transaction.pid)}</td>
+        <td>${transaction.wallet_name}</td>
+        <td class="token-symbol" onclick="copyToClipboard('${transaction.token_hash}')">${transaction.token_symbol}</td> <!-- Token symbol copies token_hash -->
+        <td>${transaction.amount_of_eth}</td>
+        
+        <!-- Buy column: only clickable if buy_tx exists -->
+        <td class="buy-tx ${buyStatusClass}" ${transaction.buy_tx ? `onclick="copyToClipboard('${transaction.buy_tx}')"` : ''}>
+            ${transaction.buy || ''}
+        </td>
+        
+        <!-- Sell column: only clickable if sell_tx exists -->
+        <td class="sell-tx ${sellStatusClass}" ${transaction.sell_tx ? `onclick="copyToClipboard('${transaction.sell_tx}')"` : ''}>
+            ${transaction.sell || ''}
+        </td>
+
+        <td>${transaction.fail || ''}</td>
+        <td class="${profitLossClass}">${transaction.profit_loss || ''}</td>
+    `;
+}
+
+// Function to merge changed transactions into the table, only their rows are rendered again
+function mergeTransactions(transactions) {
     const tableBody = document.querySelector('#transactionTable tbody');
-    tableBody.innerHTML = '';  // Clear the table first
 
     transactions.forEach(transaction => {
-        const row = document.createElement('tr');
-
-        const buyStatusClass = transaction.buy === 'YES' ? 'status-yes' : 'status-no';
-        const sellStatusClass = transaction.sell === 'YES' ? 'status-yes' : 'status-no';
-        const profitLossClass = transaction.profit_loss > 0 ? 'profit' : 'loss';
-
-        // Add clickable elements for post_hash, buy_tx, and sell_tx
-        row.innerHTML = `
-            <td>${new Date(transaction.time).toLocaleString()}</td> <!-- Time column -->
-            <td class="short-hash" onclick="copyToClipboard('${transaction.post_hash}')">${formatPostHash(transaction.post_hash)}</td>
-            <td class="short-hash" onclick="copyToClipboard('${transaction.pid}')">${(transaction.pid)}</td>
-            <td>${transaction.wallet_name}</td>
-            <td class="token-symbol" onclick="copyToClipboard('${transaction.token_hash}')">${transaction.token_symbol}</td> <!-- Token symbol copies token_hash -->
-            <td>${transaction.amount_of_eth}</td>
-            
-            <!-- Buy column: only clickable if buy_tx exists -->
-            <td class="buy-tx ${buyStatusClass}" ${transaction.buy_tx ? `onclick="copyToClipboard('${transaction.buy_tx}')"` : ''}>
-                ${transaction.buy || ''}
-            </td>
-            
-            <!-- Sell column: only clickable if sell_tx exists -->
-            <td class="sell-tx ${sellStatusClass}" ${transaction.sell_tx ? `onclick="copyToClipboard('${transaction.sell_tx}')"` : ''}>
-                ${transaction.sell || ''}
-            </td>
-
-            <td>${transaction.fail || ''}</td>
-            <td class="${profitLossClass}">${transaction.profit_loss || ''}</td>
-        `;
-
-        tableBody.appendChild(row);
+        let row = transactionRows.get(transaction.post_hash);
+        if (!row) {
+            row = document.createElement('tr');
+            row.dataset.time = transaction.time;
+            transactionRows.set(transaction.post_hash, row);
+
+            // Keep the table ordered by time, new transactions usually go last
+            let next = null;
+            let previous = tableBody.lastElementChild;
+            while (previous && previous.dataset.time > transaction.time) {
+                next = previous;
+                previous = previous.previousElementSibling;
+            }
+            tableBody.insertBefore(row, next);
+        }
+        renderTransactionRow(row, transaction);
     });
 }
 
-// Function to fetch the transaction logs and display the spinner while loading
+// Function to clear the table, when the day changes
+function resetTransactionTable() {
+    document.querySelector('#transactionTable tbody').innerHTML = '';
+    transactionRows.clear();
+    transactionsCursor = 0;
+}
+
+// Function to fetch the transactions changed since the last fetch, the spinner shows while the table is first loaded
 function fetchTransactionLogs() {
-    toggleSpinner(true); // Show spinner before fetching data
-    fetch('/get_transactions')
-        .then(response => response.json())
+    if (fetchingTransactions) {
+        return;
+    }
+    fetchingTransactions = true;
+    toggleSpinner(transactionsDay === null);
+
+    const fetchPage = () => fetch(`/get_transactions?since=${transactionsCursor}`)
+        .then(response => response.status === 304 ? null : response.json())
         .then(data => {
-            if (!data.error) {
-                updateTransactionTable(data);
+            if (!data || data.error) {
+                return;
+            }
+            if (data.day !== transactionsDay) {
+                const dayChanged = transactionsDay !== null;
+                transactionsDay = data.day;
+                if (dayChanged) {
+                    // A new day starts with an empty table
+                    resetTransactionTable();
+                    return fetchPage();
+                }
             }
+            mergeTransactions(data.transactions);
+            transactionsCursor = data.cursor;
+            if (data.has_more) {
+                return fetchPage();
+            }
+        });
+
+    fetchPage()
+        .catch(error => {
+            console.error('Error fetching transactions:', error);
         })
         .finally(() => {
+            fetchingTransactions = false;
             toggleSpinner(false); // Hide spinner after data is loaded
-        })
-        .catch(error => {
-            console.error('Error fetching transactions:', error);
-            toggleSpinner(false); // Hide spinner even on error
         });
 }
 
-// Poll the server every 5 seconds for new transaction logs
-setInterval(fetchTransactionLogs, 5000);
+// Function to apply transactions pushed by the server, a gap in the cursor is filled by fetching instead
+function applyPushedTransactions(data) {
+    if (!fetchingTransactions && data.day === transactionsDay && data.after === transactionsCursor) {
+        mergeTransactions(data.transactions);
+        transactionsCursor = data.cursor;
+        if (!data.has_more) {
+            return;
+        }
+    }
+    fetchTransactionLogs();
+}
+
+// Function to show the open positions of the trading bot with their latest price
+function updatePositionTable(positions) {
+    const tableBody = document.querySelector('#positionTable tbody');
+    tableBody.innerHTML = '';
+
+    Object.entries(positions).forEach(([postHash, position]) => {
+        const row = document.createElement('tr');
+        const changeClass = position.percent_change > 0 ? 'profit' : 'loss';
+        row.innerHTML = `
+            <td class="short-hash" onclick="copyToClipboard('${postHash}')">${formatPostHash(postHash)}</td>
+            <td>${position.wallet_name}</td>
+            <td class="token-symbol" onclick="copyToClipboard('${position.token_hash}')">${position.token_symbol}</td>
+            <td>${position.token_amount}</td>
+            <td>${position.initial_price}</td>
+            <td>${position.price}</td>
+            <td class="${changeClass}">${position.percent_change.toFixed(2)}%</td>
+            <td>${position.block}</td>
+        `;
+        tableBody.appendChild(row);
+    });
+}
 
 // Fetch the transaction logs when the page loads
 document.addEventListener('DOMContentLoaded', () => {
@@ -327,37 +393,54 @@ function updateTime() {
 updateTime();
 setInterval(updateTime, 1000);
 
+function renderTodaysPL(todaysPL) {
+    const plElement = document.getElementById('todaysPL');
+    
+    // Create the static text and keep the "ETH" part outside the colored span
+    const staticText = `Today's Profit/Loss: `;
+    const ethText = ` ETH`;  // Keep "ETH" in white
+
+    // Create a span for the dynamic profit/loss number
+    const plNumber = document.createElement('span');
+    plNumber.innerText = `${todaysPL}`;  // Only the number is placed in this span
+
+    // Apply color based on the value
+    if (todaysPL > 0) {
+        plNumber.style.color = '#28a745';  // Green for positive value
+    } else if (todaysPL < 0) {
+        plNumber.style.color = '#dc3545';  // Red for negative value
+    } else {
+        plNumber.style.color = 'white';    // White for zero or neutral
+    }
+
+    // Clear the current content of plElement and append the static text, colored number, and "ETH"
+    plElement.innerHTML = '';  // Clear existing content
+    plElement.append(staticText, plNumber, ethText);  // Append the static text, dynamic number, and "ETH"
+}
+
 function updateTodaysPL() {
     fetch('/todays_pl')
         .then(response => response.json())
-        .then(data => {
-            const todaysPL = data.todaysPL;
-            const plElement = document.getElementById('todaysPL');
-            
-            // Create the static text and keep the "ETH" part outside the colored span
-            const staticText = `Today's Profit/Loss: `;
-            const ethText = ` ETH`;  // Keep "ETH" in white
-
-            // Create a span for the dynamic profit/loss number
-            const plNumber = document.createElement('span');
-            plNumber.innerText = `${todaysPL}`;  // Only the number is placed in this span
-
-            // Apply color based on the value
-            if (todaysPL > 0) {
-                plNumber.style.color = '#28a745';  // Green for positive value
-            } else if (todaysPL < 0) {
-                plNumber.style.color = '#dc3545';  // Red for negative value
-            } else {
-                plNumber.style.color = 'white';    // White for zero or neutral
-            }
-
-            // Clear the current content of plElement and append the static text, colored number, and "ETH"
-            plElement.innerHTML = '';  // Clear existing content
-            plElement.append(staticText, plNumber, ethText);  // Append the static text, dynamic number, and "ETH"
-        })
+        .then(data => renderTodaysPL(data.todaysPL))
         .catch(error => console.error('Error fetching today\'s P/L:', error));
 }
 
-// Call updateTime once immediately and then every second
-updateTime();
-setInterval(updateTodaysPL, 1000);  // Update the P/L every second
+// Fetch the P/L once, changes are pushed by the server afterwards
+updateTodaysPL();
+
+// One event stream from the server brings every change of P/L, service status, transactions and positions
+const dashboardEvents = new EventSource('/events');
+dashboardEvents.addEventListener('pl', event => renderTodaysPL(JSON.parse(event.data).todaysPL));
+dashboardEvents.addEventListener('status', event => {
+    const statuses = JSON.parse(event.data);
+    renderServiceStatus('statusLight', 'statusText', statuses.mtb);
+    renderServiceStatus('mtdbStatusLight', 'mtdbStatusText', statuses.mtdb);
+});
+dashboardEvents.addEventListener('transactions', event => applyPushedTransactions(JSON.parse(event.data)));
+dashboardEvents.addEventListener('positions', event => updatePositionTable(JSON.parse(event.data)));
+// Changes missed while the stream was reconnecting are fetched
+dashboardEvents.addEventListener('open', () => {
+    if (transactionsDay !== null) {
+        fetchTransactionLogs();
+    }
+});
@@ -0,0 +1,50 @@
+import time
+import unittest
+from pieces.service_status_monitor import FakeSystemdBus, ServiceStatusMonitor
+
+class ServiceStatusMonitorTest(unittest.TestCase):
+
+    def wait_for(self, condition, timeout=2):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                self.fail("Condition not met in time.")
+            time.sleep(0.01)
+
+    def test_reads_the_bus_on_first_use(self):
+        bus = FakeSystemdBus({'mtb.service': {'ActiveState': 'active', 'SubState': 'running', 'NRestarts': '2', 'MainPID': '42'}})
+        monitor = ServiceStatusMonitor(['mtb', 'mtdb'], bus=bus, interval=60)
+
+        entry = monitor.info('mtb')
+        self.assertEqual(entry['status'], 'running')
+        self.assertEqual(entry['sub_state'], 'running')
+        self.assertEqual(entry['restarts'], 2)
+        self.assertEqual(entry['main_pid'], 42)
+        self.assertEqual(monitor.status('mtdb'), 'stopped')
+        self.assertEqual(monitor.status('unknown'), 'error')
+
+    def test_refreshes_when_the_bus_reports_a_change(self):
+        bus = FakeSystemdBus({'mtb.service': {'ActiveState': 'active', 'SubState': 'running'}})
+        monitor = ServiceStatusMonitor(['mtb'], bus=bus, interval=60)
+        first = monitor.info('mtb')
+
+        # The interval is long, only the watch callback can explain a refresh
+        bus.set('mtb.service', ActiveState='failed', SubState='failed', NRestarts='3')
+        self.wait_for(lambda: monitor.info('mtb')['checked_at'] > first['checked_at'])
+
+        entry = monitor.info('mtb')
+        self.assertEqual(entry['status'], 'stopped')
+        self.assertEqual(entry['active_state'], 'failed')
+        self.assertEqual(entry['restarts'], 3)
+        self.assertIsNone(entry['uptime'])
+
+    def test_ignores_unset_numbers(self):
+        bus = FakeSystemdBus({'mtb.service': {'ActiveState': 'active', 'MemoryCurrent': str(2 ** 64 - 1), 'CPUUsageNSec': '1500000000'}})
+        monitor = ServiceStatusMonitor(['mtb'], bus=bus, interval=60)
+
+        entry = monitor.info('mtb')
+        self.assertIsNone(entry['memory'])
+        self.assertEqual(entry['cpu'], 1.5)
+
+if __name__ == '__main__':
+    unittest.main()